@@ -0,0 +1,517 @@
+"""
+AI(Claude) API 클라이언트 & 응답 캐시
+"""
+import os, json, time, sqlite3, hashlib, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from data.common import CACHE_DIR
+from data.pdf_search import estimate_tokens
+
+# 오프라인 테스트 시 ANTHROPIC_API_URL 로 스텁 서버(data/sse_stub.py) 지정
+API_URL = os.environ.get("ANTHROPIC_API_URL", "https://api.anthropic.com/v1/messages")
+API_VERSION = "2023-06-01"
+DEFAULT_MODEL = "claude-sonnet-4-20250514"
+
+AI_CACHE_DB = os.path.join(CACHE_DIR, "ai_responses.db")
+AI_CACHE_TTL = 7 * 24 * 3600      # 초
+AI_CACHE_MAX_ENTRIES = 5000
+HTTP_POOL_SIZE = 16
+# 프로세스 전체 호출 한도 (분당)
+RATE_LIMIT_RPM = int(os.environ.get("AI_RATE_LIMIT_RPM", 50))
+RATE_LIMIT_TPM = int(os.environ.get("AI_RATE_LIMIT_TPM", 80000))   # 입력 추정 + max_tokens 기준
+# 연속 실패 시 호출 차단 (회로 차단기)
+BREAKER_FAILURES = 3
+BREAKER_RESET_SECONDS = 30.0
+
+# 캐시 사용 방식: use(조회·저장) / refresh(새로 호출 후 저장) / off(캐시 미사용)
+CACHE_MODES = ("use", "refresh", "off")
+
+
+class AIClientError(RuntimeError):
+    """API 호출 실패 (네트워크 오류, 오류 응답, 빈 응답)
+
+    transient=True 는 연결·시간 초과·429·5xx 처럼 서버 쪽 문제 (회로 차단기 실패로 셈),
+    False 는 잘못된 요청·너무 긴 프롬프트 같은 요청 자체의 4xx 오류.
+    """
+
+    def __init__(self, message, status=None, transient=True):
+        super().__init__(message)
+        self.status = status
+        self.transient = transient
+
+
+# 상태 코드 없이 오는 오류(스트림 중 error 이벤트) 중 서버 쪽 문제로 보는 종류
+_TRANSIENT_ERROR_TYPES = {"api_error", "overloaded_error", "rate_limit_error", "timeout_error"}
+
+
+def _is_transient(status, error_type=None):
+    """오류 응답이 서버 쪽 문제인지 (429·5xx, 또는 서버 쪽 오류 종류)"""
+    if status is not None and status >= 400:
+        return status == 429 or status >= 500
+    return error_type is None or error_type in _TRANSIENT_ERROR_TYPES
+
+
+def request_key(payload):
+    """모델·프롬프트·파라미터 → 캐시 키"""
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """API 응답 디스크 캐시 (SQLite, TTL + LRU)"""
+
+    def __init__(self, db_path, ttl=AI_CACHE_TTL, max_entries=AI_CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL,
+                created REAL NOT NULL, last_access REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        """캐시 조회 (없거나 만료면 None)"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] <= self.ttl:
+                conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            else:
+                row = None
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return row[0] if row else None
+
+    def put(self, key, response, model=""):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO responses (key, model, response, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                         (key, model, response, now, now))
+            conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            conn.execute("""DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)""", (self.max_entries,))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        with self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        with self._lock:
+            total = self.hits + self.misses
+            return {"entries": entries, "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else 0.0}
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+def get_response_cache():
+    """API 응답 캐시 (프로세스 공용)"""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ResponseCache(AI_CACHE_DB)
+    return _CACHE
+
+
+def _headers():
+    headers = {"Content-Type": "application/json", "anthropic-version": API_VERSION}
+    api_key = os.environ.get("ANTHROPIC_API_KEY")
+    if api_key:
+        headers["x-api-key"] = api_key
+    return headers
+
+
+def _extract_text(data, status=None):
+    if data.get("type") == "error" or "error" in data or (status or 0) >= 400:
+        error = data.get("error", data)
+        error_type = error.get("type") if isinstance(error, dict) else None
+        raise AIClientError(str(error), status=status, transient=_is_transient(status, error_type))
+    text = "".join(block.get("text", "") for block in data.get("content", []) if block.get("type", "text") == "text")
+    if not text:
+        raise AIClientError("빈 응답")
+    return text
+
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+def get_http_session():
+    """연결 재사용 HTTP 세션 (프로세스 공용 커넥션 풀)"""
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _SESSION = session
+    return _SESSION
+
+
+def _post(payload, timeout):
+    try:
+        resp = get_http_session().post(API_URL, headers=_headers(), json=payload, timeout=timeout)
+    except Exception as e:
+        raise AIClientError(str(e)) from e
+    try:
+        data = resp.json()
+    except Exception as e:
+        raise AIClientError(f"HTTP {resp.status_code}: {e}", status=resp.status_code,
+                            transient=_is_transient(resp.status_code)) from e
+    return _extract_text(data, resp.status_code)
+
+
+def _iter_sse(resp):
+    """SSE 응답 → (event, data) 순회"""
+    event, data = None, []
+    for raw in resp.iter_lines():
+        line = raw.decode("utf-8") if isinstance(raw, bytes) else raw
+        if not line:
+            if data:
+                yield event, "\n".join(data)
+            event, data = None, []
+        elif line.startswith(":"):
+            continue
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].lstrip())
+    if data:
+        yield event, "\n".join(data)
+
+
+def _post_stream(payload, timeout):
+    try:
+        resp = get_http_session().post(API_URL, headers=_headers(), json={**payload, "stream": True},
+                                       timeout=timeout, stream=True)
+    except Exception as e:
+        raise AIClientError(str(e)) from e
+    with resp:
+        if resp.status_code >= 400:
+            try:
+                _extract_text(resp.json(), resp.status_code)
+            except AIClientError:
+                raise
+            except Exception:
+                pass
+            raise AIClientError(f"HTTP {resp.status_code}", status=resp.status_code,
+                                transient=_is_transient(resp.status_code))
+        try:
+            for event, data in _iter_sse(resp):
+                msg = json.loads(data)
+                kind = msg.get("type", event)
+                if kind == "content_block_delta" and msg.get("delta", {}).get("type") == "text_delta":
+                    yield msg["delta"]["text"]
+                elif kind == "error":
+                    error = msg.get("error", msg)
+                    error_type = error.get("type") if isinstance(error, dict) else None
+                    raise AIClientError(str(error), transient=_is_transient(None, error_type))
+                elif kind == "message_stop":
+                    return
+        except AIClientError:
+            raise
+        except Exception as e:
+            raise AIClientError(str(e)) from e
+
+
+# ━━━ 요청 병합 (single-flight) ━━━
+class _InFlight:
+    """진행 중인 요청 1건 — 받은 조각을 뒤늦게 합류한 호출에도 전달"""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self._cond = threading.Condition()
+
+    def push(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.done, self.error = True, error
+            self._cond.notify_all()
+
+    def follow(self):
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self.chunks) and not self.done:
+                    self._cond.wait()
+                new, i = self.chunks[i:], len(self.chunks)
+                done, error = self.done, self.error
+            yield from new
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+
+class SingleFlight:
+    """같은 키의 동시 요청을 1건으로 병합"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.coalesced = 0
+
+    def join(self, key):
+        """→ (진행 중 요청, 내가 선행 요청인지)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+            flight = self._flights[key] = _InFlight()
+            return flight, True
+
+    def release(self, key):
+        with self._lock:
+            self._flights.pop(key, None)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+
+# ━━━ 호출 속도 제한 (토큰 버킷) ━━━
+class TokenBucket:
+    """분당 한도 토큰 버킷"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount, now):
+        """amount 를 꺼내려면 더 기다려야 하는 시간 (초)"""
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """분당 요청 수 + 분당 토큰 수 제한, 대기열 지표 기록"""
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._cond = threading.Condition()
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.acquired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def acquire(self, tokens):
+        """한도 안에 들 때까지 대기 → 대기 시간 (초)"""
+        start = time.monotonic()
+        with self._cond:
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+                    if wait <= 0:
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        break
+                    self._cond.wait(wait)
+            finally:
+                self.queue_depth -= 1
+            waited = time.monotonic() - start
+            self.acquired += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+        return waited
+
+    def stats(self):
+        with self._cond:
+            return {"queue_depth": self.queue_depth, "max_queue_depth": self.max_queue_depth,
+                    "requests": self.acquired, "max_wait": self.max_wait,
+                    "avg_wait": self.total_wait / self.acquired if self.acquired else 0.0}
+
+
+# ━━━ 회로 차단기 ━━━
+class CircuitOpenError(AIClientError):
+    """연속 실패로 회로가 열려 호출하지 않음"""
+
+
+class CircuitBreaker:
+    """연속 실패 시 호출을 막고, 대기 후 1건만 시험 호출해 복구 여부 확인
+
+    closed(정상) → 연속 failure_threshold 회 실패 → open(즉시 실패)
+    → reset_timeout 경과 → half_open(시험 호출 1건) → 성공 시 closed, 실패 시 다시 open
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """호출 가능 여부 확인 (막혀 있으면 CircuitOpenError)"""
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError("AI 서버 연결 차단 중")
+                self.state = "half_open"
+            if self.state == "half_open":
+                if self._probing:
+                    raise CircuitOpenError("AI 서버 복구 확인 중")
+                self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self.state, self.failures, self._probing = "closed", 0, False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.trips += 1
+                self.state, self.opened_at = "open", time.monotonic()
+            self._probing = False
+
+    def release(self):
+        """성공·실패 판정 없이 끝난 호출 (중단 등)"""
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+            self._probing = False
+
+    def stats(self):
+        with self._lock:
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)) if self.state == "open" else 0.0
+            return {"state": self.state, "failures": self.failures, "trips": self.trips, "retry_in": retry_in}
+
+
+_FLIGHTS = SingleFlight()
+_LIMITER = RateLimiter(RATE_LIMIT_RPM, RATE_LIMIT_TPM)
+_BREAKER = CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET_SECONDS)
+
+def get_client_metrics():
+    """클라이언트 지표 (대기열·대기 시간·병합 건수·캐시)"""
+    return {**_LIMITER.stats(), "in_flight": _FLIGHTS.in_flight(), "coalesced": _FLIGHTS.coalesced,
+            "cache": get_response_cache().stats(), "breaker": _BREAKER.stats()}
+
+
+def _request(payload, timeout, cache, stream):
+    """캐시 → 병합 → 속도 제한 → 호출 순으로 처리하며 텍스트 조각 반환"""
+    key = request_key(payload)
+    store = get_response_cache() if cache != "off" else None
+    if store and cache == "use":
+        text = store.get(key)
+        if text is not None:
+            yield text
+            return
+    flight, leader = _FLIGHTS.join(key)
+    if not leader:
+        yield from flight.follow()
+        return
+    parts, called = [], False
+    try:
+        _BREAKER.before_call()
+        called = True
+        prompt = "".join(m["content"] for m in payload["messages"] if isinstance(m.get("content"), str))
+        _LIMITER.acquire(estimate_tokens(prompt) + payload.get("max_tokens", 0))
+        source = _post_stream(payload, timeout) if stream else iter([_post(payload, timeout)])
+        for chunk in source:
+            parts.append(chunk)
+            flight.push(chunk)
+            yield chunk
+        if not parts:
+            raise AIClientError("빈 응답")
+    except BaseException as e:
+        if called:
+            if isinstance(e, AIClientError) and e.transient:
+                _BREAKER.record_failure()
+            elif isinstance(e, AIClientError):
+                # 요청 자체의 4xx 오류 — 서버는 응답했으므로 정상으로 봄 (잘못된 프롬프트 몇 건에 회로가 열리지 않게)
+                _BREAKER.record_success()
+            else:
+                _BREAKER.release()
+        # 선행 요청이 실패·중단되면 합류한 요청도 같은 오류로 끝냄
+        _FLIGHTS.release(key)
+        flight.finish(e if isinstance(e, AIClientError) else AIClientError("요청 중단"))
+        raise
+    _BREAKER.record_success()
+    if store:
+        store.put(key, "".join(parts), payload["model"])
+    _FLIGHTS.release(key)
+    flight.finish()
+
+
+def call_claude(prompt, model=DEFAULT_MODEL, max_tokens=2000, timeout=60, cache="use", **params):
+    """프롬프트 1건 호출 → 응답 텍스트 (실패 시 AIClientError)
+
+    같은 모델·프롬프트·파라미터는 디스크 캐시에서 바로 반환하고,
+    다른 세션에서 같은 요청이 진행 중이면 새로 보내지 않고 그 결과를 함께 받는다.
+    cache: "use" | "refresh" (캐시 무시하고 새로 호출) | "off"
+    """
+    payload = {"model": model, "max_tokens": max_tokens,
+               "messages": [{"role": "user", "content": prompt}], **params}
+    return "".join(_request(payload, timeout, cache, stream=False))
+
+
+def stream_claude(prompt, model=DEFAULT_MODEL, max_tokens=2000, timeout=60, cache="use", **params):
+    """프롬프트 1건 스트리밍 호출 → 텍스트 조각을 받는 대로 반환 (실패 시 AIClientError)
+
+    캐시 적중 시 저장된 응답 전체를 한 조각으로 돌려주고, 끝까지 받은 응답만 캐시에 저장한다.
+    """
+    payload = {"model": model, "max_tokens": max_tokens,
+               "messages": [{"role": "user", "content": prompt}], **params}
+    yield from _request(payload, timeout, cache, stream=True)
+
+
+def call_claude_many(prompts, max_workers=None, **kwargs):
+    """여러 프롬프트 동시 호출 — {키: 프롬프트} → 끝나는 순서대로 (키, 텍스트, 오류) 반환
+
+    오류가 난 항목은 텍스트가 None, 오류에 예외 객체가 들어간다.
+    """
+    if not prompts:
+        return
+    workers = max_workers or min(len(prompts), HTTP_POOL_SIZE)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(call_claude, prompt, **kwargs): key for key, prompt in prompts.items()}
+        for fut in as_completed(futures):
+            try:
+                yield futures[fut], fut.result(), None
+            except Exception as e:
+                yield futures[fut], None, e
@@ -0,0 +1,106 @@
+"""
+AI 분석 백그라운드 작업 큐 (Streamlit rerun 과 무관하게 실행, 결과는 SQLite 에 보관)
+"""
+import os, time, uuid, sqlite3, threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from data.common import CACHE_DIR
+from data.ai_client import stream_claude
+
+AI_JOBS_DB = os.path.join(CACHE_DIR, "ai_jobs.db")
+AI_JOB_WORKERS = 4
+AI_JOB_KEEP_SECONDS = 7 * 24 * 3600
+
+# 작업 상태: queued → running → done / failed (실패 시 result 에 대체 분석)
+PENDING_STATES = ("queued", "running")
+
+
+class JobQueue:
+    """프로세스 내 AI 작업 큐"""
+
+    def __init__(self, db_path, max_workers=AI_JOB_WORKERS):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai-job")
+        self._partial = {}     # 실행 중 작업의 받은 만큼의 텍스트
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY, kind TEXT, title TEXT, owner TEXT,
+                status TEXT NOT NULL, result TEXT, error TEXT,
+                created REAL NOT NULL, finished REAL)""")
+            # 서버 재시작으로 끊긴 작업 정리
+            conn.execute("UPDATE jobs SET status = 'failed', error = '서버 재시작으로 중단됨', finished = ? "
+                         "WHERE status IN ('queued', 'running')", (time.time(),))
+            conn.execute("DELETE FROM jobs WHERE created < ?", (time.time() - AI_JOB_KEEP_SECONDS,))
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def submit(self, prompt, kind="", title="", owner="", fallback=None, **call_kwargs):
+        """작업 등록 → 작업 id (call_kwargs 는 stream_claude 인자)"""
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute("INSERT INTO jobs (id, kind, title, owner, status, created) VALUES (?, ?, ?, ?, 'queued', ?)",
+                         (job_id, kind, title, owner, time.time()))
+        self._executor.submit(self._run, job_id, prompt, fallback, call_kwargs)
+        return job_id
+
+    def _run(self, job_id, prompt, fallback, call_kwargs):
+        self._set(job_id, status="running")
+        parts = []
+        try:
+            for chunk in stream_claude(prompt, **call_kwargs):
+                parts.append(chunk)
+                with self._lock:
+                    self._partial[job_id] = "".join(parts)
+            self._set(job_id, status="done", result="".join(parts), finished=time.time())
+        except Exception as e:
+            self._set(job_id, status="failed", result=fallback, error=str(e), finished=time.time())
+        finally:
+            with self._lock:
+                self._partial.pop(job_id, None)
+
+    def _set(self, job_id, **fields):
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id):
+        jobs = self.get_many([job_id])
+        return jobs.get(job_id)
+
+    def get_many(self, job_ids):
+        """작업 id 목록 → {id: 작업} (실행 중이면 partial 에 받은 만큼의 텍스트)"""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return {}
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT * FROM jobs WHERE id IN ({','.join('?' * len(job_ids))})", job_ids).fetchall()
+        jobs = {}
+        with self._lock:
+            for r in rows:
+                job = dict(r)
+                job["partial"] = self._partial.get(r["id"], "")
+                jobs[r["id"]] = job
+        return jobs
+
+
+_QUEUE = None
+_QUEUE_LOCK = threading.Lock()
+
+def get_job_queue():
+    """AI 작업 큐 (프로세스 공용)"""
+    global _QUEUE
+    with _QUEUE_LOCK:
+        if _QUEUE is None:
+            _QUEUE = JobQueue(AI_JOBS_DB)
+    return _QUEUE
@@ -0,0 +1,191 @@
+"""
+법령·고시 조문 색인 (조/항/호 단위 위치, 식품등의 표시기준 PDF 용)
+"""
+import bisect, re, threading
+from collections import OrderedDict
+from data.pdf_extract import PAGE_SEPARATOR
+from data.pdf_cache import content_hash
+
+# 조 제목 행: "제4조(표시대상 및 표시사항)", "제10조의2 (…)" — "제4조제1항에 따라…" 같은 인용 행은 제외
+_ARTICLE_RE = re.compile(r"제\s*(\d+)\s*조(?:\s*의\s*(\d+))?(?:\s*\(([^)\n]{1,60})\)|(?=\s|$))(?!\s*제\s*\d+\s*[항호])")
+# 항: ①~⑳ / 호: "1." "2)" 로 시작하는 행
+_PARAGRAPH_RE = re.compile(r"([①-⑳])")
+_ITEM_RE = re.compile(r"(\d{1,2})\s*[.)]\s")
+# 조문 참조: "제4조", "제4조의2 제2항 제3호", "제4조 ② 3호"
+_REF_RE = re.compile(r"제\s*(\d+)\s*조(?:\s*의\s*(\d+))?"
+                     r"(?:\s*(?:제\s*(\d+)\s*항|([①-⑳])))?"
+                     r"(?:\s*(?:제\s*)?(\d+)\s*호)?")
+
+
+def article_key(no, sub=None):
+    """조 번호 → 표준 표기 ("제4조", "제10조의2")"""
+    return f"제{int(no)}조" + (f"의{int(sub)}" if sub else "")
+
+
+def parse_ref(ref):
+    """조문 참조 문자열 → (조 표기, 항 번호, 호 번호) (없는 부분은 None, 조가 없으면 None)"""
+    m = _REF_RE.search(ref or "")
+    if not m:
+        return None
+    no, sub, para, circled, item = m.groups()
+    if circled:
+        para = ord(circled) - 0x2460 + 1
+    return article_key(no, sub), int(para) if para else None, int(item) if item else None
+
+
+class ArticleIndex:
+    """문서 1건의 조/항/호 위치 색인 — 조문 본문은 원문 구간 슬라이스로 상수 시간 조회"""
+
+    def __init__(self, text):
+        self.text = text
+        self._lower = text.lower()
+        # 조 표기 → {"key", "title", "start", "end", "page", "paragraphs": {항: {"start", "end", "items": {호: (start, end)}}}}
+        self.articles = {}
+        self._page_starts = [0]
+        for page in text.split(PAGE_SEPARATOR)[:-1]:
+            self._page_starts.append(self._page_starts[-1] + len(page) + 1)
+        self._parse()
+
+    def _parse(self):
+        headings = []   # (시작 위치, 조 표기, 제목)
+        marks = []      # (시작 위치, "항"/"호", 번호)
+        pos = 0
+        for line in self.text.split("\n"):
+            stripped = line.lstrip(" \t" + PAGE_SEPARATOR)
+            start = pos + len(line) - len(stripped)
+            pos += len(line) + 1
+            m = _ARTICLE_RE.match(stripped)
+            if m:
+                headings.append((start, article_key(m.group(1), m.group(2)), (m.group(3) or "").strip()))
+                # 제목 행에 바로 ① 이 이어지는 경우
+                rest = stripped[m.end():].lstrip()
+                p = _PARAGRAPH_RE.match(rest)
+                if p:
+                    marks.append((start + len(stripped) - len(rest), "항", ord(p.group(1)) - 0x2460 + 1))
+                continue
+            p = _PARAGRAPH_RE.match(stripped)
+            if p:
+                marks.append((start, "항", ord(p.group(1)) - 0x2460 + 1))
+                continue
+            i = _ITEM_RE.match(stripped)
+            if i:
+                marks.append((start, "호", int(i.group(1))))
+
+        spans = []
+        for k, (start, key, title) in enumerate(headings):
+            end = headings[k + 1][0] if k + 1 < len(headings) else len(self.text)
+            spans.append((start, end, key, title))
+        # 목차 등으로 같은 조가 여러 번 나오면 본문이 가장 긴 것을 사용
+        for start, end, key, title in spans:
+            old = self.articles.get(key)
+            if old is None or end - start > old["end"] - old["start"]:
+                self.articles[key] = {"key": key, "title": title or (old or {}).get("title", ""),
+                                      "start": start, "end": end, "page": self.page_of(start), "paragraphs": {}}
+
+        starts = sorted((a["start"], a["key"]) for a in self.articles.values())
+        start_pos = [s for s, _ in starts]
+        for start, kind, no in marks:
+            j = bisect.bisect_right(start_pos, start) - 1
+            if j < 0:
+                continue
+            art = self.articles[starts[j][1]]
+            if start >= art["end"]:
+                continue
+            if kind == "항":
+                art["paragraphs"][no] = {"start": start, "end": art["end"], "items": {}}
+            else:
+                # 항이 없는 조의 호는 0항 (조 본문) 아래에 둠
+                paras = art["paragraphs"]
+                para = paras[max(paras)] if paras else paras.setdefault(0, {"start": art["start"], "end": art["end"], "items": {}})
+                para["items"][no] = [start, para["end"]]
+        # 항·호 끝 위치 = 다음 항·호 시작
+        for art in self.articles.values():
+            paras = sorted(art["paragraphs"].values(), key=lambda p: p["start"])
+            for a, b in zip(paras, paras[1:]):
+                a["end"] = b["start"]
+            for para in paras:
+                items = sorted(para["items"].values())
+                for a, b in zip(items, items[1:]):
+                    a[1] = b[0]
+                if items:
+                    items[-1][1] = para["end"]
+
+    def __len__(self):
+        return len(self.articles)
+
+    def __contains__(self, ref):
+        return self.span(ref) is not None
+
+    def keys(self):
+        """조 표기 (원문 순서)"""
+        return [a["key"] for a in sorted(self.articles.values(), key=lambda a: a["start"])]
+
+    def page_of(self, offset):
+        """원문 위치 → 페이지 번호"""
+        return bisect.bisect_right(self._page_starts, offset)
+
+    def span(self, ref):
+        """조문 참조 → 원문 구간 (start, end), 없으면 None"""
+        parsed = parse_ref(ref)
+        if parsed is None:
+            return None
+        key, para, item = parsed
+        art = self.articles.get(key)
+        if art is None:
+            return None
+        if para is None and item is None:
+            return art["start"], art["end"]
+        p = art["paragraphs"].get(para if para is not None else 0)
+        if p is None and para is None and art["paragraphs"]:
+            # 항 없이 호만 지정하면 첫 항에서 찾음
+            p = art["paragraphs"][min(art["paragraphs"])]
+        if p is None:
+            return None
+        if item is None:
+            return p["start"], p["end"]
+        span = p["items"].get(item)
+        return tuple(span) if span else None
+
+    def get(self, ref):
+        """조문 참조 → 해당 조/항/호 원문 (없으면 None)"""
+        span = self.span(ref)
+        if span is None:
+            return None
+        return self.text[span[0]:span[1]].replace(PAGE_SEPARATOR, "\n").strip()
+
+    def page(self, ref):
+        """조문 참조 → 시작 페이지 번호 (없으면 None)"""
+        span = self.span(ref)
+        return self.page_of(span[0]) if span else None
+
+    def title(self, ref):
+        parsed = parse_ref(ref)
+        art = self.articles.get(parsed[0]) if parsed else None
+        return art["title"] if art else ""
+
+    def contains(self, ref, keyword):
+        """조문 구간 안에 키워드가 있는지 (대소문자 무시)"""
+        span = self.span(ref)
+        if span is None or not keyword:
+            return False
+        return self._lower.find(keyword.lower(), span[0], span[1]) >= 0
+
+
+_INDEXES = OrderedDict()
+_MAX_INDEXES = 16
+_INDEXES_LOCK = threading.Lock()
+
+def get_article_index(text, key=None):
+    """조문 색인 (내용 해시로 프로세스 공용 캐시, key 를 주면 (TextHandle.key) 본문 해시 생략)"""
+    key = key or content_hash(text.encode("utf-8"))
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(key)
+        if index is not None:
+            _INDEXES.move_to_end(key)
+            return index
+    index = ArticleIndex(text)
+    with _INDEXES_LOCK:
+        _INDEXES[key] = index
+        while len(_INDEXES) > _MAX_INDEXES:
+            _INDEXES.popitem(last=False)
+    return index
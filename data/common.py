@@ -2,14 +2,27 @@
 공통 데이터 & 유틸리티
 """
 import pandas as pd
-import os, json
-from datetime import datetime
+import numpy as np
+import os, json, re, hashlib, threading, unicodedata
+from collections import OrderedDict
+from data.formula_store import get_formula_store
+from data.pdf_cache import DiskLRUCache, content_hash
+from data.pdf_store import SharedTextStore
+from data.pdf_extract import PAGE_SEPARATOR, extract_pdf_pages
 
 # ━━━ 경로 ━━━
 _THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 _APP_DIR = os.path.dirname(_THIS_DIR)
 SAVE_DIR = os.path.join(_APP_DIR, "saved")
 os.makedirs(SAVE_DIR, exist_ok=True)
+FORMULA_DB = os.path.join(SAVE_DIR, "formulas.db")
+CACHE_DIR = os.path.join(_APP_DIR, ".cache")
+PDF_CACHE_DIR = os.path.join(CACHE_DIR, "pdf_text")
+PDF_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# 추출 텍스트 형식이 바뀌면 올려서 이전 캐시 무효화 (2: 페이지 사이 PAGE_SEPARATOR)
+PDF_TEXT_VERSION = 2
+# 세션 공용 PDF 본문 중 메모리에 디코딩해 둘 분량
+PDF_RESIDENT_MAX_BYTES = 64 * 1024 * 1024
 
 # ━━━ 음료 매출 데이터 (백만원) ━━━
 SALES_DATA = {
@@ -132,6 +145,91 @@ INGREDIENT_COSTS = {
     "콜라겐펩타이드":  {"unit_price": 35000, "unit": "원/kg", "supplier": "수입(일본)", "moq": "25kg"},
 }
 
+# ━━━ 원재료 물성 (배합 Brix·감미·산도·pH 환산용) ━━━
+# solids    : 가용성 고형분 비율 (0~1, 배합 Brix ≈ Σ 비율(%) × solids)
+# sweetness : 원료 1g 의 감미 (설탕 1g = 1.0, 배합 설탕환산 감미(%) = Σ 비율(%) × sweetness)
+# acid      : 원료 1g 의 적정산 (구연산 당량 g, 배합 적정산도(%) = Σ 비율(%) × acid)
+# buffer    : 원료 1g 의 완충 염기 (구연산염 당량 g — 구연산나트륨·과즙 칼륨염·유단백 등)
+INGREDIENT_PROPERTIES = {
+    "정제수":          {"solids": 0.0, "sweetness": 0.0, "acid": 0.0, "buffer": 0.0},
+    "과당포도당액":    {"solids": 0.77, "sweetness": 0.77, "acid": 0.0, "buffer": 0.0},
+    "설탕(백설탕)":    {"solids": 1.0, "sweetness": 1.0, "acid": 0.0, "buffer": 0.0},
+    "에리스리톨":      {"solids": 1.0, "sweetness": 0.7, "acid": 0.0, "buffer": 0.0},
+    "수크랄로스":      {"solids": 1.0, "sweetness": 600.0, "acid": 0.0, "buffer": 0.0},
+    "스테비아추출물":  {"solids": 1.0, "sweetness": 300.0, "acid": 0.0, "buffer": 0.0},
+    "아스파탐":        {"solids": 1.0, "sweetness": 200.0, "acid": 0.0, "buffer": 0.0},
+    "구연산":          {"solids": 1.0, "sweetness": 0.0, "acid": 1.0, "buffer": 0.0},
+    "구연산나트륨":    {"solids": 1.0, "sweetness": 0.0, "acid": 0.0, "buffer": 0.65},
+    "인산":            {"solids": 0.85, "sweetness": 0.0, "acid": 1.1, "buffer": 0.0},
+    "젖산":            {"solids": 0.88, "sweetness": 0.0, "acid": 0.63, "buffer": 0.0},
+    "탄산가스(CO2)":   {"solids": 0.0, "sweetness": 0.0, "acid": 0.0, "buffer": 0.0},
+    "탄산가스":        {"solids": 0.0, "sweetness": 0.0, "acid": 0.0, "buffer": 0.0},
+    "천연향료":        {"solids": 0.1, "sweetness": 0.0, "acid": 0.0, "buffer": 0.0},
+    "합성향료":        {"solids": 0.1, "sweetness": 0.0, "acid": 0.0, "buffer": 0.0},
+    "카라멜색소":      {"solids": 0.65, "sweetness": 0.0, "acid": 0.0, "buffer": 0.0},
+    "비타민C":         {"solids": 1.0, "sweetness": 0.0, "acid": 0.36, "buffer": 0.0},
+    "비타민B군":       {"solids": 1.0, "sweetness": 0.0, "acid": 0.0, "buffer": 0.0},
+    "타우린":          {"solids": 1.0, "sweetness": 0.0, "acid": 0.0, "buffer": 0.0},
+    "카페인":          {"solids": 1.0, "sweetness": 0.0, "acid": 0.0, "buffer": 0.0},
+    "L-아르기닌":      {"solids": 1.0, "sweetness": 0.0, "acid": 0.0, "buffer": 0.5},
+    "오렌지농축과즙":  {"solids": 0.65, "sweetness": 0.55, "acid": 0.045, "buffer": 0.06},
+    "사과농축과즙":    {"solids": 0.7, "sweetness": 0.65, "acid": 0.02, "buffer": 0.03},
+    "레몬농축과즙":    {"solids": 0.45, "sweetness": 0.1, "acid": 0.3, "buffer": 0.04},
+    "포도농축과즙":    {"solids": 0.68, "sweetness": 0.6, "acid": 0.03, "buffer": 0.04},
+    "탈지분유환원액":  {"solids": 0.09, "sweetness": 0.015, "acid": 0.0015, "buffer": 0.03},
+    "유산균배양액":    {"solids": 0.12, "sweetness": 0.02, "acid": 0.008, "buffer": 0.02},
+    "포도당":          {"solids": 1.0, "sweetness": 0.7, "acid": 0.0, "buffer": 0.0},
+    "과당":            {"solids": 1.0, "sweetness": 1.5, "acid": 0.0, "buffer": 0.0},
+    "펙틴":            {"solids": 1.0, "sweetness": 0.0, "acid": 0.0, "buffer": 0.0},
+    "잔탄검":          {"solids": 1.0, "sweetness": 0.0, "acid": 0.0, "buffer": 0.0},
+    "CMC":             {"solids": 1.0, "sweetness": 0.0, "acid": 0.0, "buffer": 0.0},
+    "니코틴산아미드":  {"solids": 1.0, "sweetness": 0.0, "acid": 0.0, "buffer": 0.0},
+    "판토텐산칼슘":    {"solids": 1.0, "sweetness": 0.0, "acid": 0.0, "buffer": 0.0},
+    "홍삼농축액":      {"solids": 0.6, "sweetness": 0.1, "acid": 0.01, "buffer": 0.01},
+    "콜라겐펩타이드":  {"solids": 1.0, "sweetness": 0.0, "acid": 0.0, "buffer": 0.05},
+}
+
+# ━━━ 원재료 영양성분 (원료 100g 당 — 열량 kcal, 탄수화물·당류·단백질·지방·포화지방·트랜스지방 g, 콜레스테롤·나트륨 mg) ━━━
+# 당알코올(에리스리톨)은 당류 제외·열량 0, 유기산은 3kcal/g, 식이섬유는 2kcal/g 기준
+INGREDIENT_NUTRIENTS = {
+    "정제수":          {"kcal": 0, "carb": 0, "sugar": 0, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "과당포도당액":    {"kcal": 308, "carb": 77, "sugar": 77, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "설탕(백설탕)":    {"kcal": 400, "carb": 100, "sugar": 100, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "에리스리톨":      {"kcal": 0, "carb": 100, "sugar": 0, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "수크랄로스":      {"kcal": 0, "carb": 0, "sugar": 0, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "스테비아추출물":  {"kcal": 0, "carb": 0, "sugar": 0, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "아스파탐":        {"kcal": 400, "carb": 0, "sugar": 0, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "구연산":          {"kcal": 300, "carb": 0, "sugar": 0, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "구연산나트륨":    {"kcal": 0, "carb": 0, "sugar": 0, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 23500},
+    "인산":            {"kcal": 0, "carb": 0, "sugar": 0, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "젖산":            {"kcal": 264, "carb": 0, "sugar": 0, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "탄산가스(CO2)":   {"kcal": 0, "carb": 0, "sugar": 0, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "탄산가스":        {"kcal": 0, "carb": 0, "sugar": 0, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "천연향료":        {"kcal": 0, "carb": 0, "sugar": 0, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "합성향료":        {"kcal": 0, "carb": 0, "sugar": 0, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "카라멜색소":      {"kcal": 260, "carb": 65, "sugar": 10, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 100},
+    "비타민C":         {"kcal": 0, "carb": 0, "sugar": 0, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "비타민B군":       {"kcal": 0, "carb": 0, "sugar": 0, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "타우린":          {"kcal": 0, "carb": 0, "sugar": 0, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "카페인":          {"kcal": 0, "carb": 0, "sugar": 0, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "L-아르기닌":      {"kcal": 400, "carb": 0, "sugar": 0, "protein": 100, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "오렌지농축과즙":  {"kcal": 240, "carb": 60, "sugar": 52, "protein": 3.5, "fat": 0.3, "sat_fat": 0.04, "trans_fat": 0, "chol": 0, "sodium": 10},
+    "사과농축과즙":    {"kcal": 270, "carb": 68, "sugar": 62, "protein": 0.3, "fat": 0.3, "sat_fat": 0.05, "trans_fat": 0, "chol": 0, "sodium": 25},
+    "레몬농축과즙":    {"kcal": 140, "carb": 12, "sugar": 8, "protein": 2, "fat": 0.5, "sat_fat": 0.07, "trans_fat": 0, "chol": 0, "sodium": 10},
+    "포도농축과즙":    {"kcal": 260, "carb": 65, "sugar": 62, "protein": 1, "fat": 0.2, "sat_fat": 0.05, "trans_fat": 0, "chol": 0, "sodium": 15},
+    "탈지분유환원액":  {"kcal": 35, "carb": 5, "sugar": 5, "protein": 3.4, "fat": 0.1, "sat_fat": 0.06, "trans_fat": 0, "chol": 2, "sodium": 45},
+    "유산균배양액":    {"kcal": 40, "carb": 6, "sugar": 5, "protein": 3, "fat": 0.1, "sat_fat": 0.05, "trans_fat": 0, "chol": 2, "sodium": 40},
+    "포도당":          {"kcal": 400, "carb": 100, "sugar": 100, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "과당":            {"kcal": 400, "carb": 100, "sugar": 100, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "펙틴":            {"kcal": 200, "carb": 100, "sugar": 0, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "잔탄검":          {"kcal": 200, "carb": 100, "sugar": 0, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 1500},
+    "CMC":             {"kcal": 0, "carb": 100, "sugar": 0, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 8000},
+    "니코틴산아미드":  {"kcal": 0, "carb": 0, "sugar": 0, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "판토텐산칼슘":    {"kcal": 0, "carb": 0, "sugar": 0, "protein": 0, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 0},
+    "홍삼농축액":      {"kcal": 290, "carb": 68, "sugar": 20, "protein": 3, "fat": 0.5, "sat_fat": 0.1, "trans_fat": 0, "chol": 0, "sodium": 20},
+    "콜라겐펩타이드":  {"kcal": 368, "carb": 0, "sugar": 0, "protein": 92, "fat": 0, "sat_fat": 0, "trans_fat": 0, "chol": 0, "sodium": 300},
+}
+
 # ━━━ 표준 배합비 (비교 기준용, 100% 기준) ━━━
 STANDARD_FORMULATIONS = {
     "탄산음료 표준 (콜라타입)": {
@@ -203,6 +301,18 @@ def get_sorted_categories():
     """2024 매출 높은 순으로 정렬"""
     return sorted(SALES_DATA.keys(), key=lambda c: SALES_DATA[c]["2024"], reverse=True)
 
+def formula_column_map(columns):
+    """CSV 헤더 → 표준 컬럼명 매핑 (원료명/함량/비율(%)/기능/등급)"""
+    col_map = {}
+    for c in columns:
+        cl = c.strip().lower()
+        if "원료" in cl or "name" in cl: col_map[c] = "원료명"
+        elif "함량" in cl or "amount" in cl: col_map[c] = "함량"
+        elif "비율" in cl or "%" in cl or "pct" in cl: col_map[c] = "비율(%)"
+        elif "기능" in cl or "func" in cl: col_map[c] = "기능"
+        elif "등급" in cl or "grade" in cl: col_map[c] = "등급"
+    return col_map
+
 def parse_csv_formula(text):
     """CSV 텍스트 → DataFrame 파싱"""
     import io
@@ -214,15 +324,7 @@ def parse_csv_formula(text):
             return None, "최소 헤더+1행 필요"
         df = pd.read_csv(io.StringIO(text))
         # 컬럼 표준화
-        col_map = {}
-        for c in df.columns:
-            cl = c.strip().lower()
-            if "원료" in cl or "name" in cl: col_map[c] = "원료명"
-            elif "함량" in cl or "amount" in cl: col_map[c] = "함량"
-            elif "비율" in cl or "%" in cl or "pct" in cl: col_map[c] = "비율(%)"
-            elif "기능" in cl or "func" in cl: col_map[c] = "기능"
-            elif "등급" in cl or "grade" in cl: col_map[c] = "등급"
-        df = df.rename(columns=col_map)
+        df = df.rename(columns=formula_column_map(df.columns))
         if "원료명" not in df.columns:
             return None, "'원료명' 컬럼을 찾을 수 없습니다"
         if "비율(%)" in df.columns:
@@ -231,150 +333,734 @@ def parse_csv_formula(text):
     except Exception as e:
         return None, str(e)
 
-def validate_formula(df, meta=None):
-    """배합비 검증"""
+def frame_key(df, *extra):
+    """DataFrame 내용 + 추가 값 → 해시 키 (계산 결과 재사용용)"""
+    h = hashlib.sha256("|".join(map(str, df.columns)).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    for x in extra:
+        h.update(b"\0" + repr(x).encode("utf-8"))
+    return h.hexdigest()
+
+# ━━━ 배합 검증 규칙표 ━━━
+# check 종류
+#   sum_range    : column 합계가 [min, max] 밖이면 below/above 메시지, 안이면 ok 메시지 (컬럼 없으면 생략)
+#   contains_any : column 값(소문자)에 pattern 이 든 행이 하나도 없으면 message
+#                  (optional=True 면 컬럼이 없을 때 생략, 아니면 없는 것으로 봄)
+#   min_rows     : 원료 행 수가 min 미만이면 message
+#   meta_range   : meta[key] 가 있고 [min, max] 밖이면 message
+#                  meta 에 값이 없고 estimate 가 있으면 물성표 추정값으로 검사해 estimate_message (실측이 아니라 경고로)
+FORMULA_RULES = [
+    {"id": "ratio_total", "label": "비율 합계 99~101%", "check": "sum_range", "column": "비율(%)", "min": 99, "max": 101, "level": "issue",
+     "below": "비율 합계 {value:.1f}% — 100%에 미달 ({gap:.1f}% 부족)",
+     "above": "비율 합계 {value:.1f}% — 100% 초과",
+     "ok": "비율 합계 {value:.1f}% ✓"},
+    {"id": "water", "label": "정제수", "check": "contains_any", "column": "원료명", "pattern": "정제수|물", "optional": False,
+     "level": "warning", "message": "정제수(식품용수)가 없습니다"},
+    {"id": "sweetener", "label": "감미료", "check": "contains_any", "column": "기능", "pattern": "감미", "optional": True,
+     "level": "warning", "message": "감미료가 없습니다"},
+    {"id": "acidulant", "label": "산미료", "check": "contains_any", "column": "기능", "pattern": "산미", "optional": True,
+     "level": "warning", "message": "산미료가 없습니다"},
+    {"id": "min_count", "label": "원료 3종 이상", "check": "min_rows", "min": 3, "level": "issue", "message": "원료 3종 미만"},
+    {"id": "brix", "label": "Brix 1~70°", "check": "meta_range", "key": "brix", "min": 1, "max": 70, "level": "issue",
+     "message": "Brix {value}° — 범위(1~70°) 벗어남",
+     "estimate": "brix", "estimate_message": "추정 Brix {value:.1f}° — 범위(1~70°) 벗어남 (물성표 환산)"},
+    {"id": "pH", "label": "pH 2~8", "check": "meta_range", "key": "pH", "min": 2, "max": 8, "level": "issue",
+     "message": "pH {value} — 범위(2~8) 벗어남",
+     "estimate": "pH", "estimate_message": "추정 pH {value:.2f} — 범위(2~8) 벗어남 (물성표 환산)"},
+]
+# 일괄 검증 결과 코드
+RULE_OK, RULE_WARNING, RULE_ISSUE = 0, 1, 2
+
+
+def formula_aggregates(df):
+    """배합 DataFrame → 규칙별 집계값 {규칙 id: 합계·해당 행 수·행 수·추정 물성} (컬럼이 없으면 None)"""
+    agg, estimates = {}, None
+    for rule in FORMULA_RULES:
+        col = rule.get("column")
+        if rule["check"] == "sum_range":
+            agg[rule["id"]] = df[col].sum() if col in df.columns else None
+        elif rule["check"] == "contains_any":
+            if col in df.columns:
+                values = df[col].fillna("").astype(str).str.lower()
+                agg[rule["id"]] = int(values.str.contains(rule["pattern"], regex=True).sum())
+            else:
+                agg[rule["id"]] = None
+        elif rule["check"] == "min_rows":
+            agg[rule["id"]] = len(df)
+        elif rule["check"] == "meta_range" and rule.get("estimate"):
+            if "원료명" in df.columns and "비율(%)" in df.columns:
+                if estimates is None:
+                    estimates = estimate_properties(df)
+                agg[rule["id"]] = estimates[rule["estimate"]]
+            else:
+                agg[rule["id"]] = None
+    return agg
+
+
+def formula_verdict(agg, meta=None):
+    """규칙별 집계값 → 검증 결과 {"issues", "warnings", "passed"}"""
     issues, warnings = [], []
-    if "비율(%)" in df.columns:
-        total = df["비율(%)"].sum()
-        if total < 99:
-            issues.append(f"비율 합계 {total:.1f}% — 100%에 미달 ({100-total:.1f}% 부족)")
-        elif total > 101:
-            issues.append(f"비율 합계 {total:.1f}% — 100% 초과")
-        else:
-            warnings.append(f"비율 합계 {total:.1f}% ✓")
-    
-    names = df["원료명"].str.lower().tolist() if "원료명" in df.columns else []
-    if not any("정제수" in n or "물" in n for n in names):
-        warnings.append("정제수(식품용수)가 없습니다")
-    if "기능" in df.columns:
-        funcs = df["기능"].str.lower().fillna("").tolist()
-        if not any("감미" in f for f in funcs):
-            warnings.append("감미료가 없습니다")
-        if not any("산미" in f for f in funcs):
-            warnings.append("산미료가 없습니다")
-    if len(df) < 3:
-        issues.append("원료 3종 미만")
-    
-    if meta:
-        brix = meta.get("brix")
-        if brix and (brix < 1 or brix > 70):
-            issues.append(f"Brix {brix}° — 범위(1~70°) 벗어남")
-        pH = meta.get("pH")
-        if pH and (pH < 2 or pH > 8):
-            issues.append(f"pH {pH} — 범위(2~8) 벗어남")
-    
+    out = {"issue": issues, "warning": warnings}
+    for rule in FORMULA_RULES:
+        check = rule["check"]
+        if check == "meta_range":
+            value = (meta or {}).get(rule["key"])
+            if value:
+                if value < rule["min"] or value > rule["max"]:
+                    out[rule["level"]].append(rule["message"].format(value=value))
+            elif agg.get(rule["id"]) is not None:
+                value = agg[rule["id"]]
+                if value < rule["min"] or value > rule["max"]:
+                    warnings.append(rule["estimate_message"].format(value=value))
+            continue
+        value = agg.get(rule["id"])
+        if check == "sum_range":
+            if value is None:
+                continue
+            if value < rule["min"]:
+                out[rule["level"]].append(rule["below"].format(value=value, gap=100 - value))
+            elif value > rule["max"]:
+                out[rule["level"]].append(rule["above"].format(value=value))
+            else:
+                warnings.append(rule["ok"].format(value=value))
+        elif check == "contains_any":
+            if value is None and rule["optional"]:
+                continue
+            if not value:
+                out[rule["level"]].append(rule["message"])
+        elif check == "min_rows":
+            if value < rule["min"]:
+                out[rule["level"]].append(rule["message"])
     return {"issues": issues, "warnings": warnings, "passed": len(issues) == 0}
 
+
+def validate_formula(df, meta=None):
+    """배합비 검증 (FORMULA_RULES 기준)"""
+    return formula_verdict(formula_aggregates(df), meta)
+
+
+def validate_formulas_batch(formulations, metas=None):
+    """여러 배합 일괄 검증 → 배합 × 규칙 코드 행렬 (RULE_OK / RULE_WARNING / RULE_ISSUE)
+
+    formulations: {이름: DataFrame}, metas: {이름: meta} (meta 에 없는 Brix·pH 는 물성표 추정값으로 경고 수준 검사)
+    모든 배합의 행을 한 배열로 이어 붙여 규칙마다 한 번씩만 계산한다.
+    """
+    labels = list(formulations)
+    # 파싱 실패(None) 배합은 행 0개로 검사 (원료 수·필수 원료 규칙에 걸림)
+    frames = [formulations[k] if formulations[k] is not None else pd.DataFrame() for k in labels]
+    n = len(frames)
+    sizes = np.array([len(f) for f in frames], dtype=int)
+    codes = np.repeat(np.arange(n), sizes)
+    metas = metas or {}
+
+    def column(col):
+        values, present = [], np.zeros(n, dtype=bool)
+        for i, f in enumerate(frames):
+            if col in f.columns:
+                values.extend(f[col].tolist())
+                present[i] = True
+            else:
+                values.extend([None] * len(f))
+        return pd.Series(values, dtype=object), present
+
+    result, estimates = {}, None
+    for rule in FORMULA_RULES:
+        check, code = rule["check"], np.full(n, RULE_OK, dtype=np.int8)
+        level = RULE_ISSUE if rule["level"] == "issue" else RULE_WARNING
+        if check == "sum_range":
+            values, present = column(rule["column"])
+            total = np.bincount(codes, weights=pd.to_numeric(values, errors="coerce").fillna(0).to_numpy(float), minlength=n)
+            code[present & ((total < rule["min"]) | (total > rule["max"]))] = level
+        elif check == "contains_any":
+            values, present = column(rule["column"])
+            hit = values.fillna("").astype(str).str.lower().str.contains(rule["pattern"], regex=True).to_numpy(bool)
+            found = np.bincount(codes, weights=hit, minlength=n) > 0
+            missing = ~found if not rule["optional"] else (present & ~found)
+            code[missing] = level
+        elif check == "min_rows":
+            code[sizes < rule["min"]] = level
+        elif check == "meta_range":
+            values = np.array([float(metas.get(k, {}).get(rule["key"]) or np.nan) for k in labels], dtype=float)
+            with np.errstate(invalid="ignore"):
+                code[(values < rule["min"]) | (values > rule["max"])] = level
+                if rule.get("estimate"):
+                    if estimates is None:
+                        estimates = estimate_properties_batch(formulations)
+                    est = estimates[ESTIMATE_COLUMNS[rule["estimate"]]].to_numpy()
+                    usable = np.isnan(values) & np.array(["원료명" in f.columns and "비율(%)" in f.columns for f in frames])
+                    code[usable & ((est < rule["min"]) | (est > rule["max"]))] = RULE_WARNING
+        result[rule["id"]] = code
+
+    matrix = pd.DataFrame(result, index=pd.Index(labels, name="배합명"))
+    matrix["이슈"] = (matrix == RULE_ISSUE).sum(axis=1)
+    matrix["경고"] = (matrix[[r["id"] for r in FORMULA_RULES]] == RULE_WARNING).sum(axis=1)
+    matrix["통과"] = matrix["이슈"] == 0
+    return matrix
+
+def get_store():
+    """저장 배합비 DB (최초 실행 시 기존 JSON 파일 이관)"""
+    return get_formula_store(FORMULA_DB, json_dir=SAVE_DIR)
+
 def save_formula(name, df, meta, student_name="default"):
-    """배합비를 JSON으로 저장"""
-    filepath = os.path.join(SAVE_DIR, f"{student_name}_{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
-    data = {
-        "name": name,
-        "student": student_name,
-        "meta": meta,
-        "ingredients": df.to_dict(orient="records"),
-        "timestamp": datetime.now().isoformat(),
-    }
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    return filepath
-
-def load_saved_formulas():
-    """저장된 배합비 목록"""
-    results = []
-    for fn in sorted(os.listdir(SAVE_DIR), reverse=True):
-        if fn.endswith(".json"):
-            try:
-                with open(os.path.join(SAVE_DIR, fn), "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                data["filename"] = fn
-                results.append(data)
-            except:
-                pass
-    return results
+    """배합비를 DB에 저장 → 저장 id"""
+    return get_store().insert(name, student_name, meta, df.to_dict(orient="records"))
+
+def load_saved_formulas(limit=None, offset=0, student=None, name=None, order_by="timestamp"):
+    """저장된 배합비 목록 (최신순, 페이지 단위)"""
+    return get_store().list(limit=limit, offset=offset, student=student, name=name, order_by=order_by)
+
+def count_saved_formulas(student=None, name=None):
+    """저장된 배합비 건수"""
+    return get_store().count(student=student, name=name)
+
+
+def _normalize_name(name):
+    """원료명 정규화 (전각→반각, 공백 제거, 소문자)"""
+    if name is None or (isinstance(name, float) and np.isnan(name)):
+        return ""
+    return re.sub(r"\s+", "", unicodedata.normalize("NFKC", str(name))).lower()
+
+
+# 원료명 검색 결과를 기억해 둘 최대 개수 (편집 중 입력한 부분 원료명이 쌓이지 않게 LRU)
+LOOKUP_MEMO_MAX = 4096
+
+
+class IngredientIndex:
+    """원재료 단가 검색 인덱스 (정확 일치 → 최장 부분 일치)"""
+
+    def __init__(self, costs):
+        # 단가표 내용 해시 (원가 계산 결과 재사용 키)
+        self.signature = content_hash(json.dumps([(k, costs[k].get("unit_price", 0)) for k in costs],
+                                                 ensure_ascii=False, default=str).encode("utf-8"))
+        self.keys = list(costs.keys())
+        self.prices = np.array([float(costs[k].get("unit_price", 0)) for k in self.keys], dtype=float)
+        self.prices_ext = np.append(self.prices, 0.0)
+        self.keys_ext = np.array(self.keys + [""], dtype=object)
+        self._norm = [_normalize_name(k) for k in self.keys]
+        self._exact = {}
+        # 부분문자열 → 그 부분문자열을 포함하는 원료 중 가장 짧은 원료 (name in key 검색용)
+        self._contained = {}
+        for i, nk in enumerate(self._norm):
+            if not nk:
+                continue
+            self._exact.setdefault(nk, i)
+            for s in range(len(nk)):
+                for e in range(s + 1, len(nk) + 1):
+                    sub = nk[s:e]
+                    j = self._contained.get(sub)
+                    if j is None or len(nk) < len(self._norm[j]):
+                        self._contained[sub] = i
+        self._memo = OrderedDict()
+        self._memo_lock = threading.Lock()
+
+    def lookup(self, name):
+        """원료명 → 단가표 위치 (-1: 미매칭)"""
+        nn = _normalize_name(name)
+        with self._memo_lock:
+            idx = self._memo.get(nn)
+            if idx is not None:
+                self._memo.move_to_end(nn)
+                return idx
+        idx = self._exact.get(nn, -1) if nn else -1
+        if idx < 0 and nn:
+            # name in key: 입력명을 포함하는 원료 (겹치는 길이 = 입력명 전체)
+            idx = self._contained.get(nn, -1)
+        if idx < 0 and nn:
+            # key in name: 입력명에 포함된 원료 중 가장 긴 것
+            best_len = 0
+            for s in range(len(nn)):
+                for e in range(len(nn), s + best_len, -1):
+                    j = self._exact.get(nn[s:e])
+                    if j is not None:
+                        idx, best_len = j, e - s
+                        break
+        with self._memo_lock:
+            self._memo[nn] = idx
+            if len(self._memo) > LOOKUP_MEMO_MAX:
+                self._memo.popitem(last=False)
+        return idx
+
+    def lookup_many(self, names):
+        """원료명 배열 → 단가표 위치 배열 (고유값 단위로 1회 검색)"""
+        names = pd.Series(names, dtype=object).fillna("").astype(str).to_numpy(dtype=object)
+        uniq, inv = np.unique(names, return_inverse=True)
+        pos = np.fromiter((self.lookup(n) for n in uniq), dtype=np.int64, count=len(uniq))
+        return pos[inv].reshape(-1)
+
+
+_INDEX_CACHE = {"sig": None, "index": None}
+
+def get_ingredient_index(costs=None):
+    """단가표 인덱스 (단가표가 바뀌면 재생성)"""
+    costs = INGREDIENT_COSTS if costs is None else costs
+    sig = tuple((k, v.get("unit_price", 0)) for k, v in costs.items())
+    if _INDEX_CACHE["sig"] != sig:
+        _INDEX_CACHE["index"] = IngredientIndex(costs)
+        _INDEX_CACHE["sig"] = sig
+    return _INDEX_CACHE["index"]
+
+
+_PROPERTY_INDEXES = {}   # id(물성표) → {"props", "index", "tables"} (원료 물성표·영양성분표 등)
+_PROPERTY_INDEXES_MAX = 8
+
+def property_table(fields, props=None):
+    """물성표 → (이름 검색 인덱스, 물성 행렬 (물성표 원료 + 미매칭 0행) × fields)
+
+    물성표 객체마다 한 번만 만든다 — 물성표 내용을 직접 고쳤으면 invalidate_property_tables() 후 다시 부른다.
+    """
+    props = INGREDIENT_PROPERTIES if props is None else props
+    entry = _PROPERTY_INDEXES.get(id(props))
+    # 물성표 참조를 함께 들고 있어 살아 있는 동안 id 가 재사용되지 않음
+    if entry is None or entry["props"] is not props:
+        if len(_PROPERTY_INDEXES) >= _PROPERTY_INDEXES_MAX:
+            _PROPERTY_INDEXES.clear()
+        entry = _PROPERTY_INDEXES[id(props)] = {"props": props, "index": IngredientIndex(props), "tables": {}}
+    index = entry["index"]
+    table = entry["tables"].get(tuple(fields))
+    if table is None:
+        # 마지막 행 = 미매칭(-1) 원료의 0 물성
+        table = np.array([[float(props[k].get(f, 0.0)) for f in fields] for k in index.keys] + [[0.0] * len(fields)])
+        entry["tables"][tuple(fields)] = table
+    return index, table
+
+
+def invalidate_property_tables(props=None):
+    """고친 물성표의 캐시된 인덱스·행렬 폐기 (props 가 None 이면 전부)"""
+    if props is None:
+        _PROPERTY_INDEXES.clear()
+    else:
+        _PROPERTY_INDEXES.pop(id(props), None)
+
+
+def property_matrix(names, fields=("solids", "sweetness"), props=None):
+    """원료명 배열 → 물성 행렬 (원료 × fields, 단가표와 같은 이름 매칭, 물성표에 없는 원료는 0)"""
+    index, table = property_table(fields, props)
+    return table[index.lookup_many(names)]
+
+
+# ━━━ 배합 물성 추정 (Brix·적정산도·pH, 실측 전 근사) ━━━
+# 산 전체를 구연산 당량의 단일 약산(1차 해리)으로, 완충 염기를 그 짝염기로 보고 [H+] 를 푼다
+PH_PKA = 3.13
+PH_NEUTRAL = 7.0
+CITRIC_MW = 192.12
+ESTIMATE_FIELDS = ("solids", "acid", "buffer")
+# estimate_properties 키 → estimate_properties_batch 열
+ESTIMATE_COLUMNS = {"brix": "Brix", "acidity": "산도(%)", "pH": "pH"}
+
+
+def estimate_from_totals(solids, acid, buffer):
+    """Σ 비율(%)×물성 합계 → (Brix, 적정산도(%), pH) — 배열을 넣으면 배열로"""
+    solids, acid, buffer = (np.asarray(v, dtype=float) for v in (solids, acid, buffer))
+    ca = acid * 10 / CITRIC_MW     # % (g/100ml, 밀도 1 근사) → mol/L
+    cb = buffer * 10 / CITRIC_MW
+    ka = 10 ** -PH_PKA
+    # [H+]² + (cb + ka)[H+] − ka·ca = 0 의 양의 근 (완충이 클 때 자릿수 손실 없는 형태)
+    b = cb + ka
+    h = 2 * ka * ca / (b + np.sqrt(b * b + 4 * ka * ca))
+    with np.errstate(divide="ignore"):
+        ph = np.where(ca > 0, np.minimum(-np.log10(np.where(h > 0, h, 1.0)), PH_NEUTRAL), PH_NEUTRAL)
+    return solids, acid, ph
+
+
+def estimate_properties(df):
+    """배합 DataFrame → {"brix", "acidity", "pH"} 추정값 (물성표에 없는 원료는 0으로 봄)"""
+    if df is None or "원료명" not in df.columns or "비율(%)" not in df.columns or len(df) == 0:
+        return {"brix": 0.0, "acidity": 0.0, "pH": PH_NEUTRAL}
+    pct = pd.to_numeric(df["비율(%)"], errors="coerce").fillna(0).to_numpy(dtype=float)
+    totals = pct @ property_matrix(df["원료명"].fillna("").astype(str).tolist(), ESTIMATE_FIELDS)
+    brix, acidity, ph = estimate_from_totals(*totals)
+    return {"brix": float(brix), "acidity": float(acidity), "pH": float(ph)}
+
+
+def estimate_properties_batch(formulations):
+    """여러 배합 일괄 추정 → DataFrame (index 배합명, 열 Brix / 산도(%) / pH)
+
+    모든 배합의 원료를 한 배열로 이어 물성 조회 1회 + 배합별 합계(bincount)로 계산한다.
+    """
+    labels = list(formulations)
+    names, pcts, rows = [], [], []
+    for i, label in enumerate(labels):
+        df = formulations[label]
+        if df is None or "원료명" not in df.columns or "비율(%)" not in df.columns:
+            continue
+        names += df["원료명"].tolist()
+        pcts += df["비율(%)"].tolist()
+        rows += [i] * len(df)
+    pcts = pd.to_numeric(pd.Series(pcts, dtype=object), errors="coerce").fillna(0).to_numpy(dtype=float)
+    props = property_matrix(names, ESTIMATE_FIELDS) if names else np.zeros((0, len(ESTIMATE_FIELDS)))
+    totals = [np.bincount(np.asarray(rows, dtype=np.int64), weights=pcts * props[:, k], minlength=len(labels))
+              for k in range(len(ESTIMATE_FIELDS))]
+    brix, acidity, ph = estimate_from_totals(*totals)
+    return pd.DataFrame({"Brix": brix, "산도(%)": acidity, "pH": ph}, index=pd.Index(labels, name="배합명"))
 
 
 def calc_cost_table(df, volume_ml=500):
     """배합비 DataFrame에 원가 컬럼 추가"""
-    costs = []
-    for _, row in df.iterrows():
-        name = row.get("원료명", "")
-        pct = float(row.get("비율(%)", 0))
-        # 원료명으로 단가 검색 (부분 매칭)
-        unit_price = 0
-        matched = ""
-        for key, info in INGREDIENT_COSTS.items():
-            if key in name or name in key:
-                unit_price = info["unit_price"]
-                matched = key
-                break
-        # g 기준 환산: volume_ml * pct/100 = g, 단가는 원/kg이므로 /1000
-        amount_g = volume_ml * pct / 100
-        cost_per_unit = amount_g * unit_price / 1000  # 원
-        costs.append({
-            "원료명": name,
-            "비율(%)": pct,
-            "함량(g)": round(amount_g, 2),
-            "단가(원/kg)": unit_price,
-            "원가(원)": round(cost_per_unit, 2),
-            "매칭원료": matched,
-        })
-    return pd.DataFrame(costs)
+    index = get_ingredient_index()
+    n = len(df)
+    names = df["원료명"].fillna("").astype(str).to_numpy(dtype=object) if "원료명" in df.columns else np.full(n, "", dtype=object)
+    pct = pd.to_numeric(df["비율(%)"], errors="coerce").fillna(0).to_numpy(dtype=float) if "비율(%)" in df.columns else np.zeros(n)
+    # 미매칭(-1)은 끝에 붙인 0원/빈 원료명으로 떨어짐
+    pos = index.lookup_many(names)
+    unit_price = index.prices_ext[pos]
+    # g 기준 환산: volume_ml * pct/100 = g, 단가는 원/kg이므로 /1000
+    amount_g = volume_ml * pct / 100
+    cost = amount_g * unit_price / 1000  # 원
+    return pd.DataFrame({
+        "원료명": names,
+        "비율(%)": pct,
+        "함량(g)": np.round(amount_g, 2),
+        "단가(원/kg)": unit_price,
+        "원가(원)": np.round(cost, 2),
+        "매칭원료": index.keys_ext[pos],
+    })
+
+
+def build_ratio_matrix(formulations, index=None):
+    """배합비 묶음 → (배합명, 배합 × 원료 비율행렬, 행렬 열의 단가표 위치, 배합별 미매칭 원료 수)"""
+    index = index or get_ingredient_index()
+    labels = list(formulations.keys())
+    names, pcts, rows = [], [], []
+    for i, label in enumerate(labels):
+        df = formulations[label]
+        if df is None or "원료명" not in df.columns:
+            continue
+        names += df["원료명"].tolist()
+        pcts += df["비율(%)"].tolist() if "비율(%)" in df.columns else [0] * len(df)
+        rows += [i] * len(df)
+    if not rows:
+        return labels, np.zeros((len(labels), 0)), np.zeros(0, dtype=np.int64), np.zeros(len(labels), dtype=np.int64)
+    pcts = pd.to_numeric(pd.Series(pcts, dtype=object), errors="coerce").fillna(0).to_numpy(dtype=float)
+    rows = np.asarray(rows, dtype=np.int64)
+    pos = index.lookup_many(names)
+    # 실제 쓰인 원료만 열로 사용 (미매칭 -1 도 한 열로 모음)
+    used, cols = np.unique(pos, return_inverse=True)
+    matrix = np.zeros((len(labels), len(used)))
+    np.add.at(matrix, (rows, cols.reshape(-1)), pcts)
+    unmatched = np.bincount(rows, weights=(pos < 0), minlength=len(labels)).astype(np.int64)
+    return labels, matrix, used, unmatched
+
+
+def calc_cost_batch(formulations, volume_ml=500, batch=1):
+    """여러 배합비 일괄 원가 계산 (비율행렬 × 단가벡터 1회)"""
+    index = get_ingredient_index()
+    labels, matrix, used, unmatched = build_ratio_matrix(formulations, index)
+    per_bottle = matrix @ index.prices_ext[used] * volume_ml / 100 / 1000 if len(used) else np.zeros(len(labels))
+    counts = [len(formulations[l]) if formulations[l] is not None else 0 for l in labels]
+    return pd.DataFrame({
+        "배합명": labels,
+        "원료 종류": counts,
+        "비율 합계(%)": matrix.sum(axis=1).round(3) if len(used) else np.zeros(len(labels)),
+        "미매칭 원료": unmatched,
+        "1병 원가(원)": np.round(per_bottle, 2),
+        "배치원가(원)": np.round(per_bottle * batch, 0),
+    })
+
+
+# ━━━ 배합 CSV 캐시 (CSV 내용 해시 키, 페이지·세션 공용) ━━━
+FORMULA_CACHE_SIZE = 512
+# CSV 1건당 보관할 검증(meta별)·원가(용량·단가표별) 결과 수
+FORMULA_CACHE_VARIANTS = 8
+
+
+class FormulaCache:
+    """CSV 텍스트 → 파싱된 배합 DataFrame + 검증·원가 결과 (최근 사용 순 max_entries 건)
+
+    같은 CSV를 배합연습·설계·원가 페이지가 주고받으므로 pandas 파싱은 내용당 한 번만 한다.
+    꺼내는 DataFrame 은 복사본이라 호출한 쪽에서 수정해도 캐시는 그대로다.
+    """
+
+    def __init__(self, max_entries=FORMULA_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, text):
+        key = content_hash(text.encode("utf-8"))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        df, msg = parse_csv_formula(text)
+        entry = {"df": df, "msg": msg, "validation": OrderedDict(), "cost": OrderedDict()}
+        with self._lock:
+            entry = self._entries.setdefault(key, entry)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def _variant(store, key, compute):
+        value = store.get(key)
+        if value is None:
+            value = store[key] = compute()
+            while len(store) > FORMULA_CACHE_VARIANTS:
+                store.popitem(last=False)
+        return value
+
+    def parse(self, text):
+        """parse_csv_formula 와 같은 (DataFrame 또는 None, 메시지)"""
+        entry = self._entry(text)
+        return (entry["df"].copy() if entry["df"] is not None else None), entry["msg"]
+
+    def validate(self, text, meta=None):
+        """validate_formula 결과 (파싱 실패 시 None)"""
+        entry = self._entry(text)
+        if entry["df"] is None:
+            return None
+        mkey = json.dumps(meta or {}, sort_keys=True, default=str)
+        result = self._variant(entry["validation"], mkey, lambda: validate_formula(entry["df"], meta))
+        return {k: list(v) if isinstance(v, list) else v for k, v in result.items()}
+
+    def cost(self, text, volume_ml=500):
+        """calc_cost_table 결과 (파싱 실패·비율 컬럼 없음이면 None, 단가표가 바뀌면 다시 계산)"""
+        entry = self._entry(text)
+        if entry["df"] is None or "비율(%)" not in entry["df"].columns:
+            return None
+        ckey = (volume_ml, get_ingredient_index().signature)
+        return self._variant(entry["cost"], ckey, lambda: calc_cost_table(entry["df"], volume_ml)).copy()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_FORMULA_CACHE = FormulaCache()
+
+def get_formula_cache():
+    """배합 CSV 캐시 (프로세스 공용)"""
+    return _FORMULA_CACHE
+
+
+def parse_csv_cached(text):
+    """parse_csv_formula 의 캐시판 (같은 CSV는 다시 파싱하지 않음)"""
+    return _FORMULA_CACHE.parse(text)
+
+
+def _saved_label(s):
+    return f"{s.get('name', '?')} ({s.get('student', '?')}) {str(s.get('timestamp', ''))[:16]}"
+
+
+def saved_to_formulations(saved):
+    """저장된 배합비 목록 → {표시명: DataFrame}"""
+    result = {}
+    for s in saved:
+        result[_saved_label(s)] = pd.DataFrame(s.get("ingredients", []))
+    return result
+
+
+def saved_to_metas(saved):
+    """저장된 배합비 목록 → {표시명: {"brix", "pH"}} (숫자가 아닌 값은 None, 일괄 검증용)"""
+    def num(v):
+        try:
+            return float(v)
+        except (TypeError, ValueError):
+            return None
+    return {_saved_label(s): {"brix": num((s.get("meta") or {}).get("brix")), "pH": num((s.get("meta") or {}).get("pH"))}
+            for s in saved}
+
+
+def load_formulations_from_dir(path):
+    """폴더 내 CSV/JSON 배합비 일괄 로드 → {파일명: DataFrame}"""
+    result = {}
+    for fn in sorted(os.listdir(path)):
+        fp = os.path.join(path, fn)
+        try:
+            if fn.lower().endswith(".csv"):
+                with open(fp, "r", encoding="utf-8-sig") as f:
+                    df, _ = parse_csv_formula(f.read())
+            elif fn.lower().endswith(".json"):
+                with open(fp, "r", encoding="utf-8") as f:
+                    df = pd.DataFrame(json.load(f).get("ingredients", []))
+            else:
+                continue
+        except Exception:
+            continue
+        if df is not None:
+            result[fn] = df
+    return result
+
+
+def _ratio_series(df):
+    """배합 DataFrame → 정규화 원료명 인덱스의 비율 Series + {정규화명: 표시명} (같은 원료가 여러 번이면 마지막 값)"""
+    if "원료명" not in df.columns or "비율(%)" not in df.columns or len(df) == 0:
+        return pd.Series(dtype=float), {}
+    names = df["원료명"].astype(str).tolist()
+    keys = [_normalize_name(n) for n in names]
+    pct = pd.Series(pd.to_numeric(df["비율(%)"], errors="coerce").fillna(0).to_numpy(float), index=keys)
+    return pct[~pct.index.duplicated(keep="last")], dict(zip(keys, names))
 
 
 def compare_formulations(df_mine, df_standard):
     """내 배합비 vs 표준배합비 비교"""
-    result = []
-    all_names = set()
-    mine_dict = {}
-    std_dict = {}
-
-    if "원료명" in df_mine.columns and "비율(%)" in df_mine.columns:
-        for _, r in df_mine.iterrows():
-            mine_dict[r["원료명"]] = float(r["비율(%)"])
-            all_names.add(r["원료명"])
-
-    if "원료명" in df_standard.columns and "비율(%)" in df_standard.columns:
-        for _, r in df_standard.iterrows():
-            std_dict[r["원료명"]] = float(r["비율(%)"])
-            all_names.add(r["원료명"])
-
-    for name in sorted(all_names):
-        mine_val = mine_dict.get(name, 0)
-        std_val = std_dict.get(name, 0)
-        diff = mine_val - std_val
-        result.append({
-            "원료명": name,
-            "내 배합(%)": mine_val,
-            "표준(%)": std_val,
-            "차이(%)": round(diff, 3),
-            "판정": "✅ 동일" if abs(diff) < 0.01 else ("⬆️ 초과" if diff > 0 else "⬇️ 부족"),
+    mine, mine_names = _ratio_series(df_mine)
+    std, std_names = _ratio_series(df_standard)
+    display = {**std_names, **mine_names}
+    keys = sorted(display, key=lambda k: display[k])
+    if not keys:
+        return pd.DataFrame(columns=["원료명", "내 배합(%)", "표준(%)", "차이(%)", "판정"])
+    mine_val = mine.reindex(keys, fill_value=0.0).to_numpy()
+    std_val = std.reindex(keys, fill_value=0.0).to_numpy()
+    diff = mine_val - std_val
+    judge = np.where(np.abs(diff) < 0.01, "✅ 동일", np.where(diff > 0, "⬆️ 초과", "⬇️ 부족"))
+    return pd.DataFrame({
+        "원료명": [display[k] for k in keys],
+        "내 배합(%)": mine_val,
+        "표준(%)": std_val,
+        "차이(%)": np.round(diff, 3),
+        "판정": judge,
+    })
+
+
+# ━━━ 기준 배합 라이브러리 (한 배합 vs 전체 기준 일괄 비교) ━━━
+class ReferenceLibrary:
+    """기준 배합 {이름: DataFrame} → 공통 원료 축 위 비율 행렬 (기준 × 원료)
+
+    비교할 배합 하나를 같은 축에 올려 모든 기준과의 L1 거리·코사인 유사도를 한 번의 배열 연산으로 구한다.
+    """
+
+    def __init__(self, references):
+        self.references = references
+        self.names = list(references)
+        rows, cols, vals, display = [], [], [], {}
+        vocab = {}
+        for i, name in enumerate(self.names):
+            series, names = _ratio_series(references[name])
+            for key in names:
+                display.setdefault(key, names[key])
+            for key, v in series.items():
+                rows.append(i)
+                cols.append(vocab.setdefault(key, len(vocab)))
+                vals.append(v)
+        self.vocab = vocab                                   # 정규화 원료명 → 열 번호
+        self.ingredients = [display[k] for k in vocab]      # 열별 표시명
+        self.matrix = np.zeros((len(self.names), len(vocab)))
+        self.matrix[rows, cols] = vals
+        self.l2 = np.linalg.norm(self.matrix, axis=1)
+
+    def __len__(self):
+        return len(self.names)
+
+    def vector(self, df):
+        """배합 → (기준 원료 축 벡터, 축에 없는 원료의 비율 배열)"""
+        series, _ = _ratio_series(df)
+        x = np.zeros(len(self.vocab))
+        extra = []
+        for key, v in series.items():
+            j = self.vocab.get(key)
+            if j is None:
+                extra.append(v)
+            else:
+                x[j] = v
+        return x, np.array(extra, dtype=float)
+
+    def distances(self, df):
+        """배합 vs 전체 기준 → {"l1", "cosine", "shared"} 배열 (기준 순서)"""
+        x, extra = self.vector(df)
+        l1 = np.abs(self.matrix - x).sum(axis=1) + np.abs(extra).sum()
+        norm = np.sqrt(x @ x + extra @ extra)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cosine = np.where(self.l2 * norm > 0, (self.matrix @ x) / (self.l2 * norm), 0.0)
+        shared = ((self.matrix > 0) & (x > 0)).sum(axis=1)
+        return {"l1": l1, "cosine": cosine, "shared": shared}
+
+    def rank(self, df, top_k=None, metric="l1"):
+        """가까운 기준 순위 → DataFrame [표준, L1 거리, 코사인 유사도, 공통 원료]"""
+        d = self.distances(df)
+        order = np.argsort(d["l1"], kind="stable") if metric == "l1" else np.argsort(-d["cosine"], kind="stable")
+        if top_k:
+            order = order[:top_k]
+        return pd.DataFrame({
+            "표준": [self.names[i] for i in order],
+            "L1 거리": np.round(d["l1"][order], 3),
+            "코사인 유사도": np.round(d["cosine"][order], 4),
+            "공통 원료": d["shared"][order],
         })
-    return pd.DataFrame(result)
 
+    def nearest(self, df, metric="l1"):
+        """가장 가까운 기준 이름 (기준이 없으면 None)"""
+        if not self.names:
+            return None
+        return self.rank(df, top_k=1, metric=metric)["표준"].iloc[0]
+
+    def diff_matrix(self, df):
+        """배합 − 각 기준 원료별 차이 (기준 × 원료 DataFrame, 축에 없는 내 원료는 열 추가)"""
+        x, extra = self.vector(df)
+        series, names = _ratio_series(df)
+        extra_keys = [k for k in series.index if k not in self.vocab]
+        diff = np.hstack([x - self.matrix, np.tile(extra, (len(self.names), 1))])
+        return pd.DataFrame(diff, index=self.names, columns=self.ingredients + [names[k] for k in extra_keys])
+
+    def compare(self, df, name):
+        """배합 vs 기준 1건 원료별 비교표 (compare_formulations 와 같은 형식)"""
+        return compare_formulations(df, self.references[name])
+
+
+_STANDARD_LIBRARY = None
+
+def get_standard_library():
+    """표준배합비 전체 라이브러리"""
+    global _STANDARD_LIBRARY
+    if _STANDARD_LIBRARY is None:
+        _STANDARD_LIBRARY = ReferenceLibrary({name: pd.DataFrame(std["ingredients"])
+                                              for name, std in STANDARD_FORMULATIONS.items()})
+    return _STANDARD_LIBRARY
 
-def extract_pdf_text(uploaded_file):
-    """업로드된 PDF에서 텍스트 추출"""
+
+_PDF_CACHE = None
+
+def get_pdf_cache():
+    """PDF 텍스트 디스크 캐시 (프로세스 공용)"""
+    global _PDF_CACHE
+    if _PDF_CACHE is None:
+        _PDF_CACHE = DiskLRUCache(PDF_CACHE_DIR, PDF_CACHE_MAX_BYTES)
+    return _PDF_CACHE
+
+
+_TEXT_STORE = None
+
+def get_text_store():
+    """세션 공용 PDF 텍스트 저장소 (프로세스 공용)"""
+    global _TEXT_STORE
+    if _TEXT_STORE is None:
+        _TEXT_STORE = SharedTextStore(get_pdf_cache(), PDF_RESIDENT_MAX_BYTES)
+    return _TEXT_STORE
+
+
+def extract_pdf_handle(uploaded_file, parallel=True, progress=None):
+    """업로드된 PDF → 공유 텍스트 핸들 (세션에는 핸들만 보관, 본문은 handle.text)
+
+    같은 PDF는 내용 해시가 같아 모든 세션이 본문 1벌을 공유한다.
+    progress(완료 페이지 수, 전체 페이지 수) — 이미 추출된 PDF면 호출되지 않음
+    """
     try:
-        from pypdf import PdfReader
-        import io
         uploaded_file.seek(0)
-        reader = PdfReader(io.BytesIO(uploaded_file.read()))
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() or ""
-        return text
-    except ImportError:
+        data = uploaded_file.read()
+    except Exception:
+        return None
+    key = f"v{PDF_TEXT_VERSION}-{content_hash(data)}"
+    store = get_text_store()
+    handle = store.open(key)
+    if handle is None:
         try:
-            import PyPDF2
-            import io
-            uploaded_file.seek(0)
-            reader = PyPDF2.PdfReader(io.BytesIO(uploaded_file.read()))
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() or ""
-            return text
-        except:
+            text = PAGE_SEPARATOR.join(extract_pdf_pages(data, parallel=parallel, progress=progress))
+        except Exception:
             return None
-    except:
-        return None
+        if not text.replace(PAGE_SEPARATOR, "").strip():
+            return None
+        handle = store.put(key, text)
+    return handle
+
+
+def extract_pdf_text(uploaded_file, parallel=True, progress=None):
+    """업로드된 PDF에서 텍스트 추출 (페이지 사이 PAGE_SEPARATOR, 내용 해시로 디스크 캐시)
+
+    progress(완료 페이지 수, 전체 페이지 수) — 캐시 적중 시에는 호출되지 않음
+    """
+    handle = extract_pdf_handle(uploaded_file, parallel=parallel, progress=progress)
+    return handle.text if handle is not None else None
@@ -0,0 +1,197 @@
+"""
+배합연습 편집기용 증분 파싱·검증 (직전 CSV 와 달라진 행만 다시 처리)
+"""
+import csv, re
+import numpy as np
+import pandas as pd
+from data.common import (ESTIMATE_FIELDS, FORMULA_RULES, estimate_from_totals, estimate_properties, formula_column_map,
+                         formula_verdict, parse_csv_cached, property_matrix, validate_formula)
+
+# 행 단위로 집계하는 규칙 (합계·포함 여부)
+_ROW_RULES = [r for r in FORMULA_RULES if r["check"] in ("sum_range", "contains_any")]
+_PATTERNS = {r["id"]: re.compile(r["pattern"]) for r in _ROW_RULES if r["check"] == "contains_any"}
+# 물성 추정값으로 검사하는 규칙 (Brix·pH)
+_ESTIMATE_RULES = [r for r in FORMULA_RULES if r["check"] == "meta_range" and r.get("estimate")]
+
+
+def _split_lines(text):
+    return text.strip().replace("\r\n", "\n").split("\n")
+
+
+def _common_ends(old, new):
+    """두 행 목록의 같은 앞부분·뒷부분 길이"""
+    n = min(len(old), len(new))
+    head = 0
+    while head < n and old[head] == new[head]:
+        head += 1
+    tail = 0
+    while tail < n - head and old[-1 - tail] == new[-1 - tail]:
+        tail += 1
+    return head, tail
+
+
+class IncrementalFormula:
+    """CSV 편집 내용을 행 단위로 들고 있다가, 바뀐 행만 다시 파싱하고 비율 합계·기능 집계를 갱신
+
+    따옴표가 든 CSV(한 필드에 쉼표·줄바꿈)는 행 단위로 나눌 수 없어 parse_csv_cached 로 전체 파싱한다.
+    결과 DataFrame·검증은 parse_csv_formula / validate_formula 와 같다.
+    """
+
+    def __init__(self):
+        self.ratio_version = 0  # 원료명·비율이 바뀔 때마다 증가 (차트 재사용 키)
+        self.reset()
+
+    def reset(self):
+        self.header = None
+        self.columns = []     # 표준화한 컬럼명
+        self.lines = []       # 헤더 뒤 원문 행
+        self.rows = []        # 행별 파싱 결과 (빈 행은 None)
+        self.counts = {r["id"]: 0 for r in _ROW_RULES if r["check"] == "contains_any"}   # 규칙별 해당 행 수
+        self.n_rows = 0
+        self.bad_rows = 0
+        self.ratio_version += 1
+        self.last_changed = 0   # 직전 update 에서 다시 파싱한 행 수
+        self._df = None
+        self._msg = "빈 입력"
+        self._full = None       # 따옴표 CSV 전체 파싱 결과
+
+    # ━━━ 행 단위 파싱 ━━━
+    def _parse_row(self, line):
+        if not line.strip():
+            return None
+        values = next(csv.reader([line]))
+        row = {"values": values, "bad": len(values) > len(self.columns)}
+        rec = dict(zip(self.columns, values))
+        pct = pd.to_numeric(rec.get("비율(%)", ""), errors="coerce")
+        pct = 0.0 if pd.isna(pct) else float(pct)
+        hits = {}
+        for rule in _ROW_RULES:
+            value = rec.get(rule["column"], "")
+            if rule["check"] == "sum_range":
+                num = pd.to_numeric(value, errors="coerce")
+                hits[rule["id"]] = 0.0 if pd.isna(num) else float(num)
+            else:
+                hits[rule["id"]] = int(_PATTERNS[rule["id"]].search(value.lower()) is not None)
+        row["hits"] = hits
+        row["key"] = (rec.get("원료명", ""), pct)
+        row["pct"] = pct
+        row["props"] = property_matrix([rec.get("원료명", "")], ESTIMATE_FIELDS)[0]   # 고형분·산·완충
+        return row
+
+    def _apply(self, row, sign):
+        if row is None:
+            return
+        self.n_rows += sign
+        for k in self.counts:
+            self.counts[k] += sign * row["hits"][k]
+        self.bad_rows += sign * row["bad"]
+
+    def _load_header(self, header):
+        self.reset()
+        self.header = header
+        cols = next(csv.reader([header])) if header.strip() else []
+        col_map = formula_column_map(cols)
+        self.columns = [col_map.get(c, c) for c in cols]
+
+    def update(self, text):
+        """새 CSV 반영 → (DataFrame 또는 None, 메시지)"""
+        if not text.strip():
+            self.reset()
+            return None, "빈 입력"
+        lines = _split_lines(text)
+        if '"' in text:
+            # 행 단위로 못 나누는 CSV → 전체 파싱
+            if self._full is None or self._full[0] != text:
+                self.reset()
+                self._full = (text, parse_csv_cached(text))
+                self.ratio_version += 1
+                self.last_changed = len(lines)
+            df, msg = self._full[1]
+            return (df.copy() if df is not None else None), msg
+        self._full = None
+        if lines[0] != self.header:
+            self._load_header(lines[0])
+        body = lines[1:]
+
+        head, tail = _common_ends(self.lines, body)
+        old_rows = self.rows[head:len(self.rows) - tail]
+        new_rows = [self._parse_row(line) for line in body[head:len(body) - tail]]
+        for row in old_rows:
+            self._apply(row, -1)
+        for row in new_rows:
+            self._apply(row, +1)
+        if old_rows or new_rows:
+            if [r and r["key"] for r in old_rows] != [r and r["key"] for r in new_rows]:
+                self.ratio_version += 1
+            self.rows[head:len(self.rows) - tail] = new_rows
+            self._df = None
+        self.lines = body
+        self.last_changed = len(new_rows)
+        if self._df is None:
+            self._df, self._msg = self._build(len(lines))
+        return (self._df.copy() if self._df is not None else None), self._msg
+
+    def _build(self, n_lines):
+        if n_lines < 2:
+            return None, "최소 헤더+1행 필요"
+        if self.bad_rows:
+            k = next(i for i, r in enumerate(self.rows) if r and r["bad"])
+            return None, f"{k + 2}행: 값 {len(self.rows[k]['values'])}개 (헤더 {len(self.columns)}개)"
+        if "원료명" not in self.columns:
+            return None, "'원료명' 컬럼을 찾을 수 없습니다"
+        records = [r["values"] + [""] * (len(self.columns) - len(r["values"])) for r in self.rows if r]
+        df = pd.DataFrame(records, columns=self.columns).replace("", None)
+        for c in df.columns:
+            if c == "비율(%)":
+                df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0)
+            else:
+                # read_csv 처럼 전부 숫자인 컬럼만 숫자로
+                num = pd.to_numeric(df[c], errors="coerce")
+                if num.notna().sum() == df[c].notna().sum() and df[c].notna().any():
+                    df[c] = num
+        return df, "OK"
+
+    def validate(self, meta=None):
+        """현재 내용 검증 (validate_formula 와 같은 결과, 파싱 실패 시 None)"""
+        if self._full is not None:
+            df = self._full[1][0]
+            if df is None:
+                return None
+            return validate_formula(df, meta)
+        if self._df is None:
+            return None
+        return formula_verdict(self.aggregates(), meta)
+
+    def aggregates(self):
+        """formula_aggregates 와 같은 규칙별 집계값"""
+        agg = {r["id"]: (None if r["column"] not in self.columns else
+                         self._row_sum(r["id"]) if r["check"] == "sum_range" else self.counts[r["id"]])
+               for r in _ROW_RULES}
+        agg.update({r["id"]: self.n_rows for r in FORMULA_RULES if r["check"] == "min_rows"})
+        estimates = self.estimates()
+        agg.update({r["id"]: estimates[r["estimate"]] if estimates else None for r in _ESTIMATE_RULES})
+        return agg
+
+    def estimates(self):
+        """estimate_properties 와 같은 Brix·산도·pH 추정값 (원료명·비율 컬럼이 없으면 None)"""
+        if self._full is not None:
+            df = self._full[1][0]
+            return estimate_properties(df) if df is not None and "비율(%)" in df.columns else None
+        if "원료명" not in self.columns or "비율(%)" not in self.columns:
+            return None
+        rows = [r for r in self.rows if r]
+        if not rows:
+            return estimate_properties(None)
+        # 누적 합계를 더하고 빼면 오차가 쌓이므로, 행별 물성(파싱 때 조회)으로 estimate_properties 와 같은 곱을 매번 계산
+        totals = np.array([r["pct"] for r in rows]) @ np.array([r["props"] for r in rows])
+        brix, acidity, ph = estimate_from_totals(*totals)
+        return {"brix": float(brix), "acidity": float(acidity), "pH": float(ph)}
+
+    @property
+    def total(self):
+        """비율 합계"""
+        return self._row_sum("ratio_total")
+
+    def _row_sum(self, rule_id):
+        """행별 값 합계 — 더하고 빼며 누적하면 오차가 쌓이므로 formula_aggregates 처럼 행 순서대로 매번 합산"""
+        return float(np.sum([r["hits"][rule_id] for r in self.rows if r]))
@@ -0,0 +1,202 @@
+"""
+저장 배합비 유사도 색인 (원료별 비율 희소 벡터 + 역색인, 저장 DB 에서 증분 갱신)
+"""
+import threading, time
+import numpy as np
+import pandas as pd
+from data.common import _normalize_name, get_store
+
+# 중복·복제 후보를 묶을 때 쓰는 주요 원료 기준 (이 비율 미만 원료는 구성 비교에서 제외)
+DUPLICATE_MAJOR_PCT = 1.0
+DUPLICATE_MAX_L1 = 1.0
+DUPLICATE_BLOCK = 2048
+# get_formula_index() 가 저장 DB 를 다시 읽는 최소 간격 (초) — 저장·중복 찾기는 sync=True 로 즉시 반영
+FORMULA_INDEX_SYNC_SECONDS = 30.0
+
+
+def ingredient_vector(ingredients):
+    """원료 목록(records 또는 DataFrame) → {정규화 원료명: 비율} (같은 원료가 여러 번이면 마지막 값)"""
+    if isinstance(ingredients, pd.DataFrame):
+        ingredients = ingredients.to_dict(orient="records")
+    vec = {}
+    for r in ingredients or []:
+        key = _normalize_name(r.get("원료명"))
+        if not key:
+            continue
+        pct = pd.to_numeric(r.get("비율(%)", 0), errors="coerce")
+        vec[key] = 0.0 if pd.isna(pct) else float(pct)
+    return {k: v for k, v in vec.items() if v > 0}
+
+
+class _Posting:
+    """원료 1종의 (행 번호, 비율) 목록 — 배열을 두 배씩 늘려 추가 비용을 상수로"""
+    __slots__ = ("rows", "vals", "n")
+
+    def __init__(self):
+        self.rows = np.empty(16, dtype=np.int32)
+        self.vals = np.empty(16, dtype=np.float32)
+        self.n = 0
+
+    def append(self, row, val):
+        if self.n == len(self.rows):
+            self.rows = np.resize(self.rows, 2 * self.n)
+            self.vals = np.resize(self.vals, 2 * self.n)
+        self.rows[self.n] = row
+        self.vals[self.n] = val
+        self.n += 1
+
+
+class FormulaIndex:
+    """배합비 유사도 색인 — 질의 배합의 원료 역색인 목록만 훑어 전체 저장분과의 코사인 유사도를 계산
+
+    유사도는 비율 제곱근 벡터의 코사인 (정제수처럼 비율이 큰 원료 하나에 유사도가 쏠리지 않게).
+    add() 로 한 건씩 추가하고, sync(store) 는 저장 DB 에서 마지막으로 본 id 이후만 읽어 온다.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.vocab = {}          # 정규화 원료명 → 역색인 번호
+        self.postings = []       # 역색인 번호 → _Posting
+        self.keys = []           # 역색인 번호 → 정규화 원료명
+        self.ids, self.names, self.students = [], [], []
+        self.vectors = []        # 행 → {역색인 번호: 비율}
+        self._norms = np.empty(1024)
+        self.last_id = 0
+        self.synced_at = None    # 마지막 sync 시각 (time.monotonic)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, formula_id, name, student, ingredients):
+        """배합비 1건 추가"""
+        vec = ingredient_vector(ingredients)
+        with self._lock:
+            row = len(self.ids)
+            cols = {}
+            for key, v in vec.items():
+                j = self.vocab.get(key)
+                if j is None:
+                    j = self.vocab[key] = len(self.postings)
+                    self.postings.append(_Posting())
+                    self.keys.append(key)
+                self.postings[j].append(row, np.sqrt(v))
+                cols[j] = v
+            if row == len(self._norms):
+                self._norms = np.resize(self._norms, 2 * row)
+            self._norms[row] = np.sqrt(sum(cols.values()))
+            self.ids.append(formula_id)
+            self.names.append(name)
+            self.students.append(student)
+            self.vectors.append(cols)
+            self.last_id = max(self.last_id, formula_id)
+
+    def sync(self, store):
+        """저장 DB 에 새로 생긴 배합비만 반영 → 추가 건수"""
+        rows = store.since(self.last_id)
+        for formula_id, name, student, ingredients in rows:
+            self.add(formula_id, name, student, ingredients)
+        self.synced_at = time.monotonic()
+        return len(rows)
+
+    def _scores(self, vec):
+        """질의 벡터 → 행별 내적 (질의에 있는 원료의 역색인만 훑음)"""
+        n = len(self.ids)
+        dot = np.zeros(n)
+        for key, v in vec.items():
+            j = self.vocab.get(key)
+            if j is not None:
+                p = self.postings[j]
+                dot[p.rows[:p.n]] += p.vals[:p.n] * np.sqrt(v)
+        return dot
+
+    def similar(self, ingredients, k=5, exclude_id=None, student=None, min_similarity=0.0):
+        """배합 → 가장 비슷한 저장 배합비 k건 DataFrame [id, 배합명, 학생, 유사도, L1 거리, 공통 원료]"""
+        columns = ["id", "배합명", "학생", "유사도", "L1 거리", "공통 원료"]
+        vec = ingredient_vector(ingredients)
+        qnorm = np.sqrt(sum(vec.values()))
+        with self._lock:
+            n = len(self.ids)
+            if n == 0 or qnorm == 0:
+                return pd.DataFrame(columns=columns)
+            norms = self._norms[:n]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                sim = np.where(norms > 0, self._scores(vec) / (norms * qnorm), 0.0)
+            if exclude_id is not None:
+                sim[np.asarray(self.ids) == exclude_id] = -1
+            if student is not None:
+                sim[np.asarray(self.students) != student] = -1
+            k = min(k, n)
+            top = np.argpartition(-sim, k - 1)[:k]
+            top = top[np.argsort(-sim[top], kind="stable")]
+            top = top[sim[top] >= max(min_similarity, 0)]
+            out = []
+            for i in top:
+                other = {self.keys[j]: v for j, v in self.vectors[i].items()}
+                keys = vec.keys() | other.keys()
+                out.append((self.ids[i], self.names[i], self.students[i], round(float(sim[i]), 4),
+                            round(sum(abs(vec.get(c, 0.0) - other.get(c, 0.0)) for c in keys), 3),
+                            len(vec.keys() & other.keys())))
+        return pd.DataFrame(out, columns=columns)
+
+    def find_duplicates(self, threshold=0.995, max_l1=DUPLICATE_MAX_L1, cross_student=True,
+                        major_pct=DUPLICATE_MAJOR_PCT):
+        """저장분 전체에서 중복·복제 의심 쌍 → DataFrame [id_a, 배합명_a, 학생_a, id_b, 배합명_b, 학생_b, 유사도, L1 거리]
+
+        주요 원료(major_pct 이상) 구성이 같은 배합끼리만 후보로 묶어, 묶음 안에서 유사도를 블록 단위 행렬곱으로 구하고
+        유사도 threshold 이상이면서 비율 차이 합(L1) max_l1 이하인 쌍만 남긴다.
+        cross_student=True 면 서로 다른 학생의 쌍만 (복제 제출 확인용).
+        """
+        columns = ["id_a", "배합명_a", "학생_a", "id_b", "배합명_b", "학생_b", "유사도", "L1 거리"]
+        with self._lock:
+            groups = {}
+            for i, cols in enumerate(self.vectors):
+                major = frozenset(j for j, v in cols.items() if v >= major_pct)
+                if major:
+                    groups.setdefault(major, []).append(i)
+            students = np.asarray(self.students, dtype=object)
+            pairs = []
+            for rows in groups.values():
+                if len(rows) < 2:
+                    continue
+                rows = np.asarray(rows)
+                cols = sorted(set().union(*(self.vectors[i].keys() for i in rows)))
+                pos = {j: c for c, j in enumerate(cols)}
+                mat = np.zeros((len(rows), len(cols)))
+                for r, i in enumerate(rows):
+                    for j, v in self.vectors[i].items():
+                        mat[r, pos[j]] = v
+                unit = np.sqrt(mat)
+                unit /= np.linalg.norm(unit, axis=1, keepdims=True)
+                for start in range(0, len(rows), DUPLICATE_BLOCK):
+                    sim = unit[start:start + DUPLICATE_BLOCK] @ unit.T
+                    a, b = np.nonzero(sim >= threshold)
+                    a = a + start
+                    keep = a < b
+                    if cross_student:
+                        keep &= students[rows[a]] != students[rows[b]]
+                    a, b = a[keep], b[keep]
+                    l1 = np.abs(mat[a] - mat[b]).sum(axis=1)
+                    for x, y, d in zip(a[l1 <= max_l1], b[l1 <= max_l1], l1[l1 <= max_l1]):
+                        pairs.append((rows[x], rows[y], float(sim[x - start, y]), float(d)))
+            out = [(self.ids[x], self.names[x], self.students[x], self.ids[y], self.names[y], self.students[y],
+                    round(s, 4), round(d, 3)) for x, y, s, d in pairs]
+        return pd.DataFrame(out, columns=columns).sort_values("유사도", ascending=False, ignore_index=True)
+
+
+_FORMULA_INDEX = None
+_FORMULA_INDEX_LOCK = threading.Lock()
+
+def get_formula_index(sync=False):
+    """저장 배합비 유사도 색인 (프로세스 공용)
+
+    새 저장분은 sync=True 이거나 마지막 반영 후 FORMULA_INDEX_SYNC_SECONDS 가 지났을 때만 DB 에서 읽어 온다
+    (화면 갱신마다 부르는 경로는 메모리만 사용).
+    """
+    global _FORMULA_INDEX
+    with _FORMULA_INDEX_LOCK:
+        if _FORMULA_INDEX is None:
+            _FORMULA_INDEX = FormulaIndex()
+        index = _FORMULA_INDEX
+        if sync or index.synced_at is None or time.monotonic() - index.synced_at >= FORMULA_INDEX_SYNC_SECONDS:
+            index.sync(get_store())
+    return index
@@ -0,0 +1,213 @@
+"""
+최소 원가 배합 (NumPy 2단계 심플렉스 LP, 합계 100%·Brix·감미 제약)
+"""
+import numpy as np
+import pandas as pd
+from data.common import STANDARD_FORMULATIONS, get_ingredient_index, property_matrix, _normalize_name
+
+LP_TOL = 1e-9
+LP_MAX_ITER = 500
+# 표준배합비 기준 원료별 허용 범위 (표준 비율의 ±비율) / 추가 원료 최대 비율(%)
+DEFAULT_FLEX = 0.3
+DEFAULT_EXTRA_MAX = 20.0
+# Brix 목표 허용 폭(°Bx), 감미 목표 허용 폭(설탕환산 %)
+DEFAULT_BRIX_TOL = 0.3
+DEFAULT_SWEET_TOL = 0.3
+# 비율을 자유롭게 맞추는 용매 (표준 비율 범위 대신 0~100%)
+SOLVENT_PATTERN = "정제수|물"
+
+
+def _pivot(T, basis, r, c):
+    T[r] /= T[r, c]
+    col = T[:, c].copy()
+    col[r] = 0.0
+    T -= np.outer(col, T[r])
+    basis[r] = c
+
+
+def _simplex(T, basis, n_cols, max_iter):
+    """표 T (마지막 행 = 목적함수 축약비용, 마지막 열 = 우변) 최소화 → 상태"""
+    for _ in range(max_iter):
+        reduced = T[-1, :n_cols]
+        c = int(np.argmin(reduced))
+        if reduced[c] >= -LP_TOL:
+            return "optimal"
+        col = T[:-1, c]
+        positive = col > LP_TOL
+        if not positive.any():
+            return "unbounded"
+        ratios = np.full(len(col), np.inf)
+        ratios[positive] = T[:-1, -1][positive] / col[positive]
+        _pivot(T, basis, int(np.argmin(ratios)), c)
+    return "iteration_limit"
+
+
+def solve_lp(c, A_ub=None, b_ub=None, A_eq=None, b_eq=None, bounds=None, max_iter=LP_MAX_ITER):
+    """min c·x  (A_ub x ≤ b_ub, A_eq x = b_eq, lo ≤ x ≤ hi) → {"status", "x", "cost"}
+
+    작은 밀집 문제용 2단계 심플렉스 (변수 수십 개). status 는 optimal / infeasible / unbounded / iteration_limit.
+    bounds 는 변수별 (lo, hi) — hi 가 None 이면 상한 없음, bounds 가 None 이면 전부 (0, 없음).
+    """
+    c = np.asarray(c, dtype=float)
+    n = len(c)
+    A_ub = np.zeros((0, n)) if A_ub is None else np.atleast_2d(np.asarray(A_ub, dtype=float))
+    b_ub = np.zeros(0) if b_ub is None else np.asarray(b_ub, dtype=float)
+    A_eq = np.zeros((0, n)) if A_eq is None else np.atleast_2d(np.asarray(A_eq, dtype=float))
+    b_eq = np.zeros(0) if b_eq is None else np.asarray(b_eq, dtype=float)
+    bounds = bounds if bounds is not None else [(0.0, None)] * n
+    lo = np.array([0.0 if b[0] is None else float(b[0]) for b in bounds])
+    hi = np.array([np.inf if b[1] is None else float(b[1]) for b in bounds])
+    if np.any(hi < lo - LP_TOL):
+        return {"status": "infeasible", "x": None, "cost": None}
+
+    # x = lo + y (y ≥ 0), 유한 상한은 y ≤ hi - lo 부등식으로
+    finite = np.isfinite(hi)
+    A_ub = np.vstack([A_ub, np.eye(n)[finite]])
+    b_ub = np.concatenate([b_ub - A_ub[:len(b_ub)] @ lo, (hi - lo)[finite]])
+    b_eq = b_eq - A_eq @ lo
+    m_ub, m_eq = len(b_ub), len(b_eq)
+    m = m_ub + m_eq
+
+    # 행마다 여유변수(부등식) + 우변이 음수인 부등식·등식은 인공변수
+    needs_art = np.concatenate([b_ub < 0, np.ones(m_eq, dtype=bool)])
+    n_art = int(needs_art.sum())
+    n_cols = n + m_ub + n_art
+    T = np.zeros((m + 1, n_cols + 1))
+    T[:m_ub, :n] = A_ub
+    T[:m_ub, n:n + m_ub] = np.eye(m_ub)
+    T[:m_ub, -1] = b_ub
+    T[m_ub:m, :n] = A_eq
+    T[m_ub:m, -1] = b_eq
+    flip = T[:m, -1] < 0
+    T[:m][flip] *= -1
+    basis = np.empty(m, dtype=np.int64)
+    basis[:m_ub] = n + np.arange(m_ub)
+    art_rows = np.flatnonzero(needs_art)
+    art_cols = n + m_ub + np.arange(n_art)
+    T[art_rows, art_cols] = 1.0
+    basis[art_rows] = art_cols
+
+    # 1단계: 인공변수 합 최소화
+    if n_art:
+        T[-1, :] = -T[art_rows].sum(axis=0)
+        T[-1, art_cols] = 0.0
+        status = _simplex(T, basis, n_cols, max_iter)
+        if status == "iteration_limit":
+            return {"status": status, "x": None, "cost": None}
+        if -T[-1, -1] > 1e-7 * max(1.0, np.abs(T[:m, -1]).max(initial=0.0)):
+            return {"status": "infeasible", "x": None, "cost": None}
+        # 0 수준으로 남은 인공변수는 다른 열로 바꾸고, 바꿀 수 없으면 중복 제약이라 행을 버림
+        keep = np.ones(m, dtype=bool)
+        for r in np.flatnonzero(basis >= n + m_ub):
+            cand = np.flatnonzero(np.abs(T[r, :n + m_ub]) > LP_TOL)
+            if len(cand):
+                _pivot(T, basis, r, int(cand[0]))
+            else:
+                keep[r] = False
+        T = np.vstack([T[:m][keep], T[-1:]])
+        basis = basis[keep]
+        T = np.delete(T, art_cols, axis=1)
+        n_cols = n + m_ub
+
+    # 2단계: 원래 목적함수
+    T[-1, :] = 0.0
+    T[-1, :n] = c
+    for r, b in enumerate(basis):
+        if T[-1, b] != 0.0:
+            T[-1] -= T[-1, b] * T[r]
+    status = _simplex(T, basis, n_cols, max_iter)
+    if status != "optimal":
+        return {"status": status, "x": None, "cost": None}
+    y = np.zeros(n_cols)
+    y[basis] = T[:-1, -1]
+    x = lo + y[:n]
+    return {"status": "optimal", "x": x, "cost": float(c @ x)}
+
+
+class FormulaLP:
+    """원료 묶음의 최소 원가 배합 문제 — 원료 매칭·물성 조회는 한 번만 하고, 단가·목표·범위를 바꿔 반복 풀이
+
+    변수 = 원료별 비율(%), 목적 = 단가(원/kg) 가중합, 제약 = 비율 합계 100%, Brix·감미 목표 ± 허용 폭, 원료별 범위.
+    """
+
+    def __init__(self, names, lower, upper, prices=None):
+        self.names = list(names)
+        self.lower = np.asarray(lower, dtype=float)
+        self.upper = np.asarray(upper, dtype=float)
+        index = get_ingredient_index()
+        self.positions = index.lookup_many(self.names)
+        self.prices = index.prices_ext[self.positions] if prices is None else np.asarray(prices, dtype=float)
+        props = property_matrix(self.names)
+        self.solids = props[:, 0]
+        self.sweetness = props[:, 1]
+
+    def brix_of(self, x):
+        return float(self.solids @ x)
+
+    def sweetness_of(self, x):
+        return float(self.sweetness @ x)
+
+    def solve(self, brix=None, sweetness=None, brix_tol=DEFAULT_BRIX_TOL, sweet_tol=DEFAULT_SWEET_TOL,
+              prices=None, lower=None, upper=None):
+        """최소 원가 비율 → {"status", "x", "cost"} (cost = 원료 1kg 당 원가(원))"""
+        prices = self.prices if prices is None else np.asarray(prices, dtype=float)
+        lower = self.lower if lower is None else np.asarray(lower, dtype=float)
+        upper = self.upper if upper is None else np.asarray(upper, dtype=float)
+        rows, rhs = [], []
+        for coef, target, tol in ((self.solids, brix, brix_tol), (self.sweetness, sweetness, sweet_tol)):
+            if target is not None:
+                rows += [coef, -coef]
+                rhs += [target + tol, -(target - tol)]
+        result = solve_lp(prices / 100, A_ub=np.array(rows) if rows else None, b_ub=np.array(rhs) if rhs else None,
+                          A_eq=np.ones((1, len(self.names))), b_eq=[100.0], bounds=list(zip(lower, upper)))
+        if result["x"] is not None:
+            result["x"] = np.where(np.abs(result["x"]) < 1e-9, 0.0, result["x"])
+        return result
+
+    def table(self, x, volume_ml=500, reference=None, prices=None):
+        """풀이 결과 → 원가표 DataFrame (reference 비율이 있으면 기존 비율·차이 열 추가)"""
+        prices = self.prices if prices is None else np.asarray(prices, dtype=float)
+        df = pd.DataFrame({"원료명": self.names, "비율(%)": np.round(x, 4), "최소(%)": self.lower,
+                           "최대(%)": self.upper, "단가(원/kg)": prices,
+                           "원가(원)": np.round(x * volume_ml / 100 * prices / 1000, 2)})
+        if reference is not None:
+            df.insert(2, "기존(%)", np.round(reference, 4))
+            df.insert(3, "변화(%p)", np.round(x - reference, 4))
+        return df
+
+
+def standard_problem(std_name, flex=DEFAULT_FLEX, extra=(), extra_max=DEFAULT_EXTRA_MAX, bounds=None):
+    """표준배합비 1건 → (FormulaLP, 표준 비율 배열)
+
+    표준 원료는 표준 비율 ±flex, 용매(정제수)는 0~100%, extra 원료는 0~extra_max%. bounds={원료명: (lo, hi)} 로 개별 지정.
+    """
+    std = STANDARD_FORMULATIONS[std_name]
+    names = [r["원료명"] for r in std["ingredients"]]
+    ref = np.array([float(r["비율(%)"]) for r in std["ingredients"]])
+    seen = {_normalize_name(n) for n in names}
+    extra = [n for n in extra if _normalize_name(n) not in seen]
+    names += extra
+    ref = np.concatenate([ref, np.zeros(len(extra))])
+    lower = np.concatenate([ref[:len(ref) - len(extra)] * (1 - flex), np.zeros(len(extra))])
+    upper = np.concatenate([ref[:len(ref) - len(extra)] * (1 + flex), np.full(len(extra), float(extra_max))])
+    solvent = pd.Series(names).str.contains(SOLVENT_PATTERN).to_numpy()
+    lower[solvent], upper[solvent] = 0.0, 100.0
+    for name, (lo, hi) in (bounds or {}).items():
+        if name in names:
+            i = names.index(name)
+            lower[i], upper[i] = lo, hi
+    return FormulaLP(names, lower, upper), ref
+
+
+def least_cost_formula(std_name, brix=None, sweetness=None, flex=DEFAULT_FLEX, extra=(), volume_ml=500, **solve_kwargs):
+    """표준배합비 기준 최소 원가 배합 → (원가표 DataFrame 또는 None, 풀이 결과)
+
+    Brix·감미 목표 기본값은 표준 배합 그대로의 환산값 (표준 배합 자체가 항상 해가 되도록 물성표 기준으로 계산).
+    """
+    lp, ref = standard_problem(std_name, flex=flex, extra=extra)
+    brix = lp.brix_of(ref) if brix is None else brix
+    sweetness = lp.sweetness_of(ref) if sweetness is None else sweetness
+    result = lp.solve(brix=brix, sweetness=sweetness, **solve_kwargs)
+    if result["x"] is None:
+        return None, result
+    return lp.table(result["x"], volume_ml, reference=ref, prices=solve_kwargs.get("prices")), result
@@ -0,0 +1,169 @@
+"""
+저장 배합비 DB (SQLite)
+"""
+import sqlite3, json, os, threading
+from contextlib import contextmanager
+from datetime import datetime
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS formulas (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    name        TEXT NOT NULL,
+    student     TEXT NOT NULL,
+    timestamp   TEXT NOT NULL,
+    filename    TEXT UNIQUE,
+    meta        TEXT NOT NULL DEFAULT '{}',
+    ingredients TEXT NOT NULL DEFAULT '[]'
+);
+CREATE INDEX IF NOT EXISTS idx_formulas_ts ON formulas(timestamp);
+CREATE INDEX IF NOT EXISTS idx_formulas_student ON formulas(student, timestamp);
+CREATE INDEX IF NOT EXISTS idx_formulas_name ON formulas(name, timestamp);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_ORDER_COLUMNS = {"timestamp": "timestamp", "name": "name", "student": "student", "id": "id"}
+
+
+def _json_default(o):
+    # numpy 스칼라 등은 파이썬 기본형으로
+    return o.item() if hasattr(o, "item") else str(o)
+
+
+class FormulaStore:
+    """배합비 저장소 — 정렬·페이지 조회, 학생/제품명 검색, 원자적 저장"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # Streamlit 세션은 스레드가 달라 호출마다 연결을 새로 열고 닫는다
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _to_record(row):
+        return {
+            "id": row["id"],
+            "name": row["name"],
+            "student": row["student"],
+            "meta": json.loads(row["meta"] or "{}"),
+            "ingredients": json.loads(row["ingredients"] or "[]"),
+            "timestamp": row["timestamp"],
+            "filename": row["filename"] or f"#{row['id']}",
+        }
+
+    def insert(self, name, student, meta, ingredients, timestamp=None, filename=None):
+        """배합비 1건 저장 (트랜잭션) → id"""
+        timestamp = timestamp or datetime.now().isoformat()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "INSERT INTO formulas (name, student, timestamp, filename, meta, ingredients) VALUES (?, ?, ?, ?, ?, ?)",
+                (name, student, timestamp, filename,
+                 json.dumps(meta or {}, ensure_ascii=False, default=_json_default),
+                 json.dumps(ingredients or [], ensure_ascii=False, default=_json_default)),
+            )
+            return cur.lastrowid
+
+    def _where(self, student=None, name=None):
+        clauses, params = [], []
+        if student:
+            clauses.append("student = ?")
+            params.append(student)
+        if name:
+            clauses.append("name LIKE ?")
+            params.append(f"%{name}%")
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def list(self, limit=None, offset=0, student=None, name=None, order_by="timestamp", descending=True):
+        """정렬·페이지 단위 조회"""
+        where, params = self._where(student, name)
+        col = _ORDER_COLUMNS.get(order_by, "timestamp")
+        sql = f"SELECT * FROM formulas{where} ORDER BY {col} {'DESC' if descending else 'ASC'}, id {'DESC' if descending else 'ASC'}"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [int(limit), int(offset)]
+        with self._connect() as conn:
+            return [self._to_record(r) for r in conn.execute(sql, params)]
+
+    def count(self, student=None, name=None):
+        where, params = self._where(student, name)
+        with self._connect() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM formulas{where}", params).fetchone()[0]
+
+    def get(self, formula_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM formulas WHERE id = ?", (formula_id,)).fetchone()
+        return self._to_record(row) if row else None
+
+    def since(self, after_id=0):
+        """id 가 after_id 보다 큰 배합비 (id 순, 유사도 색인 증분 갱신용) → [(id, name, student, ingredients)]"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id, name, student, ingredients FROM formulas WHERE id > ? ORDER BY id",
+                                (int(after_id),)).fetchall()
+        return [(r["id"], r["name"], r["student"], json.loads(r["ingredients"] or "[]")) for r in rows]
+
+    def students(self):
+        with self._connect() as conn:
+            return [r[0] for r in conn.execute("SELECT DISTINCT student FROM formulas ORDER BY student")]
+
+    def import_json_dir(self, json_dir):
+        """기존 JSON 저장 파일 일괄 이관 (파일명 기준 중복 무시) → 이관 건수"""
+        rows = []
+        for fn in sorted(os.listdir(json_dir)):
+            if not fn.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(json_dir, fn), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception:
+                continue
+            rows.append((
+                data.get("name", fn), data.get("student", "default"),
+                data.get("timestamp") or datetime.fromtimestamp(os.path.getmtime(os.path.join(json_dir, fn))).isoformat(),
+                fn,
+                json.dumps(data.get("meta") or {}, ensure_ascii=False, default=_json_default),
+                json.dumps(data.get("ingredients") or [], ensure_ascii=False, default=_json_default),
+            ))
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO formulas (name, student, timestamp, filename, meta, ingredients) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            imported = conn.total_changes - before
+            conn.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES ('json_imported', ?)",
+                         (datetime.now().isoformat(),))
+        return imported
+
+    def json_imported(self):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM store_meta WHERE key = 'json_imported'").fetchone()
+        return row is not None
+
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+def get_formula_store(db_path, json_dir=None):
+    """프로세스 공용 저장소 (최초 1회 JSON 파일 이관)"""
+    with _STORES_LOCK:
+        store = _STORES.get(db_path)
+        if store is None:
+            store = FormulaStore(db_path)
+            if json_dir and os.path.isdir(json_dir) and not store.json_imported():
+                store.import_json_dir(json_dir)
+            _STORES[db_path] = store
+    return store
@@ -0,0 +1,178 @@
+"""
+영양성분 계산 (배합 × 원료 영양성분표 행렬곱 1회, 식품등의 표시기준 표시 단위 반올림)
+"""
+import re
+import numpy as np
+import pandas as pd
+from data.common import (ESTIMATE_FIELDS, INGREDIENT_NUTRIENTS, estimate_from_totals, property_matrix,
+                         property_table)
+
+# 표시 9항목: 키, 표시명, 단위, 1일 영양성분 기준치 (없으면 None)
+NUTRIENTS = [
+    {"key": "kcal", "label": "열량", "unit": "kcal", "dv": None},
+    {"key": "sodium", "label": "나트륨", "unit": "mg", "dv": 2000},
+    {"key": "carb", "label": "탄수화물", "unit": "g", "dv": 324},
+    {"key": "sugar", "label": "당류", "unit": "g", "dv": 100},
+    {"key": "fat", "label": "지방", "unit": "g", "dv": 54},
+    {"key": "trans_fat", "label": "트랜스지방", "unit": "g", "dv": None},
+    {"key": "sat_fat", "label": "포화지방", "unit": "g", "dv": 15},
+    {"key": "chol", "label": "콜레스테롤", "unit": "mg", "dv": 300},
+    {"key": "protein", "label": "단백질", "unit": "g", "dv": 55},
+]
+NUTRIENT_KEYS = tuple(n["key"] for n in NUTRIENTS)
+# 당 용액 밀도 근사 (g/ml = 1 + DENSITY_PER_BRIX × Brix) — 100g 기준 → 100ml 기준 환산
+DENSITY_PER_BRIX = 0.004
+DEFAULT_VOLUME_ML = 500
+
+
+# ━━━ 표시 단위 (식품등의 표시기준 영양성분 표시 방법) ━━━
+# (이 값 미만은 0, 이 값 미만은 "…미만" 표기, [(이하 경계, 표시 단위), …])
+ROUNDING = {
+    "kcal":      (5, None, [(np.inf, 5)]),
+    "sodium":    (5, None, [(120, 5), (np.inf, 10)]),
+    "carb":      (0.5, 1, [(np.inf, 1)]),
+    "sugar":     (0.5, 1, [(np.inf, 1)]),
+    "protein":   (0.5, 1, [(np.inf, 1)]),
+    "fat":       (0.5, None, [(5, 0.1), (np.inf, 1)]),
+    "sat_fat":   (0.5, None, [(5, 0.1), (np.inf, 1)]),
+    "trans_fat": (0.2, 0.5, [(5, 0.1), (np.inf, 1)]),
+    "chol":      (2, 5, [(np.inf, 5)]),
+}
+
+
+def round_for_label(key, values):
+    """영양성분 실제값 → 표시값 (배열 가능, "…미만" 구간은 format_nutrient 가 다시 알아보도록 실제값 유지)"""
+    values = np.asarray(values, dtype=float)
+    zero_below, less_than, steps = ROUNDING[key]
+    out = values.copy()
+    lower = -np.inf
+    for upper, unit in steps:
+        band = (values > lower) & (values <= upper)
+        out[band] = np.round(values[band] / unit) * unit
+        lower = upper
+    if less_than is not None:
+        band = (values >= zero_below) & (values < less_than)
+        out[band] = values[band]
+    out[values < zero_below] = 0.0
+    return out
+
+
+_UNITS = {n["key"]: n["unit"] for n in NUTRIENTS}
+
+
+def format_nutrients(key, values):
+    """영양성분 실제값 배열 → 표시 문자열 목록 ("45kcal", "1g 미만", "0.3g")"""
+    values = np.asarray(values, dtype=float)
+    zero_below, less_than, _ = ROUNDING[key]
+    unit = _UNITS[key]
+    shown = round_for_label(key, values)
+    if less_than is None:
+        return [f"{v:g}{unit}" for v in shown.tolist()]
+    below = ((values >= zero_below) & (values < less_than)).tolist()
+    return [f"{less_than:g}{unit} 미만" if b else f"{v:g}{unit}" for v, b in zip(shown.tolist(), below)]
+
+
+def format_nutrient(key, value):
+    """영양성분 실제값 1개 → 표시 문자열"""
+    return format_nutrients(key, [value])[0]
+
+
+def parse_volume(text, default=DEFAULT_VOLUME_ML):
+    """내용량 표기 ("500ml", "1.5L", 350) → ml"""
+    if isinstance(text, (int, float)) and not isinstance(text, bool):
+        return float(text) if text > 0 else float(default)
+    m = re.search(r"([\d.]+)\s*(ml|mL|ML|l|L|리터)?", str(text or ""))
+    if not m:
+        return float(default)
+    try:
+        value = float(m.group(1))
+    except ValueError:
+        return float(default)
+    return value * 1000 if (m.group(2) or "").lower() in ("l", "리터") else value
+
+
+# ━━━ 계산 ━━━
+def nutrient_matrix(formulations):
+    """배합 묶음 → (배합명, 배합 × 영양성분 100g 당 행렬, 배합별 추정 Brix)
+
+    배합 × 영양성분표 원료 비율행렬(np.add.at 로 채움)과 원료 × 영양성분 행렬의 곱 1회로 계산한다.
+    """
+    labels = list(formulations)
+    names, pcts, rows = [], [], []
+    for i, label in enumerate(labels):
+        df = formulations[label]
+        if df is None or "원료명" not in df.columns or "비율(%)" not in df.columns:
+            continue
+        names += df["원료명"].tolist()
+        pcts += df["비율(%)"].tolist()
+        rows += [i] * len(df)
+    pcts = pd.to_numeric(pd.Series(pcts, dtype=object), errors="coerce").fillna(0).to_numpy(dtype=float)
+    rows = np.asarray(rows, dtype=np.int64)
+    index, table = property_table(NUTRIENT_KEYS, INGREDIENT_NUTRIENTS)
+    pos = index.lookup_many(names) if names else np.zeros(0, dtype=np.int64)
+    ratio = np.zeros((len(labels), len(table)))
+    np.add.at(ratio, (rows, pos), pcts / 100)
+    per_100g = ratio @ table
+    props = property_matrix(names, ESTIMATE_FIELDS) if names else np.zeros((0, len(ESTIMATE_FIELDS)))
+    solids = np.bincount(rows, weights=pcts * props[:, 0], minlength=len(labels))
+    brix = estimate_from_totals(solids, np.zeros(len(labels)), np.zeros(len(labels)))[0]
+    return labels, per_100g, brix
+
+
+def nutrition_facts_batch(formulations, volumes=None, default_volume=DEFAULT_VOLUME_ML):
+    """여러 배합 영양성분 → DataFrame (index 배합명, 열 "열량(100ml)" … "단백질(총)", 표시값 기준)
+
+    volumes: {배합명: 내용량(ml 또는 "500ml")} — 없으면 default_volume.
+    100ml 당 = 100g 당 × 밀도(추정 Brix), 총 내용량 당 = 100ml 당 × 내용량/100.
+    """
+    labels, per_100g, brix = nutrient_matrix(formulations)
+    volumes = volumes or {}
+    vol = np.array([parse_volume(volumes.get(k), default_volume) for k in labels], dtype=float)
+    per_100ml = per_100g * (1 + DENSITY_PER_BRIX * brix)[:, None]
+    per_pack = per_100ml * (vol / 100)[:, None]
+    out = {"내용량(ml)": vol, "추정 Brix": np.round(brix, 1)}
+    for j, n in enumerate(NUTRIENTS):
+        out[f"{n['label']}(100ml)"] = round_for_label(n["key"], per_100ml[:, j])
+    for j, n in enumerate(NUTRIENTS):
+        out[f"{n['label']}(총)"] = round_for_label(n["key"], per_pack[:, j])
+    return pd.DataFrame(out, index=pd.Index(labels, name="배합명"))
+
+
+def nutrition_facts(df, volume_ml=DEFAULT_VOLUME_ML):
+    """배합 1건 → 영양성분표 DataFrame [영양성분, 100ml 당, 총 내용량 당, 1일 기준치 비율(%)]"""
+    labels, per_100g, brix = nutrient_matrix({"_": df})
+    volume_ml = parse_volume(volume_ml)
+    per_100ml = per_100g[0] * (1 + DENSITY_PER_BRIX * brix[0])
+    per_pack = per_100ml * volume_ml / 100
+    rows = []
+    for j, n in enumerate(NUTRIENTS):
+        shown = float(round_for_label(n["key"], per_pack[j]))
+        rows.append({
+            "영양성분": n["label"],
+            "100ml 당": format_nutrient(n["key"], per_100ml[j]),
+            "총 내용량 당": format_nutrient(n["key"], per_pack[j]),
+            "1일 기준치 비율(%)": f"{round(shown / n['dv'] * 100)}%" if n["dv"] else "-",
+        })
+    return pd.DataFrame(rows)
+
+
+def nutrition_label_drafts(formulations, volumes=None, default_volume=DEFAULT_VOLUME_ML):
+    """여러 배합 표시사항 영양성분 문구 일괄 → {배합명: "총 내용량 500ml, 열량 185kcal, 나트륨 0mg(0%), …"}
+
+    nutrition_facts_batch 1회 + 영양성분별 문자열 변환으로 만든다.
+    """
+    facts = nutrition_facts_batch(formulations, volumes, default_volume)
+    columns = [[f"총 내용량 {v:g}ml" for v in facts["내용량(ml)"].tolist()]]
+    for n in NUTRIENTS:
+        values = facts[f"{n['label']}(총)"].to_numpy()
+        texts = format_nutrients(n["key"], values)
+        if n["dv"]:
+            pct = np.round(values / n["dv"] * 100).astype(int).tolist()
+            texts = [f"{t}({p}%)" for t, p in zip(texts, pct)]
+        columns.append([f"{n['label']} {t}" for t in texts])
+    return {label: ", ".join(parts) for label, parts in zip(facts.index, zip(*columns))}
+
+
+def nutrition_label_text(df, volume_ml=DEFAULT_VOLUME_ML):
+    """배합 1건 → 표시사항용 영양성분 문구"""
+    return nutrition_label_drafts({"_": df}, {"_": volume_ml})["_"]
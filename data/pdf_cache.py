@@ -0,0 +1,101 @@
+"""
+PDF 추출 텍스트 디스크 캐시 (SHA-256 키, 용량 제한 LRU)
+"""
+import os, hashlib, threading, time
+
+
+def content_hash(data):
+    """바이트 → SHA-256 hex"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class DiskLRUCache:
+    """파일 1개 = 항목 1개, 총 용량 초과 시 가장 오래 안 쓴 항목부터 삭제"""
+
+    def __init__(self, cache_dir, max_bytes, suffix=".txt"):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        # key → [크기, 최근 사용 시각] (재시작 시 파일 mtime 으로 복원)
+        self._entries = {}
+        for fn in os.listdir(cache_dir):
+            if fn.endswith(suffix):
+                st = os.stat(os.path.join(cache_dir, fn))
+                self._entries[fn[:-len(suffix)]] = [st.st_size, st.st_mtime]
+        self._total = sum(e[0] for e in self._entries.values())
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def get(self, key):
+        """캐시 조회 (없으면 None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            now = time.time()
+            entry[1] = now
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                text = f.read()
+            os.utime(self._path(key), (now, now))
+        except OSError:
+            with self._lock:
+                self._drop(key)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def path(self, key):
+        """저장된 항목의 파일 경로 (없으면 None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry[1] = time.time()
+        return self._path(key)
+
+    def put(self, key, text):
+        """캐시 저장 (임시파일 → rename 으로 원자적 기록)"""
+        data = text.encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        tmp = self._path(key) + f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self._path(key))
+        with self._lock:
+            self._drop(key, remove_file=False)
+            self._entries[key] = [len(data), time.time()]
+            self._total += len(data)
+            self._evict()
+
+    def _drop(self, key, remove_file=True):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total -= entry[0]
+        if remove_file:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _evict(self):
+        if self._total <= self.max_bytes:
+            return
+        for key, _ in sorted(self._entries.items(), key=lambda kv: kv[1][1]):
+            if self._total <= self.max_bytes:
+                break
+            self._drop(key)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._total,
+                    "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
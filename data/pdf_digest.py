@@ -0,0 +1,141 @@
+"""
+긴 PDF 요약본 (map-reduce: 조각별 동시 요약 → 합쳐서 문서 요약, 내용 해시로 디스크 캐시)
+"""
+import os, threading
+from data.common import CACHE_DIR
+from data.pdf_cache import DiskLRUCache, content_hash
+from data.pdf_search import chunk_text
+from data.ai_client import AIClientError, call_claude_many
+
+DIGEST_CACHE_DIR = os.path.join(CACHE_DIR, "pdf_digest")
+DIGEST_CACHE_MAX_BYTES = 32 * 1024 * 1024
+# map 단계 조각 크기 / reduce 한 번에 넣을 요약 분량 / 최종 요약본 분량 (자)
+DIGEST_CHUNK_CHARS = 6000
+DIGEST_REDUCE_CHARS = 12000
+DIGEST_MAX_CHARS = 4000
+# 프롬프트가 바뀌면 올려서 이전 요약본 무효화
+DIGEST_VERSION = 1
+
+MAP_PROMPT = """아래는 문서 '{name}'의 {page} 페이지 부근 일부입니다.
+음료 제품 개발·공정·품질·표시 기준과 관련된 사실(수치, 온도·시간, 기준값, 조항 번호, 금지·허용 사항)만
+{chars}자 이내의 항목형 요약으로 정리하세요. 각 항목 끝에 (p.{page}) 처럼 페이지를 남기고, 관련 내용이 없으면 "없음"만 쓰세요.
+
+[원문]
+{text}"""
+
+REDUCE_PROMPT = """아래는 문서 '{name}'의 부분 요약들입니다. 중복을 합치고 주제별로 묶어
+{chars}자 이내의 요약본으로 정리하세요. 수치·조항 번호·페이지 표기 (p.N) 는 그대로 유지하세요.
+
+[부분 요약]
+{text}"""
+
+
+_DIGEST_CACHE = None
+_DIGEST_CACHE_LOCK = threading.Lock()
+
+def get_digest_cache():
+    """PDF 요약본 디스크 캐시 (프로세스 공용)"""
+    global _DIGEST_CACHE
+    with _DIGEST_CACHE_LOCK:
+        if _DIGEST_CACHE is None:
+            _DIGEST_CACHE = DiskLRUCache(DIGEST_CACHE_DIR, DIGEST_CACHE_MAX_BYTES, suffix=".md")
+    return _DIGEST_CACHE
+
+
+def digest_key(text, max_chars=DIGEST_MAX_CHARS, chunk_chars=DIGEST_CHUNK_CHARS, model=None, source_key=None):
+    """원문 + 요약 설정 → 캐시 키 (source_key 를 주면 (TextHandle.key) 원문 대신 그 키로 — 본문 해시 생략)"""
+    config = f"{DIGEST_VERSION}|{max_chars}|{chunk_chars}|{model}|"
+    if source_key is not None:
+        return content_hash(f"{config}key:{source_key}".encode("utf-8"))
+    return content_hash(config.encode("utf-8") + text.encode("utf-8"))
+
+
+def cached_digest(text=None, max_chars=DIGEST_MAX_CHARS, chunk_chars=DIGEST_CHUNK_CHARS, model=None, source_key=None):
+    """이미 만든 요약본 (없으면 None)"""
+    return get_digest_cache().get(digest_key(text, max_chars, chunk_chars, model, source_key))
+
+
+def _call_kwargs(model, max_tokens):
+    kw = {"max_tokens": max_tokens}
+    if model:
+        kw["model"] = model
+    return kw
+
+
+def _group(summaries):
+    groups, buf, size = [], [], 0
+    for s in summaries:
+        if buf and size + len(s) > DIGEST_REDUCE_CHARS:
+            groups.append(buf)
+            buf, size = [], 0
+        buf.append(s)
+        size += len(s) + 2
+    if buf:
+        groups.append(buf)
+    return groups
+
+
+def _reduce(name, summaries, max_chars, model, progress=None):
+    """부분 요약을 DIGEST_REDUCE_CHARS 단위로 묶어 한 묶음이 될 때까지 반복 요약 → (요약본, 실패한 호출 수)"""
+    done, failed = 0, 0
+    while True:
+        groups = _group(summaries)
+        # 한 묶음이면 최종 요약, 아니면 다음 단계에서 한 묶음에 들어가도록 줄임
+        target = max_chars if len(groups) == 1 else max(500, DIGEST_REDUCE_CHARS // (2 * len(groups)))
+        if len(groups) == 1 and sum(len(s) + 2 for s in groups[0]) <= max_chars:
+            return "\n\n".join(groups[0]), failed
+        prompts = {i: REDUCE_PROMPT.format(name=name, chars=target, text="\n\n".join(g)) for i, g in enumerate(groups)}
+        # 예상 호출 수 = 이번 단계 묶음 수 + (묶음이 여럿이면 줄인 요약을 합치는 최종 1회)
+        total = done + len(groups) + (len(groups) > 1)
+        out = {}
+        for i, text, err in call_claude_many(prompts, **_call_kwargs(model, max(500, target))):
+            # 요약 실패한 묶음은 원래 부분 요약을 잘라서 유지
+            body = text.strip() if err is None else "\n\n".join(groups[i])
+            failed += err is not None
+            out[i] = body[:target * 3 // 2]
+            done += 1
+            if progress:
+                progress("reduce", done, total)
+        summaries = [out[i] for i in range(len(groups))]
+        if len(groups) == 1:
+            return summaries[0], failed
+
+
+def summarize_document(name, text, max_chars=DIGEST_MAX_CHARS, chunk_chars=DIGEST_CHUNK_CHARS,
+                       model=None, refresh=False, progress=None, source_key=None):
+    """문서 → 요약본 (map: 조각별 동시 요약, reduce: 합쳐서 max_chars 안팎으로)
+
+    progress(단계, 완료 수, 전체 수) — 단계는 "map" / "reduce" (reduce 전체 수는 예상 호출 수). 캐시 적중 시에는 호출되지 않음.
+    모든 조각 요약이 실패하면 AIClientError. source_key 는 cached_digest 와 같은 캐시 키를 쓰도록 (TextHandle.key).
+    """
+    cache = get_digest_cache()
+    key = digest_key(text, max_chars, chunk_chars, model, source_key)
+    if not refresh:
+        digest = cache.get(key)
+        if digest is not None:
+            return digest
+
+    chunks = chunk_text(text, chunk_chars, overlap=0)
+    if not chunks:
+        return ""
+    per_chunk = max(300, min(1200, DIGEST_REDUCE_CHARS // max(1, len(chunks))))
+    prompts = {i: MAP_PROMPT.format(name=name, page=ch["page"], chars=per_chunk, text=ch["text"])
+               for i, ch in enumerate(chunks)}
+    summaries, failed, done = {}, 0, 0
+    for i, summary, err in call_claude_many(prompts, **_call_kwargs(model, max(400, per_chunk))):
+        done += 1
+        if err is not None:
+            failed += 1
+        elif summary.strip() and summary.strip() != "없음":
+            summaries[i] = summary.strip()
+        if progress:
+            progress("map", done, len(chunks))
+    if failed == len(chunks):
+        raise AIClientError(f"'{name}' 조각 요약 전부 실패")
+
+    ordered = [summaries[i] for i in sorted(summaries)]
+    digest, reduce_failed = _reduce(name, ordered, max_chars, model, progress) if ordered else ("", 0)
+    # 조각 요약·합치기 중 하나라도 실패한 요약본은 다음에 다시 만들도록 저장하지 않음
+    if not failed and not reduce_failed:
+        cache.put(key, digest)
+    return digest
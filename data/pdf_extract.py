@@ -0,0 +1,121 @@
+"""
+PDF 텍스트 추출 (페이지 범위 병렬 처리)
+"""
+import io, os, math, multiprocessing, tempfile, threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+# 페이지 경계 표시 (extract_pdf_text 결과에서 페이지 사이에 삽입)
+PAGE_SEPARATOR = "\f"
+# 이보다 적은 페이지는 프로세스 기동 비용이 더 커서 순차 처리
+PARALLEL_MIN_PAGES = 24
+# 프로세스 공용 추출 풀 크기 (업로드·세션마다 풀을 새로 띄우지 않고 이 풀을 나눠 씀)
+PDF_EXTRACT_MAX_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+
+def _pdf_reader(source):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        from PyPDF2 import PdfReader
+    return PdfReader(source)
+
+
+def _extract_range(path, start, end):
+    """워커: 파일 경로의 PDF에서 [start, end) 페이지 추출"""
+    reader = _pdf_reader(path)
+    return start, [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def _extract_sequential(reader, progress=None, done=0, skip=None):
+    n = len(reader.pages)
+    pages = [""] * n
+    for i in range(n):
+        if skip is not None and skip[i]:
+            continue
+        pages[i] = reader.pages[i].extract_text() or ""
+        done += 1
+        if progress:
+            progress(done, n)
+    return pages
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+def get_extract_pool():
+    """PDF 추출 프로세스 풀 (프로세스 공용)
+
+    spawn 으로 띄운다 — 멀티스레드 서버에서 fork 하면 다른 스레드가 잡고 있던 락을 물려받아 워커가 멈출 수 있다.
+    """
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(max_workers=PDF_EXTRACT_MAX_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _POOL
+
+
+def _discard_pool(pool):
+    """깨진 풀은 버리고 다음 호출에서 새로 띄움"""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is pool:
+            _POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_pdf_pages(data, parallel=True, workers=None, progress=None):
+    """PDF 바이트 → 페이지별 텍스트 리스트
+
+    parallel=True 이고 페이지가 충분히 많으면 페이지 범위를 공용 프로세스 풀에 나눠 추출한다.
+    workers 는 페이지를 나눌 기준 워커 수 (최대 PDF_EXTRACT_MAX_WORKERS).
+    progress(완료 페이지 수, 전체 페이지 수) 는 호출한 스레드에서 불린다.
+    """
+    reader = _pdf_reader(io.BytesIO(data))
+    n = len(reader.pages)
+    workers = min(workers or PDF_EXTRACT_MAX_WORKERS, PDF_EXTRACT_MAX_WORKERS)
+    if not parallel or workers < 2 or n < PARALLEL_MIN_PAGES:
+        return _extract_sequential(reader, progress)
+
+    # 워커마다 바이트를 넘기지 않도록 임시 파일 경로만 전달
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    pages, got, done = [""] * n, [False] * n, 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        # 진행률이 촘촘하도록 워커 수의 4배 정도로 잘게 나눔
+        chunk = max(1, math.ceil(n / (workers * 4)))
+        pool, futures = get_extract_pool(), []
+        try:
+            futures = [pool.submit(_extract_range, path, s, min(n, s + chunk)) for s in range(0, n, chunk)]
+            for fut in as_completed(futures):
+                start, texts = fut.result()
+                pages[start:start + len(texts)] = texts
+                got[start:start + len(texts)] = [True] * len(texts)
+                done += len(texts)
+                if progress:
+                    progress(done, n)
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            raise
+        except Exception:
+            # 이 PDF 의 남은 조각만 취소 (풀은 다른 세션과 공유)
+            for fut in futures:
+                fut.cancel()
+            raise
+    except Exception:
+        # 프로세스 풀을 못 쓰는 환경이면 남은 페이지만 순차 처리
+        rest = _extract_sequential(reader, progress, done, skip=got)
+        pages = [p if g else r for p, g, r in zip(pages, got, rest)]
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return pages
+
+
+def split_pages(text):
+    """extract_pdf_text 결과 → 페이지별 텍스트"""
+    return text.split(PAGE_SEPARATOR)
@@ -0,0 +1,279 @@
+"""
+PDF 문서 검색 (역색인)
+"""
+import bisect, math, re, sys, threading
+from collections import OrderedDict
+from data.pdf_extract import PAGE_SEPARATOR
+from data.pdf_cache import content_hash
+
+# 글자 n-gram 길이 (한국어는 1~2글자 단위 검색이 많음)
+NGRAM_SIZES = (1, 2)
+# 색인 캐시마다 메모리에 둘 추정 용량 (문서 수가 아니라 크기로 제한 — 행 색인은 본문의 20배 이상)
+INDEX_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+class DocumentIndex:
+    """문서 1건의 행 단위 역색인 — 글자 n-gram + 공백 토큰"""
+
+    def __init__(self, text):
+        self.lines = []       # 원문 행
+        self.pages = []       # 행별 페이지 번호 (1부터)
+        self.offsets = []     # 행별 원문 내 시작 위치
+        self._lower = []
+        self._grams = {}      # n-gram → 행 번호 리스트 (오름차순, 중복 없음)
+        self._tokens = {}     # 공백 토큰 → 행 번호 리스트
+        pos = 0
+        for page_no, page in enumerate(text.split(PAGE_SEPARATOR), 1):
+            for line in page.split("\n"):
+                self._add_line(line, page_no, pos)
+                pos += len(line) + 1
+            # 마지막 행 뒤에는 "\n" 대신 PAGE_SEPARATOR 1글자가 옴
+        # 추정 메모리: 행·소문자 행 문자열 + 행별 목록 + 역색인 (목록 칸 8바이트, 키 1개 ≈ 100바이트)
+        postings = sum(map(len, self._grams.values())) + sum(map(len, self._tokens.values()))
+        self.nbytes = (2 * sys.getsizeof(text) + 250 * len(self.lines) + 8 * postings
+                       + 100 * (len(self._grams) + len(self._tokens)))
+
+    def _add_line(self, line, page_no, offset):
+        i = len(self.lines)
+        low = line.lower()
+        self.lines.append(line)
+        self.pages.append(page_no)
+        self.offsets.append(offset)
+        self._lower.append(low)
+        for n in NGRAM_SIZES:
+            for g in {low[k:k + n] for k in range(len(low) - n + 1)}:
+                self._grams.setdefault(g, []).append(i)
+        for tok in set(low.split()):
+            self._tokens.setdefault(tok, []).append(i)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def _candidates(self, q):
+        # 질의의 n-gram 중 가장 드문 것의 행 목록만 확인
+        n = min(max(NGRAM_SIZES), len(q))
+        best = None
+        for k in range(len(q) - n + 1):
+            post = self._grams.get(q[k:k + n])
+            if post is None:
+                return []
+            if best is None or len(post) < len(best):
+                best = post
+        return best or []
+
+    def search(self, query, limit=None, whole_word=False):
+        """키워드 검색 → [{"line", "page", "offset", "text"}] (대소문자 무시)"""
+        q = query.strip().lower()
+        if not q:
+            return []
+        hits = []
+        if whole_word:
+            for i in self._tokens.get(q, []):
+                col = self._lower[i].find(q)
+                hits.append(self._hit(i, col))
+                if limit and len(hits) >= limit:
+                    break
+            return hits
+        for i in self._candidates(q):
+            col = self._lower[i].find(q)
+            if col >= 0:
+                hits.append(self._hit(i, col))
+                if limit and len(hits) >= limit:
+                    break
+        return hits
+
+    def count(self, query):
+        return len(self.search(query))
+
+    def contains(self, query):
+        return bool(self.search(query, limit=1))
+
+    def _hit(self, i, col):
+        return {"line": i, "page": self.pages[i], "offset": self.offsets[i] + col, "text": self.lines[i]}
+
+    def context(self, line, before=1, after=2):
+        """검색 행 앞뒤 행 묶음"""
+        return "\n".join(self.lines[max(0, line - before):min(len(self.lines), line + after + 1)])
+
+    def page_of(self, offset):
+        """원문 위치 → 페이지 번호"""
+        return self.pages[max(0, bisect.bisect_right(self.offsets, offset) - 1)] if self.lines else 1
+
+
+class IndexCache:
+    """내용 키 → 색인, 추정 용량(색인.nbytes) 제한 LRU — 가장 최근 1개는 용량을 넘어도 유지"""
+
+    def __init__(self, build, max_bytes=INDEX_CACHE_MAX_BYTES):
+        self.build = build
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+        self._resident = 0
+
+    def get(self, text, key=None):
+        key = key or content_hash(text.encode("utf-8"))
+        with self._lock:
+            index = self._items.get(key)
+            if index is not None:
+                self._items.move_to_end(key)
+                return index
+        index = self.build(text)
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._resident -= old.nbytes
+            self._items[key] = index
+            self._resident += index.nbytes
+            while self._resident > self.max_bytes and len(self._items) > 1:
+                _, dropped = self._items.popitem(last=False)
+                self._resident -= dropped.nbytes
+        return index
+
+    def stats(self):
+        with self._lock:
+            return {"indexes": len(self._items), "resident_bytes": self._resident, "max_bytes": self.max_bytes}
+
+
+_DOCUMENT_INDEXES = IndexCache(DocumentIndex)
+
+def get_document_index(text, key=None):
+    """문서 역색인 (내용 해시로 프로세스 공용 캐시, key 를 주면 (TextHandle.key) 본문 해시 생략)"""
+    return _DOCUMENT_INDEXES.get(text, key)
+
+
+def search_documents(indexes, query, limit=None):
+    """여러 문서 동시 검색 → {문서명: 검색 결과}"""
+    return {name: idx.search(query, limit=limit) for name, idx in indexes.items()}
+
+
+# ━━━ BM25 문단 검색 (AI 프롬프트용 근거 선택) ━━━
+_TERM_RE = re.compile(r"[가-힣]+|[a-z0-9]+")
+_HANGUL_RE = re.compile(r"[가-힣]")
+
+
+def tokenize(text):
+    """검색어 분해 — 한글은 2글자 n-gram, 영문·숫자는 단어"""
+    terms = []
+    for run in _TERM_RE.findall(text.lower()):
+        if "가" <= run[0] <= "힣" and len(run) > 1:
+            terms.extend(run[k:k + 2] for k in range(len(run) - 1))
+        else:
+            terms.append(run)
+    return terms
+
+
+def estimate_tokens(text):
+    """대략적인 토큰 수 (한글 1글자 ≈ 1토큰, 그 외 4글자 ≈ 1토큰)"""
+    hangul = len(_HANGUL_RE.findall(text))
+    return hangul + (len(text) - hangul + 3) // 4
+
+
+def chunk_text(text, chunk_chars=600, overlap=100):
+    """문서 → 행 경계 기준 문단 조각 [{"text", "page", "offset"}]"""
+    chunks, buf, start, pos = [], [], 0, 0
+    page_starts = [0]
+    for page in text.split(PAGE_SEPARATOR)[:-1]:
+        page_starts.append(page_starts[-1] + len(page) + 1)
+
+    def flush():
+        body = "\n".join(buf).replace(PAGE_SEPARATOR, "\n").strip()
+        if body:
+            chunks.append({"text": body, "page": bisect.bisect_right(page_starts, start), "offset": start})
+
+    for line in text.split("\n"):
+        if buf and sum(len(b) + 1 for b in buf) + len(line) > chunk_chars:
+            flush()
+            # 앞 조각 끝부분을 겹쳐서 문맥이 끊기지 않게
+            keep, size = [], 0
+            for b in reversed(buf):
+                if size + len(b) + 1 > overlap:
+                    break
+                keep.insert(0, b)
+                size += len(b) + 1
+            buf, start = keep, pos - size
+        if not buf:
+            start = pos
+        # 한 행이 너무 길면 잘라서 넣음
+        while len(line) > chunk_chars:
+            buf.append(line[:chunk_chars])
+            flush()
+            buf, start, line, pos = [], pos + chunk_chars, line[chunk_chars:], pos + chunk_chars
+        buf.append(line)
+        pos += len(line) + 1
+    if buf:
+        flush()
+    return chunks
+
+
+class ChunkIndex:
+    """문서 1건의 문단 조각 BM25 통계 (여러 문서를 합쳐 순위 계산 가능)"""
+
+    def __init__(self, text, chunk_chars=600, overlap=100):
+        self.chunks = chunk_text(text, chunk_chars, overlap)
+        self.lengths = []
+        self.postings = {}    # 검색어 → [(조각 번호, 빈도)]
+        for i, ch in enumerate(self.chunks):
+            terms = tokenize(ch["text"])
+            self.lengths.append(len(terms))
+            tf = {}
+            for t in terms:
+                tf[t] = tf.get(t, 0) + 1
+            for t, c in tf.items():
+                self.postings.setdefault(t, []).append((i, c))
+        self.total_length = sum(self.lengths)
+        # 추정 메모리: 조각 본문(겹침 포함) + 조각 dict + 역색인 (항목 튜플 ≈ 64바이트, 키 1개 ≈ 100바이트)
+        self.nbytes = (sum(sys.getsizeof(ch["text"]) + 300 for ch in self.chunks)
+                       + 64 * sum(map(len, self.postings.values())) + 100 * len(self.postings))
+
+
+_CHUNK_INDEXES = IndexCache(ChunkIndex)
+
+def get_chunk_index(text):
+    """문단 BM25 색인 (내용 해시로 프로세스 공용 캐시)"""
+    return _CHUNK_INDEXES.get(text)
+
+
+def rank_chunks(docs, query, top_k=None, k1=1.5, b=0.75):
+    """여러 문서 {이름: 본문} 의 문단을 질의에 대해 BM25 순위화 → [(점수, 문서명, 조각)]"""
+    indexes = {name: get_chunk_index(text) for name, text in docs.items() if text}
+    n_chunks = sum(len(ix.chunks) for ix in indexes.values())
+    if not n_chunks:
+        return []
+    avgdl = sum(ix.total_length for ix in indexes.values()) / n_chunks or 1.0
+    q_terms = set(tokenize(query))
+    scores = {}
+    for t in q_terms:
+        df = sum(len(ix.postings.get(t, ())) for ix in indexes.values())
+        if not df:
+            continue
+        idf = math.log(1 + (n_chunks - df + 0.5) / (df + 0.5))
+        for name, ix in indexes.items():
+            for i, tf in ix.postings.get(t, ()):
+                norm = tf + k1 * (1 - b + b * ix.lengths[i] / avgdl)
+                scores[(name, i)] = scores.get((name, i), 0.0) + idf * tf * (k1 + 1) / norm
+    ranked = sorted(scores.items(), key=lambda kv: -kv[1])
+    if top_k:
+        ranked = ranked[:top_k]
+    return [(s, name, indexes[name].chunks[i]) for (name, i), s in ranked]
+
+
+def build_pdf_context(docs, query, max_chars=3000, max_tokens=None):
+    """질의와 관련도 높은 문단만 골라 글자/토큰 예산 안에서 참조 문서 문자열 구성"""
+    picked, used_chars, used_tokens = [], 0, 0
+    for score, name, ch in rank_chunks(docs, query):
+        header = f"\n\n[문서: {name} p.{ch['page']}]\n"
+        size = len(header) + len(ch["text"])
+        tokens = estimate_tokens(header + ch["text"]) if max_tokens else 0
+        if used_chars + size > max_chars or (max_tokens and used_tokens + tokens > max_tokens):
+            continue
+        picked.append((name, ch, header))
+        used_chars += size
+        used_tokens += tokens
+    if not picked and docs:
+        # 질의와 겹치는 말이 없으면 예전처럼 문서 앞부분 사용
+        per_doc = max_chars // len(docs)
+        return "".join(f"\n\n[문서: {name}]\n{text.replace(PAGE_SEPARATOR, chr(10))[:per_doc]}" for name, text in docs.items())
+    # 문서 순서·원문 순서대로 배치
+    order = {name: k for k, name in enumerate(docs)}
+    picked.sort(key=lambda p: (order[p[0]], p[1]["offset"]))
+    return "".join(header + ch["text"] for name, ch, header in picked)
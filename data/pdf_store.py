@@ -0,0 +1,124 @@
+"""
+세션 공용 PDF 텍스트 저장소 (내용 해시 키, 디스크 파일 mmap + 참조 수 + 용량 제한 LRU)
+"""
+import mmap, sys, threading, weakref
+from collections import OrderedDict
+
+
+class TextHandle:
+    """세션에 두는 PDF 텍스트 참조 — 본문은 SharedTextStore 가 프로세스에 1벌만 보관"""
+    __slots__ = ("key", "chars", "_store", "__weakref__")
+
+    def __init__(self, store, key, chars):
+        self.key = key
+        self.chars = chars
+        self._store = store
+
+    @property
+    def text(self):
+        return self._store.text(self.key)
+
+    def __len__(self):
+        return self.chars
+
+    def __repr__(self):
+        return f"TextHandle({self.key[:12]}…, {self.chars:,}자)"
+
+
+class SharedTextStore:
+    """내용 해시 → 디스크 캐시 파일을 mmap 으로 열어 두고, 디코딩한 본문은 용량 제한 LRU 로 공유
+
+    핸들이 하나라도 살아 있으면 mmap 을 유지하고, 마지막 핸들이 사라지면 닫는다.
+    디코딩한 문자열은 참조 수와 무관하게 max_resident_bytes 안에서 최근 사용 순으로 남긴다.
+    """
+
+    def __init__(self, disk_cache, max_resident_bytes):
+        self.disk_cache = disk_cache
+        self.max_resident_bytes = max_resident_bytes
+        self._lock = threading.Lock()
+        self._mapped = {}            # key → {"file", "mm", "pinned", "refs", "chars"}
+        self._texts = OrderedDict()  # key → 디코딩한 본문
+        self._resident = 0
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, key, text):
+        """새 텍스트 저장 → 핸들"""
+        if self.disk_cache.path(key) is None:
+            self.disk_cache.put(key, text)
+        with self._lock:
+            self._remember(key, text)
+        return self.open(key, _text=text)
+
+    def open(self, key, _text=None):
+        """저장된 텍스트의 핸들 (없으면 None)"""
+        with self._lock:
+            entry = self._mapped.get(key)
+            if entry is None:
+                path = self.disk_cache.path(key)
+                f = mm = None
+                if path is not None:
+                    try:
+                        f = open(path, "rb")
+                        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    except (OSError, ValueError):
+                        if f is not None:
+                            f.close()
+                        f = None
+                if mm is None and _text is None:
+                    return None
+                # 디스크 캐시에 못 넣은 (너무 큰) 텍스트는 핸들이 있는 동안 메모리에 고정
+                entry = self._mapped[key] = {"file": f, "mm": mm, "pinned": None if mm else _text,
+                                             "refs": 0, "chars": None}
+            entry["refs"] += 1
+        if entry["chars"] is None:
+            entry["chars"] = len(_text if _text is not None else self.text(key))
+        handle = TextHandle(self, key, entry["chars"])
+        weakref.finalize(handle, self._release, key)
+        return handle
+
+    def text(self, key):
+        """핸들 키 → 본문 (LRU 에 없으면 mmap 에서 디코딩)"""
+        with self._lock:
+            text = self._texts.get(key)
+            if text is not None:
+                self._texts.move_to_end(key)
+                self.hits += 1
+                return text
+            self.misses += 1
+            entry = self._mapped.get(key)
+            if entry is not None:
+                text = entry["pinned"] if entry["mm"] is None else entry["mm"][:].decode("utf-8")
+                self._remember(key, text)
+                return text
+        # 핸들 없이 불린 경우 디스크 캐시에서 직접 읽음
+        return self.disk_cache.get(key)
+
+    def _remember(self, key, text):
+        old = self._texts.pop(key, None)
+        if old is not None:
+            self._resident -= sys.getsizeof(old)
+        self._texts[key] = text
+        self._resident += sys.getsizeof(text)
+        while self._resident > self.max_resident_bytes and len(self._texts) > 1:
+            _, dropped = self._texts.popitem(last=False)
+            self._resident -= sys.getsizeof(dropped)
+
+    def _release(self, key):
+        with self._lock:
+            entry = self._mapped.get(key)
+            if entry is None:
+                return
+            entry["refs"] -= 1
+            if entry["refs"] <= 0:
+                del self._mapped[key]
+                if entry["mm"] is not None:
+                    entry["mm"].close()
+                    entry["file"].close()
+
+    def stats(self):
+        with self._lock:
+            return {"documents": len(self._mapped), "handles": sum(e["refs"] for e in self._mapped.values()),
+                    "mapped_bytes": sum(len(e["mm"]) for e in self._mapped.values() if e["mm"] is not None),
+                    "resident_bytes": self._resident, "max_resident_bytes": self.max_resident_bytes,
+                    "hits": self.hits, "misses": self.misses}
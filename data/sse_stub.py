@@ -0,0 +1,107 @@
+"""
+Claude API 스텁 서버 (오프라인 테스트·벤치마크용 SSE 재생)
+
+    python -m data.sse_stub --port 8765 --delay 0.02
+    ANTHROPIC_API_URL=http://127.0.0.1:8765/v1/messages streamlit run app.py
+"""
+import json, time, threading, argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_RESPONSE = """## 스텁 분석 결과
+
+### 1. 현황 분석
+오프라인 스텁 서버가 재생한 응답입니다.
+
+### 2. 핵심 리스크 요인
+- **살균 공정 (CCP-1)**: 온도·시간 기록 확인
+- **충전·밀봉 (CCP-2)**: 밀봉 불량 점검
+
+⚠️ *테스트용 고정 응답입니다.*
+"""
+
+
+def split_tokens(text, size=4):
+    """응답 텍스트 → 스트리밍 조각"""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def sse_events(text, model="stub", chunk_size=4):
+    """Messages API 스트리밍 형식의 (event, data) 목록"""
+    events = [
+        ("message_start", {"type": "message_start", "message": {
+            "id": "msg_stub", "type": "message", "role": "assistant", "model": model,
+            "content": [], "usage": {"input_tokens": 0, "output_tokens": 0}}}),
+        ("content_block_start", {"type": "content_block_start", "index": 0,
+                                 "content_block": {"type": "text", "text": ""}}),
+    ]
+    for tok in split_tokens(text, chunk_size):
+        events.append(("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                               "delta": {"type": "text_delta", "text": tok}}))
+    events += [
+        ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+        ("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn"},
+                           "usage": {"output_tokens": len(text)}}),
+        ("message_stop", {"type": "message_stop"}),
+    ]
+    return events
+
+
+def make_handler(response_text=DEFAULT_RESPONSE, delay=0.0, first_delay=0.0, chunk_size=4):
+    """고정 응답을 재생하는 요청 핸들러 클래스"""
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            model = body.get("model", "stub")
+            if first_delay:
+                time.sleep(first_delay)
+            if body.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                for event, data in sse_events(response_text, model, chunk_size):
+                    self.wfile.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    if delay and event == "content_block_delta":
+                        time.sleep(delay)
+                return
+            if delay:
+                time.sleep(delay * len(split_tokens(response_text, chunk_size)))
+            payload = json.dumps({
+                "id": "msg_stub", "type": "message", "role": "assistant", "model": model,
+                "content": [{"type": "text", "text": response_text}], "stop_reason": "end_turn",
+            }, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return StubHandler
+
+
+def start_stub_server(port=0, **handler_kwargs):
+    """백그라운드 스레드로 스텁 서버 시작 → (서버, API URL)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(**handler_kwargs))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1/messages"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Claude API SSE 스텁 서버")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.02, help="조각 간 지연 (초)")
+    parser.add_argument("--first-delay", type=float, default=0.0, help="첫 응답 전 지연 (초)")
+    parser.add_argument("--response-file", help="재생할 응답 텍스트 파일")
+    args = parser.parse_args()
+    text = DEFAULT_RESPONSE
+    if args.response_file:
+        with open(args.response_file, "r", encoding="utf-8") as f:
+            text = f.read()
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(text, args.delay, args.first_delay))
+    print(f"스텁 서버: http://127.0.0.1:{args.port}/v1/messages")
+    server.serve_forever()
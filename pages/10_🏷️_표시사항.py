@@ -7,14 +7,21 @@ APP_DIR = os.path.dirname(PAGE_DIR)
 if APP_DIR not in sys.path:
     sys.path.insert(0, APP_DIR)
 from data.common import *
+from data.common import _saved_label
+from data.pdf_search import get_document_index, build_pdf_context
+from data.article_index import get_article_index
+from data.ai_client import AIClientError, stream_claude, get_client_metrics
+from data.ai_jobs import get_job_queue
+from data.pdf_digest import DIGEST_CHUNK_CHARS, cached_digest, summarize_document
+from data.nutrition import nutrition_facts, nutrition_facts_batch, nutrition_label_drafts, nutrition_label_text
 
 st.set_page_config(page_title="표시사항", page_icon="🏷️", layout="wide")
 st.markdown("# 🏷️ 표시사항 검토 & 식품등의 표시기준")
 st.markdown("식품등의 표시기준 PDF 학습 → 표시사항 작성 → 적합성 비교 분석")
 st.markdown("---")
 
-if "label_pdf_text" not in st.session_state:
-    st.session_state.label_pdf_text = ""
+if "label_pdf_handle" not in st.session_state:
+    st.session_state.label_pdf_handle = None    # TextHandle (본문은 세션 공용 저장소에 1벌)
 if "label_analysis" not in st.session_state:
     st.session_state.label_analysis = None
 
@@ -47,19 +54,67 @@ with st.sidebar:
 
     label_pdf = st.file_uploader("PDF 업로드", type=["pdf"], key="label_pdf_upload")
     if label_pdf:
-        with st.spinner("📄 PDF 텍스트 추출 중..."):
-            text = extract_pdf_text(label_pdf)
-            if text:
-                st.session_state.label_pdf_text = text
-                st.success(f"✅ {label_pdf.name} ({len(text):,}자) 학습 완료")
-            else:
-                st.error("텍스트 추출 실패")
+        # 같은 파일이면 재추출·재색인하지 않음
+        if st.session_state.get("label_pdf_key") != (label_pdf.name, label_pdf.size):
+            with st.spinner("📄 PDF 텍스트 추출 중..."):
+                handle = extract_pdf_handle(label_pdf)
+                if handle:
+                    text = handle.text
+                    st.session_state.label_pdf_handle = handle
+                    # 색인은 세션이 아닌 프로세스 공용 캐시에 (용량 제한 LRU)
+                    get_document_index(text, key=handle.key)
+                    get_article_index(text, key=handle.key)
+                    st.session_state.label_pdf_key = (label_pdf.name, label_pdf.size)
+                    # 이미 만든 요약본이 있으면 디스크 캐시에서 가져옴
+                    st.session_state.label_pdf_digest = cached_digest(source_key=handle.key)
+                else:
+                    st.session_state.label_pdf_key = None
+        if st.session_state.get("label_pdf_key"):
+            st.success(f"✅ {label_pdf.name} ({len(st.session_state.label_pdf_handle):,}자) 학습 완료")
+        else:
+            st.error("텍스트 추출 실패")
 
-    if st.session_state.label_pdf_text:
+    # 이 실행 동안만 본문·색인 참조 (세션에는 핸들만 보관)
+    label_handle = st.session_state.label_pdf_handle
+    label_pdf_text = label_handle.text if label_handle else ""
+    label_articles = get_article_index(label_pdf_text, key=label_handle.key) if label_pdf_text else None
+    if label_pdf_text:
         st.markdown("---")
-        st.markdown(f"**학습된 문서:** {len(st.session_state.label_pdf_text):,}자")
+        st.markdown(f"**학습된 문서:** {len(label_pdf_text):,}자")
+        if label_articles:
+            st.caption(f"📜 조문 {len(label_articles)}개 색인")
+        label_digest = st.session_state.get("label_pdf_digest")
+        if label_digest:
+            st.caption(f"📑 요약본 {len(label_digest):,}자")
+        elif len(label_pdf_text) > DIGEST_CHUNK_CHARS and st.button(
+                "📑 표시기준 요약본 만들기", use_container_width=True,
+                help="문서를 조각내 동시에 요약한 뒤 합쳐서, 검토 때 표시기준 전체를 작은 분량으로 참조합니다"):
+            bar = st.progress(0.0, text="📑 요약 중")
+            try:
+                st.session_state.label_pdf_digest = summarize_document(
+                    "식품등의 표시기준", label_pdf_text, source_key=label_handle.key,
+                    progress=lambda stage, done, total: bar.progress(
+                        done / total, text=f"📑 {'조각 요약' if stage == 'map' else '요약 합치기'} {done}/{total}"))
+            except AIClientError as e:
+                bar.empty()
+                st.error(f"❌ 요약 실패: {e}")
+            else:
+                bar.empty()
+                st.rerun()
 
     st.markdown("---")
+    ai_metrics = get_client_metrics()
+    cache_stats = ai_metrics["cache"]
+    st.caption(f"💾 AI 응답 캐시: {cache_stats['entries']:,}건 저장 · 적중 {cache_stats['hits']} / 미적중 {cache_stats['misses']}")
+    st.caption(f"⏱️ AI 대기열 {ai_metrics['queue_depth']}건 · 진행 중 {ai_metrics['in_flight']}건 · "
+               f"평균 대기 {ai_metrics['avg_wait']:.1f}초 · 중복 병합 {ai_metrics['coalesced']}건")
+    breaker = ai_metrics["breaker"]
+    if breaker["state"] == "open":
+        st.error(f"🔴 AI 서버 연결 차단 중 — {breaker['retry_in']:.0f}초 후 재시도 (기본 분석으로 대체)")
+    elif breaker["state"] == "half_open":
+        st.warning("🟡 AI 서버 복구 확인 중")
+    else:
+        st.caption(f"🟢 AI 서버 연결 정상 (연속 실패 {breaker['failures']}회)")
     st.link_button("📖 식품등의 표시기준 원문", "https://www.law.go.kr/%ED%96%89%EC%A0%95%EA%B7%9C%EC%B9%99/%EC%8B%9D%ED%92%88%EB%93%B1%EC%9D%98%20%ED%91%9C%EC%8B%9C%EA%B8%B0%EC%A4%80", use_container_width=True)
     st.link_button("🔗 식품안전나라", "https://www.foodsafetykorea.go.kr", use_container_width=True)
 
@@ -72,6 +127,37 @@ with tab1:
 
     form = st.session_state.get("ai_formulation")
 
+    # ━━━ 영양성분 자동 계산 (원료 영양성분표 × 배합비) ━━━
+    nut_sources = {}
+    if form:
+        nut_sources["🤖 AI 생성 배합비"] = pd.DataFrame(
+            [{"원료명": i["name"], "비율(%)": i["pct"]} for i in form.get("ingredients", [])])
+    if st.session_state.get("csv_input", "").strip():
+        df_csv, _ = parse_csv_cached(st.session_state.csv_input)
+        if df_csv is not None:
+            nut_sources["✏️ 직접 입력 (CSV)"] = df_csv
+    for std_name, std in STANDARD_FORMULATIONS.items():
+        nut_sources[f"📋 {std_name}"] = pd.DataFrame(std["ingredients"])
+
+    with st.expander("🧮 영양성분 자동 계산", expanded=form is not None):
+        n1, n2 = st.columns([3, 1])
+        nut_src = n1.selectbox("배합비", list(nut_sources), key="label_nut_src")
+        nut_volume = n2.text_input("내용량", value=form.get("totalVolume", "500ml") if form else "500ml",
+                                   key="label_nut_volume")
+        st.dataframe(nutrition_facts(nut_sources[nut_src], nut_volume), use_container_width=True, hide_index=True)
+        st.caption("원재료 영양성분표(100g 당 대표값) × 배합비 환산 — 식품등의 표시기준 표시 단위로 반올림. "
+                   "최종 표시는 영양성분 분석 성적서로 확인하세요.")
+        # 반영한 문구는 계산에 쓴 배합비·내용량과 함께 보관 — 둘 중 하나라도 바뀌면 버림
+        nut_key = frame_key(nut_sources[nut_src], nut_src, nut_volume)
+        if st.button("📋 아래 영양성분 칸에 반영", key="label_nut_apply"):
+            st.session_state.label_nutrition = (nut_key, nutrition_label_text(nut_sources[nut_src], nut_volume))
+            st.rerun()
+
+    applied = st.session_state.get("label_nutrition")
+    default_nutrition = applied[1] if applied and applied[0] == nut_key else None
+    if default_nutrition is None and form:
+        default_nutrition = nutrition_label_text(nut_sources["🤖 AI 생성 배합비"], form.get("totalVolume", "500ml"))
+
     with st.form("label_form"):
         c1, c2 = st.columns(2)
 
@@ -87,8 +173,8 @@ with tab1:
             ingredients_text = st.text_area("원재료명 (함량순)",
                 value=", ".join(i["name"] for i in form.get("ingredients", [])) if form else "",
                 height=80)
-            nutrition = st.text_area("영양성분 (1회 제공량 기준)",
-                value=f"열량 {form.get('calories', '-')}kcal" if form else "",
+            nutrition = st.text_area("영양성분 (총 내용량 기준)",
+                value=default_nutrition or "",
                 placeholder="열량 45kcal, 탄수화물 11g, 당류 10g, 단백질 0g, 지방 0g, 나트륨 15mg",
                 height=80)
             allergens = st.multiselect("알레르기 유발물질",
@@ -122,12 +208,33 @@ with tab1:
         csv_dl = label_df.to_csv(index=False).encode("utf-8-sig")
         st.download_button("📥 표시사항 CSV", csv_dl, "표시사항.csv", "text/csv")
 
+    # ━━━ 저장 배합비 영양성분 일괄 초안 ━━━
+    st.markdown("---")
+    with st.expander("📚 저장 배합비 영양성분 일괄 초안"):
+        st.caption("배합연습에서 저장한 배합비 전체를 한 번에 계산합니다 (내용량은 저장 시 입력값, 없으면 500ml).")
+        if st.button("🧮 일괄 계산", key="label_nut_batch"):
+            saved = load_saved_formulas()
+            formulations = saved_to_formulations(saved)
+            # 표시명이 겹치면 saved_to_formulations 처럼 마지막 저장분 기준
+            volumes = {_saved_label(s): (s.get("meta") or {}).get("volume") for s in saved}
+            st.session_state.label_nut_batch = (nutrition_facts_batch(formulations, volumes),
+                                                nutrition_label_drafts(formulations, volumes))
+        if st.session_state.get("label_nut_batch"):
+            facts, drafts = st.session_state.label_nut_batch
+            st.markdown(f"**{len(facts)}건**")
+            st.dataframe(facts, use_container_width=True)
+            drafts_df = pd.DataFrame(list(drafts.items()), columns=["배합명", "영양성분 표시 문구"])
+            st.download_button("📥 영양성분 초안 CSV", drafts_df.to_csv(index=False).encode("utf-8-sig"),
+                               "영양성분_초안.csv", "text/csv", key="label_nut_batch_dl")
+
 
 # ━━━ TAB 2: 적합성 비교표 ━━━
 with tab2:
     st.markdown("### 📊 표시기준 적합성 비교 분석표")
 
     ld = st.session_state.get("label_data", {})
+    articles = label_articles
+    doc_index = get_document_index(label_pdf_text, key=label_handle.key) if label_pdf_text else None
 
     for section_name, items in LABEL_REQUIREMENTS.items():
         st.markdown(f"#### {section_name}")
@@ -159,21 +266,29 @@ with tab2:
                 "적합 판정": status,
             }
 
-            # PDF 근거 찾기
-            if st.session_state.label_pdf_text:
+            # PDF 근거 찾기 — 관련 조항 본문에서 먼저, 없으면 문서 전체에서
+            row["PDF 근거"] = "—"
+            if articles is not None:
                 keyword = item["항목"].replace("(", "").replace(")", "").split("/")[0]
-                if keyword in st.session_state.label_pdf_text:
-                    row["PDF 근거"] = "📄 있음"
-                else:
-                    row["PDF 근거"] = "—"
-            else:
-                row["PDF 근거"] = "—"
+                if articles.contains(item["관련조항"], keyword):
+                    row["PDF 근거"] = f"📜 {item['관련조항']} (p.{articles.page(item['관련조항'])})"
+                elif doc_index is not None and doc_index.contains(keyword):
+                    row["PDF 근거"] = "📄 다른 조항"
 
             rows.append(row)
 
         compare_df = pd.DataFrame(rows)
         st.dataframe(compare_df, use_container_width=True, hide_index=True)
 
+        # 관련 조항 원문 바로 보기
+        if articles:
+            refs = [r for r in dict.fromkeys(item["관련조항"] for item in items) if r in articles]
+            if refs:
+                with st.expander(f"📜 관련 조항 원문 ({', '.join(refs)})"):
+                    ref = st.radio("조항", refs, horizontal=True, key=f"article_{section_name}",
+                                   format_func=lambda r: f"{r} {articles.title(r)}")
+                    st.text(articles.get(ref))
+
     # 종합 판정
     if ld:
         all_required = [item for items in LABEL_REQUIREMENTS.values() for item in items if item["필수"]]
@@ -198,7 +313,7 @@ with tab2:
 with tab3:
     st.markdown("### 📄 식품등의 표시기준 원문 검색")
 
-    if not st.session_state.label_pdf_text:
+    if not label_pdf_text:
         st.info("""
         📤 **사이드바에서 '식품등의 표시기준' PDF를 업로드하세요.**
 
@@ -207,24 +322,26 @@ with tab3:
         - [식품안전나라](https://www.foodsafetykorea.go.kr)에서 다운로드 가능
         """)
     else:
+        articles = label_articles
+        if articles:
+            jump = st.selectbox("📜 조문 바로가기", [""] + articles.keys(),
+                                format_func=lambda r: f"{r} {articles.title(r)}" if r else "(조문 선택)")
+            if jump:
+                st.text_area(f"{jump} {articles.title(jump)} (p.{articles.page(jump)})", articles.get(jump), height=300)
+
         search_kw = st.text_input("🔍 키워드 검색", placeholder="예: 유통기한, 영양성분, 원재료, 알레르기")
 
         if search_kw:
-            text = st.session_state.label_pdf_text
-            lines = text.split("\n")
-            matched = []
-            for i, line in enumerate(lines):
-                if search_kw.lower() in line.lower():
-                    # 앞뒤 2줄 포함
-                    context = lines[max(0,i-1):min(len(lines),i+3)]
-                    matched.append("\n".join(context))
+            doc_index = get_document_index(label_pdf_text, key=label_handle.key)
+            hits = doc_index.search(search_kw)
 
-            st.markdown(f"**'{search_kw}' 검색 결과: {len(matched)}건**")
-            for j, m in enumerate(matched[:20]):
-                with st.expander(f"결과 {j+1}", expanded=j < 3):
-                    st.text(m)
+            st.markdown(f"**'{search_kw}' 검색 결과: {len(hits)}건**")
+            for j, h in enumerate(hits[:20]):
+                with st.expander(f"결과 {j+1} (p.{h['page']})", expanded=j < 3):
+                    # 앞뒤 2줄 포함
+                    st.text(doc_index.context(h["line"], before=1, after=2))
         else:
-            st.text_area("전문 (상위 5,000자)", st.session_state.label_pdf_text[:5000], height=400)
+            st.text_area("전문 (상위 5,000자)", label_pdf_text[:5000], height=400)
 
 
 # ━━━ TAB 4: AI 검토 ━━━
@@ -235,41 +352,23 @@ with tab4:
     if not ld:
         st.warning("먼저 [✍️ 표시사항 작성] 탭에서 표시사항을 입력하세요")
     else:
-        if st.button("🤖 AI 적합성 검토 실행", type="primary", use_container_width=True):
-            with st.spinner("AI가 표시기준을 확인하고 있습니다..."):
-                label_info = "\n".join(f"- {k}: {v}" for k, v in ld.items())
-                pdf_ref = st.session_state.label_pdf_text[:2000] if st.session_state.label_pdf_text else "(PDF 없음)"
-
-                prompt = f"""당신은 식품표시 전문가입니다. 아래 표시사항이 '식품등의 표시기준'에 적합한지 검토하세요.
-
-[작성된 표시사항]
-{label_info}
-
-[식품등의 표시기준 참고]
-{pdf_ref}
-
-다음을 분석해주세요:
-1. 필수 표시항목 누락 여부
-2. 각 항목별 기준 충족 여부 (구체적)
-3. 영양성분 표시 적정성
-4. 알레르기 표시 적정성
-5. 개선 필요 사항
-6. 종합 판정 (적합/부적합/조건부적합)
-
-한국어로 전문적으로 작성하세요."""
-
-                try:
-                    resp = __import__("requests").post(
-                        "https://api.anthropic.com/v1/messages",
-                        headers={"Content-Type": "application/json"},
-                        json={"model":"claude-sonnet-4-20250514","max_tokens":2000,
-                              "messages":[{"role":"user","content":prompt}]},
-                        timeout=60,
-                    )
-                    data = resp.json()
-                    result = data.get("content",[{}])[0].get("text","")
-                except:
-                    result = f"""## 표시사항 적합성 검토 결과
+        label_budget = st.slider("참조 기준 분량 (자)", 1000, 8000, 2000, 500,
+                                 help="표시항목과 관련도 높은 표시기준 문단부터 이 분량까지 AI에 전달합니다")
+        refresh_ai = st.checkbox("🔄 저장된 응답 무시하고 새로 검토", value=False,
+                                 help="같은 표시사항·기준의 이전 AI 응답을 재사용하지 않습니다")
+        label_docs = {"식품등의 표시기준": label_pdf_text}
+        # 조문 색인이 있으면 표시항목의 관련 조항 본문만 참조
+        if label_articles:
+            refs = [r for r in dict.fromkeys(item["관련조항"] for items in LABEL_REQUIREMENTS.values() for item in items)
+                    if r in label_articles]
+            if refs:
+                label_docs = {f"식품등의 표시기준 {r}": label_articles.get(r) for r in refs}
+        if st.session_state.get("label_pdf_digest") and st.checkbox(
+                "📑 표시기준 요약본으로 참조", value=True, help="원문 대신 미리 만든 표시기준 요약본에서 관련 내용을 고릅니다"):
+            label_docs = {"식품등의 표시기준 요약본": st.session_state.label_pdf_digest}
+
+        def label_fallback():
+            return f"""## 표시사항 적합성 검토 결과
 
 ### 1. 필수 표시항목 점검
 - 제품명: {'✅' if ld.get('제품명') else '❌ 누락'}
@@ -292,8 +391,79 @@ with tab4:
 
 ⚠️ *AI 참고용 분석이며, 최종 판단은 식약처 기준을 따르세요.*"""
 
+        def label_prompt():
+            label_info = "\n".join(f"- {k}: {v}" for k, v in ld.items())
+            # 작성 항목과 관련 높은 표시기준 문단만 (BM25)
+            label_query = " ".join(f"{item['항목']} {item['기준']}" for items in LABEL_REQUIREMENTS.values() for item in items)
+            pdf_ref = build_pdf_context(label_docs, f"{ld.get('식품유형', '')} {label_query}",
+                                        max_chars=label_budget) if label_pdf_text else "(PDF 없음)"
+
+            return f"""당신은 식품표시 전문가입니다. 아래 표시사항이 '식품등의 표시기준'에 적합한지 검토하세요.
+
+[작성된 표시사항]
+{label_info}
+
+[식품등의 표시기준 참고]
+{pdf_ref}
+
+다음을 분석해주세요:
+1. 필수 표시항목 누락 여부
+2. 각 항목별 기준 충족 여부 (구체적)
+3. 영양성분 표시 적정성
+4. 알레르기 표시 적정성
+5. 개선 필요 사항
+6. 종합 판정 (적합/부적합/조건부적합)
+
+한국어로 전문적으로 작성하세요."""
+
+        in_background = st.checkbox("⏳ 백그라운드 작업으로 실행", value=False,
+                                    help="검토가 끝날 때까지 기다리지 않고 다른 탭 작업을 계속할 수 있습니다")
+        run_review = st.button("🤖 AI 적합성 검토 실행", type="primary", use_container_width=True)
+        if run_review and in_background:
+            st.session_state.label_job = get_job_queue().submit(
+                label_prompt(), kind="label", title=ld.get("제품명", "표시사항"),
+                owner=st.session_state.get("student_name", ""), fallback=label_fallback(),
+                max_tokens=2000, cache="refresh" if refresh_ai else "use")
+        elif run_review:
+            with st.spinner("AI가 표시기준을 확인하고 있습니다..."):
+                prompt = label_prompt()
+
+                # 받는 대로 바로 출력 (스트리밍)
+                output = st.empty()
+                result = ""
+                try:
+                    for chunk in stream_claude(prompt, max_tokens=2000, cache="refresh" if refresh_ai else "use"):
+                        result += chunk
+                        output.markdown(result + "▌")
+                except:
+                    result = label_fallback()
+
                 st.session_state.label_analysis = result
-                st.markdown(result)
+                output.markdown(result)
+
+        # 백그라운드 검토 상태 (완료되면 검토 결과로 옮김)
+        def render_label_job():
+            job_id = st.session_state.get("label_job")
+            if not job_id:
+                return
+            job = get_job_queue().get(job_id)
+            if job is None or job["status"] in ("done", "failed"):
+                if job is not None and job["result"]:
+                    st.session_state.label_analysis = job["result"]
+                st.session_state.label_job = None
+                st.rerun()
+            elif job["status"] == "running":
+                st.info("🔄 AI 검토 진행 중 — 다른 탭에서 작업을 계속해도 됩니다")
+                st.markdown(job["partial"] or "응답 대기 중...")
+            else:
+                st.info("🕒 AI 검토 대기 중")
+
+        if hasattr(st, "fragment"):
+            st.fragment(render_label_job, run_every=2 if st.session_state.get("label_job") else None)()
+        else:
+            render_label_job()
+            if st.session_state.get("label_job"):
+                st.button("🔄 검토 상태 새로고침")
 
-        elif st.session_state.label_analysis:
+        if st.session_state.label_analysis and not (run_review and not in_background):
             st.markdown(st.session_state.label_analysis)
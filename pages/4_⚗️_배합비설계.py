@@ -9,23 +9,103 @@ APP_DIR = os.path.dirname(PAGE_DIR)
 if APP_DIR not in sys.path:
     sys.path.insert(0, APP_DIR)
 from data.common import *
+from collections import OrderedDict
 
 st.set_page_config(page_title="배합비설계", page_icon="⚗️", layout="wide")
 st.markdown("# ⚗️ 배합비 설계 & 표준 비교")
 st.markdown("배합비 100% 기준 설계 · 표준배합비 대비 비교분석 · 원가 연동")
 st.markdown("---")
 
-tab_input, tab_compare, tab_cost = st.tabs(["📋 배합표 (100%)", "🔀 표준배합비 비교", "💰 원가 연동"])
+# st.tabs 는 모든 탭을 매번 실행하므로, 선택한 화면만 계산·그리기
+TAB_INPUT, TAB_COMPARE, TAB_COST = "📋 배합표 (100%)", "🔀 표준배합비 비교", "💰 원가 연동"
+current_tab = st.radio("화면", [TAB_INPUT, TAB_COMPARE, TAB_COST], horizontal=True,
+                       key="design_tab", label_visibility="collapsed")
+
+# 보이지 않는 화면의 위젯 값이 지워지지 않도록 유지
+for _k in ("design_input_mode", "design_std", "cmp_std", "cost_vol", "cost_batch"):
+    if _k in st.session_state:
+        st.session_state[_k] = st.session_state[_k]
+
+MEMO_SIZE = 16
+
+def memoized(kind, key, compute):
+    """배합·표준·용량 해시 기준으로 계산 결과 재사용 (세션별 최근 MEMO_SIZE건)"""
+    memo = st.session_state.setdefault("design_memo", OrderedDict())
+    k = (kind, key)
+    if k in memo:
+        memo.move_to_end(k)
+        return memo[k]
+    memo[k] = value = compute()
+    while len(memo) > MEMO_SIZE:
+        memo.popitem(last=False)
+    return value
+
+
+def build_input_view(df_current):
+    display_df = df_current.copy()
+    display_df["비율(%)"] = display_df["비율(%)"].round(3)
+    if "함량(g)" not in display_df.columns:
+        display_df["함량(g)"] = (display_df["비율(%)"] * 5).round(2)
+
+    pie_df = df_current[df_current["비율(%)"] > 0]
+    fig = px.pie(pie_df, values="비율(%)", names="원료명", hole=0.4,
+                 title="배합비 구성 (%)", color_discrete_sequence=COLORS)
+    fig.update_layout(height=380)
+
+    bar_df = df_current[df_current["비율(%)"] > 0].sort_values("비율(%)", ascending=True)
+    fig2 = px.bar(bar_df, y="원료명", x="비율(%)", orientation="h",
+                  title="원료별 배합비율 (%)", color="원료명",
+                  color_discrete_sequence=COLORS, text="비율(%)")
+    fig2.update_traces(texttemplate="%{text:.2f}%", textposition="outside")
+    fig2.update_layout(height=380, showlegend=False)
+    return display_df, fig, fig2
+
+
+def build_compare_view(df_mine, df_std):
+    cmp_df = compare_formulations(df_mine, df_std)
+    if len(cmp_df) == 0:
+        return cmp_df, None, None, None
+
+    counts = {
+        "same": len(cmp_df[cmp_df["판정"].str.contains("동일")]),
+        "over": len(cmp_df[cmp_df["판정"].str.contains("초과")]),
+        "under": len(cmp_df[cmp_df["판정"].str.contains("부족")]),
+        "only_mine": len(cmp_df[(cmp_df["표준(%)"] == 0) & (cmp_df["내 배합(%)"] > 0)]),
+        "only_std": len(cmp_df[(cmp_df["내 배합(%)"] == 0) & (cmp_df["표준(%)"] > 0)]),
+    }
+
+    chart_df = cmp_df.melt(
+        id_vars=["원료명"], value_vars=["내 배합(%)", "표준(%)"],
+        var_name="구분", value_name="비율(%)"
+    )
+    fig = px.bar(chart_df, x="원료명", y="비율(%)", color="구분", barmode="group",
+                 title="원료별 배합비 비교",
+                 color_discrete_map={"내 배합(%)": "#3B82F6", "표준(%)": "#F59E0B"})
+    fig.update_layout(height=400, xaxis_tickangle=-45)
+
+    diff_df = cmp_df[cmp_df["차이(%)"].abs() > 0.001].sort_values("차이(%)")
+    colors = ["#EF4444" if v < 0 else "#10B981" for v in diff_df["차이(%)"]]
+    fig2 = go.Figure(go.Bar(
+        y=diff_df["원료명"], x=diff_df["차이(%)"],
+        orientation="h", marker_color=colors,
+        text=[f"{v:+.3f}%" for v in diff_df["차이(%)"]],
+        textposition="outside"
+    ))
+    fig2.update_layout(title="차이 분석 (내 배합 − 표준)", height=400,
+                       xaxis_title="차이 (%)")
+    fig2.add_vline(x=0, line_dash="dash", line_color="gray")
+    return cmp_df, counts, fig, fig2
+
 
 # ━━━━━ TAB 1: 배합표 100% 기준 ━━━━━
-with tab_input:
+if current_tab == TAB_INPUT:
     form = st.session_state.get("ai_formulation")
 
     input_mode = st.radio("배합비 입력 방식", [
         "🤖 AI 생성 배합비",
         "✏️ 직접 입력 (CSV)",
         "📋 표준배합비에서 시작",
-    ], horizontal=True)
+    ], horizontal=True, key="design_input_mode")
 
     df_current = None
 
@@ -53,13 +133,15 @@ with tab_input:
             value=st.session_state.get("csv_input", ""),
             height=250,
             placeholder="원료명,비율(%),기능,등급\n정제수,86.0,용매,식품용수\n과당포도당액,11.0,감미,식품첨가물\n구연산,0.5,산미조절,식품첨가물\n탄산가스,0.8,탄산,식품첨가물\n천연향료,0.3,풍미,천연향료\n카라멜색소,0.16,착색,식품첨가물")
+        # 다른 화면을 보고 와도 입력이 남도록 (배합연습 페이지와 같은 방식)
+        st.session_state.csv_input = csv_text
         if csv_text.strip():
-            df_current, msg = parse_csv_formula(csv_text)
+            df_current, msg = parse_csv_cached(csv_text)
             if df_current is None:
                 st.error(f"파싱 오류: {msg}")
 
     elif input_mode == "📋 표준배합비에서 시작":
-        sel_std = st.selectbox("표준배합비 선택", list(STANDARD_FORMULATIONS.keys()))
+        sel_std = st.selectbox("표준배합비 선택", list(STANDARD_FORMULATIONS.keys()), key="design_std")
         std = STANDARD_FORMULATIONS[sel_std]
         df_current = pd.DataFrame(std["ingredients"])
         st.info(f"📎 {sel_std} — Brix {std['brix']}° / pH {std['pH']}")
@@ -69,12 +151,18 @@ with tab_input:
         st.markdown("---")
         total_pct = df_current["비율(%)"].sum()
 
-        m1, m2, m3 = st.columns(3)
+        # 물성표 기반 추정 (목표값이 있으면 함께 표시)
+        est = memoized("estimate", frame_key(df_current), lambda: estimate_properties(df_current))
+        target = (form or {}) if input_mode == "🤖 AI 생성 배합비" else (std if input_mode == "📋 표준배합비에서 시작" else {})
+
+        m1, m2, m3, m4 = st.columns(4)
         m1.metric("비율 합계", f"{total_pct:.2f}%",
                   delta="✅ 적정" if 99 <= total_pct <= 101 else "⚠️ 조정필요")
         m2.metric("원료 종류", f"{len(df_current)}종")
-        if form:
-            m3.metric("Brix / pH", f"{form.get('brix','-')}° / {form.get('pH','-')}")
+        m3.metric("추정 Brix", f"{est['brix']:.1f}°",
+                  delta=f"목표 {target['brix']}°" if target.get("brix") else None, delta_color="off")
+        m4.metric("추정 pH · 산도", f"{est['pH']:.2f} · {est['acidity']:.2f}%",
+                  delta=f"목표 pH {target['pH']}" if target.get("pH") else None, delta_color="off")
 
         if total_pct > 0 and (total_pct < 99 or total_pct > 101):
             if st.button("🔄 100%로 자동 정규화"):
@@ -82,10 +170,7 @@ with tab_input:
                 st.rerun()
 
         st.markdown("### 📋 배합표 (100% 기준)")
-        display_df = df_current.copy()
-        display_df["비율(%)"] = display_df["비율(%)"].round(3)
-        if "함량(g)" not in display_df.columns:
-            display_df["함량(g)"] = (display_df["비율(%)"] * 5).round(2)
+        display_df, fig, fig2 = memoized("input", frame_key(df_current), lambda: build_input_view(df_current))
 
         st.dataframe(
             display_df.style.format({"비율(%)": "{:.3f}", "함량(g)": "{:.2f}"}),
@@ -94,18 +179,8 @@ with tab_input:
 
         c1, c2 = st.columns(2)
         with c1:
-            pie_df = df_current[df_current["비율(%)"] > 0]
-            fig = px.pie(pie_df, values="비율(%)", names="원료명", hole=0.4,
-                         title="배합비 구성 (%)", color_discrete_sequence=COLORS)
-            fig.update_layout(height=380)
             st.plotly_chart(fig, use_container_width=True)
         with c2:
-            bar_df = df_current[df_current["비율(%)"] > 0].sort_values("비율(%)", ascending=True)
-            fig2 = px.bar(bar_df, y="원료명", x="비율(%)", orientation="h",
-                          title="원료별 배합비율 (%)", color="원료명",
-                          color_discrete_sequence=COLORS, text="비율(%)")
-            fig2.update_traces(texttemplate="%{text:.2f}%", textposition="outside")
-            fig2.update_layout(height=380, showlegend=False)
             st.plotly_chart(fig2, use_container_width=True)
 
         st.session_state.current_formula_df = df_current
@@ -122,7 +197,7 @@ with tab_input:
 
 
 # ━━━━━ TAB 2: 표준배합비 비교 ━━━━━
-with tab_compare:
+elif current_tab == TAB_COMPARE:
     st.markdown("### 🔀 내 배합비 vs 표준배합비 비교")
 
     df_mine = st.session_state.get("current_formula_df")
@@ -130,13 +205,25 @@ with tab_compare:
         st.warning("먼저 [📋 배합표] 탭에서 배합비를 입력하거나 AI로 생성하세요")
         st.stop()
 
+    std_lib = get_standard_library()
+    ranking = memoized("rank", frame_key(df_mine), lambda: std_lib.rank(df_mine))
+    nearest = ranking["표준"].iloc[0]
+    st.caption(f"🎯 가장 가까운 표준: **{nearest}** (L1 거리 {ranking['L1 거리'].iloc[0]:.2f}, "
+               f"코사인 유사도 {ranking['코사인 유사도'].iloc[0]:.3f})")
+    with st.expander("📏 전체 표준배합비 거리 순위"):
+        st.dataframe(ranking, use_container_width=True, hide_index=True)
+
+    # 처음 열 때는 가장 가까운 표준을 기본 선택
+    if "cmp_std" not in st.session_state:
+        st.session_state.cmp_std = nearest
     std_name = st.selectbox("비교할 표준배합비", list(STANDARD_FORMULATIONS.keys()), key="cmp_std")
     std_data = STANDARD_FORMULATIONS[std_name]
     df_std = pd.DataFrame(std_data["ingredients"])
 
     st.info(f"📎 표준: {std_name} — Brix {std_data['brix']}° / pH {std_data['pH']}")
 
-    cmp_df = compare_formulations(df_mine, df_std)
+    cmp_df, counts, fig, fig2 = memoized("compare", frame_key(df_mine, std_name),
+                                         lambda: build_compare_view(df_mine, df_std))
 
     if len(cmp_df) > 0:
         st.markdown("#### 📊 비교 분석표")
@@ -153,45 +240,20 @@ with tab_compare:
         })
         st.dataframe(styled, use_container_width=True, hide_index=True)
 
-        same = len(cmp_df[cmp_df["판정"].str.contains("동일")])
-        over = len(cmp_df[cmp_df["판정"].str.contains("초과")])
-        under = len(cmp_df[cmp_df["판정"].str.contains("부족")])
-        only_mine = len(cmp_df[(cmp_df["표준(%)"] == 0) & (cmp_df["내 배합(%)"] > 0)])
-        only_std = len(cmp_df[(cmp_df["내 배합(%)"] == 0) & (cmp_df["표준(%)"] > 0)])
-
         mc1, mc2, mc3, mc4, mc5 = st.columns(5)
-        mc1.metric("✅ 동일", f"{same}건")
-        mc2.metric("⬆️ 초과", f"{over}건")
-        mc3.metric("⬇️ 부족", f"{under}건")
-        mc4.metric("➕ 내것만", f"{only_mine}건")
-        mc5.metric("➖ 표준만", f"{only_std}건")
+        mc1.metric("✅ 동일", f"{counts['same']}건")
+        mc2.metric("⬆️ 초과", f"{counts['over']}건")
+        mc3.metric("⬇️ 부족", f"{counts['under']}건")
+        mc4.metric("➕ 내것만", f"{counts['only_mine']}건")
+        mc5.metric("➖ 표준만", f"{counts['only_std']}건")
 
         st.markdown("---")
         c1, c2 = st.columns(2)
 
         with c1:
-            chart_df = cmp_df.melt(
-                id_vars=["원료명"], value_vars=["내 배합(%)", "표준(%)"],
-                var_name="구분", value_name="비율(%)"
-            )
-            fig = px.bar(chart_df, x="원료명", y="비율(%)", color="구분", barmode="group",
-                         title="원료별 배합비 비교",
-                         color_discrete_map={"내 배합(%)": "#3B82F6", "표준(%)": "#F59E0B"})
-            fig.update_layout(height=400, xaxis_tickangle=-45)
             st.plotly_chart(fig, use_container_width=True)
 
         with c2:
-            diff_df = cmp_df[cmp_df["차이(%)"].abs() > 0.001].sort_values("차이(%)")
-            colors = ["#EF4444" if v < 0 else "#10B981" for v in diff_df["차이(%)"]]
-            fig2 = go.Figure(go.Bar(
-                y=diff_df["원료명"], x=diff_df["차이(%)"],
-                orientation="h", marker_color=colors,
-                text=[f"{v:+.3f}%" for v in diff_df["차이(%)"]],
-                textposition="outside"
-            ))
-            fig2.update_layout(title="차이 분석 (내 배합 − 표준)", height=400,
-                               xaxis_title="차이 (%)")
-            fig2.add_vline(x=0, line_dash="dash", line_color="gray")
             st.plotly_chart(fig2, use_container_width=True)
 
         csv_cmp = cmp_df.to_csv(index=False).encode("utf-8-sig")
@@ -199,7 +261,7 @@ with tab_compare:
 
 
 # ━━━━━ TAB 3: 원가 연동 ━━━━━
-with tab_cost:
+elif current_tab == TAB_COST:
     st.markdown("### 💰 배합비 기반 원가 계산")
 
     df_mine = st.session_state.get("current_formula_df")
@@ -210,7 +272,7 @@ with tab_cost:
     vol = st.number_input("기준 용량 (ml)", 100, 2000, 500, 50, key="cost_vol")
     batch = st.number_input("배치 수량 (병)", 1, 1000000, 1000, 100, key="cost_batch")
 
-    cost_df = calc_cost_table(df_mine, vol)
+    cost_df = memoized("cost", frame_key(df_mine, vol, get_ingredient_index().signature), lambda: calc_cost_table(df_mine, vol))
     total_cost = cost_df["원가(원)"].sum()
 
     mc1, mc2, mc3 = st.columns(3)
@@ -8,12 +8,17 @@ APP_DIR = os.path.dirname(PAGE_DIR)
 if APP_DIR not in sys.path:
     sys.path.insert(0, APP_DIR)
 from data.common import *
+from data.nutrition import nutrition_label_text
 
 st.set_page_config(page_title="규제서류", page_icon="📋", layout="wide")
 st.markdown("# 📋 규제 검토 & 서류 작성 가이드")
 st.markdown("---")
 
 form = st.session_state.get("ai_formulation")
+if form:
+    form_df = pd.DataFrame([{"원료명": i["name"], "비율(%)": i["pct"]} for i in form.get("ingredients", [])])
+    nutrition_text = (f"{nutrition_label_text(form_df, form.get('totalVolume', '500ml'))}, "
+                      f"Brix {estimate_properties(form_df)['brix']:.1f}° (배합비 환산 추정)")
 
 # 규제 로드맵
 st.markdown("### 🗺️ 허가 절차 로드맵")
@@ -45,7 +50,7 @@ report_data = {
     "보관방법": "직사광선을 피하고 서늘한 곳에 보관",
     "포장재질": "PET / 알루미늄캔",
     "살균방법": "HTST (72°C, 15초) 또는 UHT (135°C, 2초)",
-    "영양성분": f"열량 {form['calories']}kcal, Brix {form['brix']}°" if form else "-",
+    "영양성분": nutrition_text if form else "-",
     "제조방법": "원료투입→용해→균질→살균→냉각→충전→검사→출하",
 }
 report_df = pd.DataFrame(list(report_data.items()), columns=["항목", "내용"])
@@ -9,6 +9,8 @@ APP_DIR = os.path.dirname(PAGE_DIR)
 if APP_DIR not in sys.path:
     sys.path.insert(0, APP_DIR)
 from data.common import *
+from data.formula_editor import IncrementalFormula
+from data.formula_index import get_formula_index
 
 st.set_page_config(page_title="배합연습", page_icon="✏️", layout="wide")
 st.markdown("# ✏️ 배합비 작성 연습")
@@ -37,17 +39,29 @@ with st.sidebar:
 
     st.markdown("---")
     st.markdown("### 💾 저장된 배합비")
-    saved = load_saved_formulas()
+    only_mine = st.checkbox("내 배합비만 보기", key="saved_only_mine") if student else False
+    saved_student = student if only_mine else None
+    saved_total = count_saved_formulas(student=saved_student)
+    saved_page = 1
+    if saved_total > 10:
+        saved_page = st.number_input(f"페이지 (전체 {saved_total:,}건)", 1, (saved_total + 9) // 10, 1, key="saved_page")
+    saved = load_saved_formulas(limit=10, offset=(saved_page - 1) * 10, student=saved_student)
     if saved:
-        for s in saved[:10]:
+        for s in saved:
             label = f"{s['name']} ({s.get('student','?')}) {s['timestamp'][:10]}"
-            if st.button(f"📂 {label}", key=f"load_{s['filename']}", use_container_width=True):
+            if st.button(f"📂 {label}", key=f"load_{s['id']}", use_container_width=True):
                 df_s = pd.DataFrame(s["ingredients"])
                 st.session_state.csv_input = df_s.to_csv(index=False)
                 st.session_state.formula_name = s["name"]
                 st.rerun()
     else:
         st.caption("저장된 배합비 없음")
+    if saved_total > 1 and st.button("🧬 중복·복제 의심 찾기", use_container_width=True):
+        dup = get_formula_index(sync=True).find_duplicates()
+        if len(dup):
+            st.dataframe(dup[["배합명_a", "학생_a", "배합명_b", "학생_b", "유사도", "L1 거리"]], hide_index=True)
+        else:
+            st.caption("다른 학생과 거의 같은 배합비 없음")
 
 # ━━━ AI 카드에서 넘어온 경우 ━━━
 if "practice_csv" in st.session_state:
@@ -98,14 +112,27 @@ with left:
 
 
 with right:
-    df_parsed, msg = parse_csv_formula(csv_text)
+    # 직전 입력과 달라진 행만 다시 파싱·집계
+    editor = st.session_state.setdefault("practice_editor", IncrementalFormula())
+    df_parsed, msg = editor.update(csv_text)
 
     if df_parsed is not None and "비율(%)" in df_parsed.columns:
-        total_pct = df_parsed["비율(%)"].sum()
+        total_pct = editor.total if editor.columns else df_parsed["비율(%)"].sum()
         st.markdown(f"### 📊 배합표 ({len(df_parsed)}종 원료)")
 
         color = "green" if 99 <= total_pct <= 101 else "red"
         st.markdown(f"**비율 합계: :{color}[{total_pct:.2f}%]**")
+        if editor.columns:
+            st.caption(f"💧 정제수 {editor.counts['water']}종 · 🍬 감미 {editor.counts['sweetener']}종 · "
+                       f"🍋 산미 {editor.counts['acidulant']}종")
+
+        # 물성표 기반 추정 — 입력한 목표 Brix·pH 가 없으면 검증에도 이 값을 씀
+        est = editor.estimates()
+        if est:
+            e1, e2, e3 = st.columns(3)
+            e1.metric("추정 Brix", f"{est['brix']:.1f}°", delta=f"목표 {brix}°" if brix else None, delta_color="off")
+            e2.metric("추정 pH", f"{est['pH']:.2f}", delta=f"목표 {pH_val}" if pH_val else None, delta_color="off")
+            e3.metric("추정 산도", f"{est['acidity']:.2f}%")
 
         # 함량 자동 계산
         vol_ml = int(volume) if volume.isdigit() else 500
@@ -116,13 +143,27 @@ with right:
         st.dataframe(show_df.style.format({"비율(%)": "{:.3f}", "함량(g)": "{:.2f}"}),
                      use_container_width=True, hide_index=True)
 
-        # 파이 차트
-        pie_df = df_parsed[df_parsed["비율(%)"] > 0]
-        if len(pie_df) > 0:
-            fig = px.pie(pie_df, values="비율(%)", names="원료명", hole=0.4,
-                         color_discrete_sequence=COLORS)
-            fig.update_layout(height=300)
-            st.plotly_chart(fig, use_container_width=True)
+        # 파이 차트 — 원료명·비율이 바뀐 경우에만 다시 그림
+        pie = st.session_state.get("practice_pie")
+        if pie is None or pie[0] != editor.ratio_version:
+            pie_df = df_parsed[df_parsed["비율(%)"] > 0]
+            fig = None
+            if len(pie_df) > 0:
+                fig = px.pie(pie_df, values="비율(%)", names="원료명", hole=0.4,
+                             color_discrete_sequence=COLORS)
+                fig.update_layout(height=300)
+            pie = st.session_state.practice_pie = (editor.ratio_version, fig)
+        if pie[1] is not None:
+            st.plotly_chart(pie[1], use_container_width=True)
+
+        # 비슷한 저장 배합비 (원료 비율 코사인 유사도)
+        with st.expander("🔎 비슷한 저장 배합비"):
+            similar = get_formula_index().similar(df_parsed, k=5)
+            if len(similar):
+                st.dataframe(similar[["배합명", "학생", "유사도", "L1 거리", "공통 원료"]],
+                             use_container_width=True, hide_index=True)
+            else:
+                st.caption("저장된 배합비 없음")
 
         # 검증
         if do_validate:
@@ -133,7 +174,7 @@ with right:
             try:
                 if pH_val: meta["pH"] = float(pH_val)
             except: pass
-            result = validate_formula(df_parsed, meta)
+            result = editor.validate(meta)
             if result["passed"]:
                 st.success("✅ 검증 통과!")
             else:
@@ -149,8 +190,9 @@ with right:
                 st.warning("⚠️ 메인 페이지에서 이름을 먼저 입력하세요")
             else:
                 meta = {"brix": brix, "pH": pH_val, "volume": volume, "shelfLife": shelf}
-                filepath = save_formula(formula_name, df_parsed, meta, student)
-                st.success(f"✅ 저장 완료! ({os.path.basename(filepath)})")
+                saved_id = save_formula(formula_name, df_parsed, meta, student)
+                get_formula_index(sync=True)
+                st.success(f"✅ 저장 완료! (#{saved_id})")
 
         # 다운로드
         st.markdown("---")
@@ -169,6 +211,10 @@ with right:
         st.markdown("---")
         st.markdown("### 🔀 표준배합비 비교")
 
+        ranking = get_standard_library().rank(df_parsed, top_k=3)
+        st.caption("🎯 가까운 표준배합비: " + " · ".join(
+            f"{r['표준']} (L1 {r['L1 거리']:.1f}, 코사인 {r['코사인 유사도']:.2f})" for _, r in ranking.iterrows()))
+
         std_name = st.selectbox("비교할 표준배합비", ["선택 안 함"] + list(STANDARD_FORMULATIONS.keys()))
 
         if std_name != "선택 안 함":
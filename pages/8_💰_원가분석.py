@@ -3,19 +3,22 @@ import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
+import numpy as np
 import sys, os
 PAGE_DIR = os.path.dirname(os.path.abspath(__file__))
 APP_DIR = os.path.dirname(PAGE_DIR)
 if APP_DIR not in sys.path:
     sys.path.insert(0, APP_DIR)
 from data.common import *
+from data.formula_optimizer import standard_problem
 
 st.set_page_config(page_title="원가분석", page_icon="💰", layout="wide")
 st.markdown("# 💰 원재료 원가 분석")
 st.markdown("배합비 기반 원가 자동 계산 · 원재료 단가표 · 원가 구성 시각화")
 st.markdown("---")
 
-tab1, tab2, tab3 = st.tabs(["📊 배합비 원가 계산", "📋 원재료 단가표", "🔧 단가 수정"])
+tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 배합비 원가 계산", "📋 원재료 단가표", "🔧 단가 수정", "📚 일괄 원가",
+                                        "🧮 최소원가 배합"])
 
 # ━━━ TAB 1: 배합비 원가 계산 ━━━
 with tab1:
@@ -42,10 +45,10 @@ with tab1:
         csv_text = SAMPLE_FORMULATIONS[smp]
 
     if csv_text.strip():
-        df_parsed, msg = parse_csv_formula(csv_text)
+        df_parsed, msg = parse_csv_cached(csv_text)
         if df_parsed is not None and "비율(%)" in df_parsed.columns:
-            # 원가 계산
-            cost_df = calc_cost_table(df_parsed, volume)
+            # 원가 계산 (같은 CSV·용량·단가표면 이전 결과 재사용)
+            cost_df = get_formula_cache().cost(csv_text, volume)
             total_cost = cost_df["원가(원)"].sum()
             batch_cost = total_cost * batch
 
@@ -148,3 +151,137 @@ with tab3:
         st.markdown("**이번 세션에서 추가/수정된 원료:**")
         for k, v in st.session_state.custom_costs.items():
             st.write(f"- {k}: {v:,}원/kg")
+
+# ━━━ TAB 4: 일괄 원가 (배합비 라이브러리 전체) ━━━
+with tab4:
+    st.markdown("### 📚 배합비 일괄 원가 계산")
+    st.caption("단가 변경 시 저장된 배합비·샘플·업로드 CSV 전체를 한 번에 재계산합니다")
+
+    c1, c2 = st.columns(2)
+    b_volume = c1.number_input("기준 용량 (ml)", 100, 2000, 500, 50, key="batch_vol")
+    b_batch = c2.number_input("생산 배치 (병)", 1, 1000000, 1000, 100, key="batch_cnt")
+
+    sources = st.multiselect("대상 배합비", ["💾 저장된 배합비", "📎 샘플 배합비", "🏷️ 표준배합비"],
+                             default=["📎 샘플 배합비"])
+    batch_files = st.file_uploader("CSV 배합비 업로드 (복수 가능)", type=["csv", "txt"],
+                                   accept_multiple_files=True, key="batch_csvs")
+
+    # 저장 배합비 전체를 읽는 계산이라 버튼을 눌렀을 때만 (다른 탭 입력마다 다시 돌지 않게)
+    batch_inputs = (b_volume, b_batch, tuple(sources), tuple((f.name, f.size) for f in batch_files or []))
+    if st.button("🧮 일괄 계산", type="primary", key="batch_run"):
+        formulations, metas = {}, {}
+        if "💾 저장된 배합비" in sources:
+            saved = load_saved_formulas()
+            formulations.update(saved_to_formulations(saved))
+            metas.update(saved_to_metas(saved))
+        if "📎 샘플 배합비" in sources:
+            for name, text in SAMPLE_FORMULATIONS.items():
+                formulations[f"[샘플] {name}"] = parse_csv_cached(text)[0]
+        if "🏷️ 표준배합비" in sources:
+            for name, std in STANDARD_FORMULATIONS.items():
+                formulations[f"[표준] {name}"] = pd.DataFrame(std["ingredients"])
+        for f in batch_files or []:
+            df_up, _ = parse_csv_cached(f.read().decode("utf-8-sig"))
+            if df_up is not None:
+                formulations[f"[업로드] {f.name}"] = df_up
+        st.session_state.batch_result = (batch_inputs, calc_cost_batch(formulations, b_volume, b_batch),
+                                         validate_formulas_batch(formulations, metas)) if formulations else None
+        if not formulations:
+            st.info("계산할 배합비가 없습니다")
+
+    if st.session_state.get("batch_result"):
+        computed_inputs, batch_df, check_df = st.session_state.batch_result
+        if computed_inputs != batch_inputs:
+            st.caption("⚠️ 계산 이후 조건이 바뀌었습니다 — [🧮 일괄 계산]을 다시 누르세요")
+
+        m1, m2, m3 = st.columns(3)
+        m1.metric("배합비 수", f"{len(batch_df):,}건")
+        m2.metric("평균 1병 원가", f"{batch_df['1병 원가(원)'].mean():,.1f}원")
+        m3.metric("미매칭 원료 포함", f"{(batch_df['미매칭 원료'] > 0).sum():,}건")
+
+        st.dataframe(
+            batch_df.sort_values("1병 원가(원)", ascending=False).style.format({
+                "비율 합계(%)": "{:.2f}", "1병 원가(원)": "{:,.2f}", "배치원가(원)": "{:,.0f}",
+            }),
+            use_container_width=True, hide_index=True,
+        )
+
+        csv_dl = batch_df.to_csv(index=False).encode("utf-8-sig")
+        st.download_button("📥 일괄 원가표 CSV", csv_dl, "일괄원가표.csv", "text/csv")
+
+        # ━━━ 일괄 검증 (채점·QA용) ━━━
+        st.markdown("---")
+        st.markdown("#### ✅ 일괄 배합 검증")
+        v1, v2, v3 = st.columns(3)
+        v1.metric("통과", f"{int(check_df['통과'].sum()):,}건")
+        v2.metric("이슈 있음", f"{int((check_df['이슈'] > 0).sum()):,}건")
+        v3.metric("경고만", f"{int(((check_df['이슈'] == 0) & (check_df['경고'] > 0)).sum()):,}건")
+        rule_cols = [r["id"] for r in FORMULA_RULES]
+        marks = {RULE_OK: "", RULE_WARNING: "⚠️", RULE_ISSUE: "❌"}
+        shown = check_df.copy()
+        shown[rule_cols] = shown[rule_cols].apply(lambda col: col.map(marks))
+        shown = shown.rename(columns={r["id"]: r["label"] for r in FORMULA_RULES})
+        st.dataframe(shown.sort_values(["이슈", "경고"], ascending=False), use_container_width=True)
+        st.download_button("📥 검증 결과 CSV", check_df.to_csv().encode("utf-8-sig"), "일괄검증.csv", "text/csv")
+
+# ━━━ TAB 5: 최소원가 배합 (LP) ━━━
+with tab5:
+    st.markdown("### 🧮 최소원가 배합 설계")
+    st.caption("표준배합비 원료 범위 안에서 비율 합계 100%·Brix·감미를 맞추는 가장 싼 배합을 찾습니다 (Brix·감미는 원재료 물성표 환산값)")
+
+    o1, o2, o3 = st.columns(3)
+    opt_std = o1.selectbox("기준 표준배합비", list(STANDARD_FORMULATIONS.keys()), key="opt_std")
+    opt_flex = o2.slider("표준 원료 허용 범위 (±%)", 0, 100, 30, 5, key="opt_flex") / 100
+    opt_vol = o3.number_input("기준 용량 (ml)", 100, 2000, 500, 50, key="opt_vol")
+    opt_extra = st.multiselect("대체 후보 원료 (0~20%)", list(INGREDIENT_COSTS.keys()), key="opt_extra")
+
+    lp, ref = standard_problem(opt_std, flex=opt_flex, extra=opt_extra)
+    base_brix, base_sweet = lp.brix_of(ref), lp.sweetness_of(ref)
+    t1, t2, t3 = st.columns(3)
+    target_brix = t1.number_input("목표 Brix (°Bx)", 0.0, 70.0, round(base_brix, 2), 0.1, key=f"opt_brix_{opt_std}")
+    target_sweet = t2.number_input("목표 감미 (설탕환산 %)", 0.0, 100.0, round(base_sweet, 2), 0.1, key=f"opt_sweet_{opt_std}")
+    what_if = t3.selectbox("단가 변동 원료 (what-if)", ["없음"] + lp.names, key="opt_whatif")
+    prices = lp.prices.copy()
+    if what_if != "없음":
+        factor = st.slider(f"{what_if} 단가 배율", 0.5, 2.0, 1.0, 0.05, key="opt_factor")
+        prices[lp.names.index(what_if)] *= factor
+
+    result = lp.solve(brix=target_brix, sweetness=target_sweet, prices=prices)
+    if result["x"] is None:
+        st.error("조건을 만족하는 배합이 없습니다 — 허용 범위를 넓히거나 대체 원료를 추가하세요"
+                 if result["status"] == "infeasible" else f"풀이 실패 ({result['status']})")
+    else:
+        x = result["x"]
+        base_cost = float(ref @ prices) * opt_vol / 100 / 1000
+        opt_cost = float(x @ prices) * opt_vol / 100 / 1000
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("표준 1병 원가", f"{base_cost:,.1f}원")
+        m2.metric("최적 1병 원가", f"{opt_cost:,.1f}원", f"{opt_cost - base_cost:+,.1f}원", delta_color="inverse")
+        m3.metric("Brix", f"{lp.brix_of(x):.2f}°", f"{lp.brix_of(x) - base_brix:+.2f}")
+        m4.metric("감미 (설탕환산)", f"{lp.sweetness_of(x):.2f}%", f"{lp.sweetness_of(x) - base_sweet:+.2f}")
+
+        opt_df = lp.table(x, opt_vol, reference=ref, prices=prices)
+        st.dataframe(opt_df.style.format({"비율(%)": "{:.4f}", "기존(%)": "{:.4f}", "변화(%p)": "{:+.4f}",
+                                          "최소(%)": "{:.4f}", "최대(%)": "{:.4f}", "단가(원/kg)": "{:,.0f}",
+                                          "원가(원)": "{:,.2f}"}),
+                     use_container_width=True, hide_index=True)
+        st.download_button("📥 최소원가 배합 CSV", opt_df[["원료명", "비율(%)"]].to_csv(index=False).encode("utf-8-sig"),
+                           f"최소원가_{opt_std}.csv", "text/csv")
+
+        # 단가 민감도: 배율별로 다시 풀어 최적 원가·비율 변화
+        if what_if != "없음":
+            j = lp.names.index(what_if)
+            sweep = []
+            for f in np.linspace(0.5, 2.0, 31):
+                p = lp.prices.copy()
+                p[j] *= f
+                r = lp.solve(brix=target_brix, sweetness=target_sweet, prices=p)
+                if r["x"] is not None:
+                    sweep.append({"단가 배율": f, "1병 원가(원)": float(r["x"] @ p) * opt_vol / 100 / 1000,
+                                  f"{what_if} 비율(%)": r["x"][j]})
+            if sweep:
+                sweep_df = pd.DataFrame(sweep)
+                fig = px.line(sweep_df, x="단가 배율", y=["1병 원가(원)", f"{what_if} 비율(%)"],
+                              title=f"{what_if} 단가 민감도", markers=True)
+                fig.update_layout(height=320)
+                st.plotly_chart(fig, use_container_width=True)
@@ -7,6 +7,10 @@ APP_DIR = os.path.dirname(PAGE_DIR)
 if APP_DIR not in sys.path:
     sys.path.insert(0, APP_DIR)
 from data.common import *
+from data.pdf_search import get_document_index, build_pdf_context
+from data.ai_client import AIClientError, call_claude_many, stream_claude, get_client_metrics
+from data.ai_jobs import get_job_queue
+from data.pdf_digest import DIGEST_CHUNK_CHARS, cached_digest, summarize_document
 
 st.set_page_config(page_title="AI공정분석", page_icon="🔬", layout="wide")
 st.markdown("# 🔬 AI 공정 분석 & PDF 학습")
@@ -14,9 +18,13 @@ st.markdown("공정 관련 PDF를 업로드하면 AI 연구원이 분석하여 
 st.markdown("---")
 
 if "pdf_texts" not in st.session_state:
-    st.session_state.pdf_texts = {}
+    st.session_state.pdf_texts = {}     # 문서명 → TextHandle (본문은 세션 공용 저장소에 1벌)
 if "ai_analysis" not in st.session_state:
     st.session_state.ai_analysis = {}
+if "pdf_digests" not in st.session_state:
+    st.session_state.pdf_digests = {}   # 문서명 → 요약본 (map-reduce)
+if "ai_jobs" not in st.session_state:
+    st.session_state.ai_jobs = {}   # 작업 id → 분석 대상
 
 # ━━━ 사이드바: PDF 업로드 ━━━
 with st.sidebar:
@@ -32,64 +40,97 @@ with st.sidebar:
         for uf in uploaded_files:
             if uf.name not in st.session_state.pdf_texts:
                 with st.spinner(f"📄 {uf.name} 텍스트 추출 중..."):
-                    text = extract_pdf_text(uf)
-                    if text:
-                        st.session_state.pdf_texts[uf.name] = text
-                        st.success(f"✅ {uf.name} ({len(text)}자)")
+                    bar = st.progress(0.0, text=f"📄 {uf.name}")
+                    handle = extract_pdf_handle(uf, progress=lambda done, total, name=uf.name: bar.progress(
+                        done / total, text=f"📄 {name} — {done}/{total} 페이지"))
+                    bar.empty()
+                    if handle:
+                        st.session_state.pdf_texts[uf.name] = handle
+                        # 색인은 세션이 아닌 프로세스 공용 캐시에 (용량 제한 LRU)
+                        get_document_index(handle.text, key=handle.key)
+                        st.success(f"✅ {uf.name} ({len(handle):,}자)")
                     else:
                         st.error(f"❌ {uf.name} 텍스트 추출 실패")
 
     if st.session_state.pdf_texts:
         st.markdown("---")
         st.markdown("**학습된 문서:**")
-        for name, text in st.session_state.pdf_texts.items():
-            st.markdown(f"- 📄 {name} ({len(text):,}자)")
-
-# ━━━ 메인 ━━━
-tab1, tab2, tab3 = st.tabs(["🔬 AI 공정 검토", "📄 PDF 내용 확인", "📊 분석 비교표"])
-
-with tab1:
-    st.markdown("### 🔬 AI 연구원 공정 검토")
-
-    form = st.session_state.get("ai_formulation")
-
-    # 분석 대상 선택
-    analysis_target = st.selectbox("분석 대상", [
-        "전체 공정 리스크 분석",
-        "HACCP CCP 검토",
-        "살균 공정 적정성",
-        "원료 안전성 검토",
-        "제조환경 위생관리",
-        "사용자 정의 질문",
-    ])
-
-    if analysis_target == "사용자 정의 질문":
-        custom_q = st.text_area("분석 질문을 입력하세요", placeholder="예: 탄산음료의 살균 온도와 시간 기준은?")
+        # 긴 문서 요약본 — 이미 만든 것은 디스크 캐시에서 바로 가져옴
+        long_docs = []
+        for name, handle in st.session_state.pdf_texts.items():
+            if len(handle) > DIGEST_CHUNK_CHARS and name not in st.session_state.pdf_digests:
+                digest = cached_digest(source_key=handle.key)
+                if digest is not None:
+                    st.session_state.pdf_digests[name] = digest
+                else:
+                    long_docs.append(name)
+        for name, handle in st.session_state.pdf_texts.items():
+            digest = st.session_state.pdf_digests.get(name)
+            st.markdown(f"- 📄 {name} ({len(handle):,}자)" + (f" · 📑 요약본 {len(digest):,}자" if digest else ""))
+        if long_docs and st.button(f"📑 긴 문서 요약본 만들기 ({len(long_docs)}개)", use_container_width=True,
+                                   help="문서를 조각내 동시에 요약한 뒤 합쳐서, 분석 때 긴 문서 전체를 작은 분량으로 참조합니다"):
+            # 실패 메시지는 rerun 뒤에 보이도록 세션에 남김
+            st.session_state.pdf_digest_errors = []
+            for name in long_docs:
+                bar = st.progress(0.0, text=f"📑 {name}")
+                try:
+                    st.session_state.pdf_digests[name] = summarize_document(
+                        name, st.session_state.pdf_texts[name].text, source_key=st.session_state.pdf_texts[name].key,
+                        progress=lambda stage, done, total, name=name: bar.progress(
+                            done / total, text=f"📑 {name} — {'조각 요약' if stage == 'map' else '요약 합치기'} {done}/{total}"))
+                except AIClientError as e:
+                    st.session_state.pdf_digest_errors.append(f"❌ {name} 요약 실패: {e}")
+                bar.empty()
+            st.rerun()
+        for msg in st.session_state.pop("pdf_digest_errors", []):
+            st.error(msg)
+
+    st.markdown("---")
+    store_stats = get_text_store().stats()
+    st.caption(f"📚 공유 PDF 본문: {store_stats['documents']}개 문서 · 세션 참조 {store_stats['handles']}개 · "
+               f"메모리 {store_stats['resident_bytes'] / 1e6:.1f}MB")
+    ai_metrics = get_client_metrics()
+    cache_stats = ai_metrics["cache"]
+    st.caption(f"💾 AI 응답 캐시: {cache_stats['entries']:,}건 저장 · 적중 {cache_stats['hits']} / 미적중 {cache_stats['misses']}")
+    st.caption(f"⏱️ AI 대기열 {ai_metrics['queue_depth']}건 · 진행 중 {ai_metrics['in_flight']}건 · "
+               f"평균 대기 {ai_metrics['avg_wait']:.1f}초 · 중복 병합 {ai_metrics['coalesced']}건")
+    breaker = ai_metrics["breaker"]
+    if breaker["state"] == "open":
+        st.error(f"🔴 AI 서버 연결 차단 중 — {breaker['retry_in']:.0f}초 후 재시도 (기본 분석으로 대체)")
+    elif breaker["state"] == "half_open":
+        st.warning("🟡 AI 서버 복구 확인 중")
     else:
-        custom_q = ""
-
-    # PDF 컨텍스트 구성
-    pdf_context = ""
-    if st.session_state.pdf_texts:
-        selected_pdfs = st.multiselect("참조할 PDF 선택", list(st.session_state.pdf_texts.keys()),
-                                        default=list(st.session_state.pdf_texts.keys()))
-        for name in selected_pdfs:
-            # 토큰 제한을 위해 앞부분만
-            pdf_context += f"\n\n[문서: {name}]\n{st.session_state.pdf_texts[name][:3000]}"
-
-    if st.button("🤖 AI 분석 실행", type="primary", use_container_width=True):
-        with st.spinner("AI 연구원이 분석 중..."):
-            # 프롬프트 구성
-            formulation_info = ""
-            if form:
-                formulation_info = f"""
+        st.caption(f"🟢 AI 서버 연결 정상 (연속 실패 {breaker['failures']}회)")
+
+# 분석 대상별 문단 검색 보조 키워드
+ANALYSIS_QUERIES = {
+    "전체 공정 리스크 분석": " ".join(f"{s['name']} {s['risk']} {s['control']}" for s in PROCESS_STEPS),
+    "HACCP CCP 검토": "HACCP CCP 중요관리점 한계기준 모니터링 개선조치 검증 위해요소",
+    "살균 공정 적정성": "살균 멸균 온도 시간 HTST UHT F0 가열 냉각 미생물",
+    "원료 안전성 검토": "원료 입고 검수 성적서 COA 규격 이물 잔류 알레르기",
+    "제조환경 위생관리": "위생 세척 소독 작업장 청결 교차오염 방충 방서 작업자",
+}
+
+ANALYSIS_TARGETS = [
+    "전체 공정 리스크 분석",
+    "HACCP CCP 검토",
+    "살균 공정 적정성",
+    "원료 안전성 검토",
+    "제조환경 위생관리",
+    "사용자 정의 질문",
+]
+
+
+def build_analysis_prompt(question, pdf_context, form):
+    """공정 분석 프롬프트"""
+    formulation_info = ""
+    if form:
+        formulation_info = f"""
 현재 제품: {form.get('productName', '미정')}
 Brix: {form.get('brix', '-')}, pH: {form.get('pH', '-')}
 원료: {', '.join(i['name'] for i in form.get('ingredients', []))}
 """
-            question = custom_q if custom_q else analysis_target
-
-            prompt = f"""당신은 식품공학 R&D 연구원이자 HACCP 전문가입니다.
+    return f"""당신은 식품공학 R&D 연구원이자 HACCP 전문가입니다.
 
 {formulation_info}
 
@@ -109,23 +150,10 @@ Brix: {form.get('brix', '-')}, pH: {form.get('pH', '-')}
 
 전문적이고 구체적으로 작성하되, 한국어로 답변하세요."""
 
-            try:
-                import json as json_mod
-                resp = __import__("requests").post(
-                    "https://api.anthropic.com/v1/messages",
-                    headers={"Content-Type": "application/json"},
-                    json={
-                        "model": "claude-sonnet-4-20250514",
-                        "max_tokens": 2000,
-                        "messages": [{"role": "user", "content": prompt}]
-                    },
-                    timeout=60,
-                )
-                data = resp.json()
-                analysis = data.get("content", [{}])[0].get("text", "분석 결과를 받지 못했습니다.")
-            except Exception as e:
-                # API 호출 실패 시 기본 분석
-                analysis = f"""## {analysis_target} 분석 결과
+
+def fallback_analysis(analysis_target, form):
+    """API 호출 실패 시 기본 분석"""
+    return f"""## {analysis_target} 분석 결과
 
 ### 1. 현황 분석
 {f'제품 "{form["productName"]}" 기준 ' if form else '일반 음료 '}제조공정 8단계를 검토하였습니다.
@@ -152,8 +180,149 @@ Brix: {form.get('brix', '-')}, pH: {form.get('pH', '-')}
 ⚠️ *본 분석은 AI 기반 참고 자료이며, 최종 판단은 식품안전 전문가의 검토가 필요합니다.*
 """
 
-            st.session_state.ai_analysis[analysis_target] = analysis
-            st.markdown(analysis)
+
+def target_pdf_context(analysis_target, question, docs, budget):
+    """분석 대상별 참조 문단 (BM25)"""
+    if not docs:
+        return ""
+    return build_pdf_context(docs, f"{question} {ANALYSIS_QUERIES.get(analysis_target, '')}", max_chars=budget)
+
+
+# ━━━ 메인 ━━━
+tab1, tab2, tab3 = st.tabs(["🔬 AI 공정 검토", "📄 PDF 내용 확인", "📊 분석 비교표"])
+
+with tab1:
+    st.markdown("### 🔬 AI 연구원 공정 검토")
+
+    form = st.session_state.get("ai_formulation")
+
+    # 분석 대상 선택
+    analysis_target = st.selectbox("분석 대상", ANALYSIS_TARGETS)
+
+    if analysis_target == "사용자 정의 질문":
+        custom_q = st.text_area("분석 질문을 입력하세요", placeholder="예: 탄산음료의 살균 온도와 시간 기준은?")
+    else:
+        custom_q = ""
+
+    # 참조 PDF 선택
+    selected_docs, context_budget = {}, 3000
+    if st.session_state.pdf_texts:
+        selected_pdfs = st.multiselect("참조할 PDF 선택", list(st.session_state.pdf_texts.keys()),
+                                        default=list(st.session_state.pdf_texts.keys()))
+        context_budget = st.slider("참조 문서 분량 (자)", 1000, 12000, 3000 * max(1, min(len(selected_pdfs), 3)), 500,
+                                   help="분석 질문과 관련도 높은 문단부터 이 분량까지 AI에 전달합니다")
+        selected_docs = {name: st.session_state.pdf_texts[name].text for name in selected_pdfs}
+        digested = [name for name in selected_pdfs if name in st.session_state.pdf_digests]
+        if digested and st.checkbox(f"📑 요약본으로 참조 ({len(digested)}개 문서)", value=True,
+                                    help="원문 대신 미리 만든 문서 요약본에서 관련 내용을 고릅니다"):
+            selected_docs = {(f"{name} 요약본" if name in digested else name):
+                             st.session_state.pdf_digests.get(name) or st.session_state.pdf_texts[name].text
+                             for name in selected_pdfs}
+
+    refresh_ai = st.checkbox("🔄 저장된 응답 무시하고 새로 분석", value=False,
+                             help="같은 질문·문서의 이전 AI 응답을 재사용하지 않습니다")
+    cache_mode = "refresh" if refresh_ai else "use"
+    in_background = st.checkbox("⏳ 백그라운드 작업으로 실행", value=False,
+                                help="분석이 끝날 때까지 기다리지 않고 배합 수정 등 다른 작업을 계속할 수 있습니다")
+
+    b1, b2 = st.columns(2)
+    run_one = b1.button("🤖 AI 분석 실행", type="primary", use_container_width=True)
+    run_all = b2.button("🚀 전체 대상 동시 분석", use_container_width=True,
+                        help="분석 대상 전체(사용자 정의 질문은 입력한 경우만)를 동시에 요청합니다")
+
+    if run_one and in_background:
+        question = custom_q if custom_q else analysis_target
+        prompt = build_analysis_prompt(
+            question, target_pdf_context(analysis_target, question, selected_docs, context_budget), form)
+        job_id = get_job_queue().submit(prompt, kind="process", title=analysis_target,
+                                        owner=st.session_state.get("student_name", ""),
+                                        fallback=fallback_analysis(analysis_target, form),
+                                        max_tokens=2000, cache=cache_mode)
+        st.session_state.ai_jobs[job_id] = analysis_target
+    elif run_one:
+        question = custom_q if custom_q else analysis_target
+        # 토큰 제한 안에서 질문과 관련 높은 문단만
+        pdf_context = target_pdf_context(analysis_target, question, selected_docs, context_budget)
+        prompt = build_analysis_prompt(question, pdf_context, form)
+        # 받는 대로 바로 출력 (스트리밍)
+        output = st.empty()
+        output.caption("AI 연구원이 분석 중...")
+        analysis = ""
+        try:
+            for chunk in stream_claude(prompt, max_tokens=2000, cache=cache_mode):
+                analysis += chunk
+                output.markdown(analysis + "▌")
+        except Exception as e:
+            analysis = fallback_analysis(analysis_target, form)
+
+        st.session_state.ai_analysis[analysis_target] = analysis
+        output.markdown(analysis)
+
+    if run_all and in_background:
+        for target in ANALYSIS_TARGETS:
+            if target == "사용자 정의 질문" and not custom_q:
+                continue
+            question = custom_q if target == "사용자 정의 질문" else target
+            prompt = build_analysis_prompt(
+                question, target_pdf_context(target, question, selected_docs, context_budget), form)
+            job_id = get_job_queue().submit(prompt, kind="process", title=target,
+                                            owner=st.session_state.get("student_name", ""),
+                                            fallback=fallback_analysis(target, form),
+                                            max_tokens=2000, cache=cache_mode)
+            st.session_state.ai_jobs[job_id] = target
+    elif run_all:
+        prompts = {}
+        for target in ANALYSIS_TARGETS:
+            if target == "사용자 정의 질문" and not custom_q:
+                continue
+            question = custom_q if target == "사용자 정의 질문" else target
+            prompts[target] = build_analysis_prompt(
+                question, target_pdf_context(target, question, selected_docs, context_budget), form)
+
+        progress = st.progress(0.0, text=f"🚀 {len(prompts)}개 분석 동시 요청 중...")
+        slots = {target: st.empty() for target in prompts}
+        for done, (target, analysis, error) in enumerate(
+                call_claude_many(prompts, max_tokens=2000, cache=cache_mode), 1):
+            if error is not None:
+                analysis = fallback_analysis(target, form)
+            # 끝나는 순서대로 결과 반영
+            st.session_state.ai_analysis[target] = analysis
+            with slots[target].container():
+                with st.expander(f"{'⚠️' if error else '✅'} {target}", expanded=False):
+                    st.markdown(analysis)
+            progress.progress(done / len(prompts), text=f"🚀 {done}/{len(prompts)} 완료")
+        progress.empty()
+
+    # 백그라운드 작업 상태 (완료되면 분석 결과로 옮김)
+    def render_ai_jobs():
+        if not st.session_state.ai_jobs:
+            return
+        jobs = get_job_queue().get_many(st.session_state.ai_jobs)
+        st.markdown("#### ⏳ 백그라운드 분석")
+        finished = []
+        for job_id, target in list(st.session_state.ai_jobs.items()):
+            job = jobs.get(job_id)
+            if job is None or job["status"] in ("done", "failed"):
+                if job is not None and job["result"]:
+                    st.session_state.ai_analysis[target] = job["result"]
+                finished.append(job_id)
+                st.caption(f"{'✅' if job and job['status'] == 'done' else '⚠️'} {target} — 완료")
+            elif job["status"] == "running":
+                with st.expander(f"🔄 {target} — 분석 중", expanded=False):
+                    st.markdown(job["partial"] or "응답 대기 중...")
+            else:
+                st.caption(f"🕒 {target} — 대기 중")
+        for job_id in finished:
+            del st.session_state.ai_jobs[job_id]
+        if finished:
+            st.rerun()
+
+    if hasattr(st, "fragment"):
+        st.fragment(render_ai_jobs, run_every=2 if st.session_state.ai_jobs else None)()
+    else:
+        render_ai_jobs()
+        if st.session_state.ai_jobs:
+            st.button("🔄 작업 상태 새로고침")
 
     # 이전 분석 결과 표시
     if st.session_state.ai_analysis and not st.session_state.get("_just_analyzed"):
@@ -169,16 +338,17 @@ with tab2:
     if not st.session_state.pdf_texts:
         st.info("📤 사이드바에서 PDF를 업로드하세요 (HACCP 문서, 공정도, 위해분석서 등)")
     else:
-        for name, text in st.session_state.pdf_texts.items():
+        for name, handle in st.session_state.pdf_texts.items():
+            text = handle.text
             with st.expander(f"📄 {name} ({len(text):,}자)", expanded=False):
                 # 키워드 검색
                 kw = st.text_input(f"🔍 키워드 검색 ({name})", key=f"kw_{name}")
                 if kw:
-                    lines = text.split("\n")
-                    matched = [l for l in lines if kw.lower() in l.lower()]
-                    st.markdown(f"**'{kw}' 포함 행: {len(matched)}건**")
-                    for m in matched[:30]:
-                        st.markdown(f"- ...{m.strip()}...")
+                    doc_index = get_document_index(text, key=handle.key)
+                    hits = doc_index.search(kw)
+                    st.markdown(f"**'{kw}' 포함 행: {len(hits)}건**")
+                    for h in hits[:30]:
+                        st.markdown(f"- p.{h['page']} ...{h['text'].strip()}...")
                 else:
                     st.text_area("전문", text[:5000], height=400, key=f"full_{name}")
                     if len(text) > 5000:
@@ -201,8 +371,9 @@ with tab3:
         # PDF에서 관련 내용 찾기
         if st.session_state.pdf_texts:
             mentions = 0
-            for text in st.session_state.pdf_texts.values():
-                if s["name"].replace("·", " ").split("·")[0] in text or s["name"].split("·")[-1] in text:
+            for name, handle in st.session_state.pdf_texts.items():
+                doc_index = get_document_index(handle.text, key=handle.key)
+                if doc_index.contains(s["name"].split("·")[0]) or doc_index.contains(s["name"].split("·")[-1]):
                     mentions += 1
             row["PDF 언급"] = f"📄 {mentions}건" if mentions > 0 else "—"
         else: